@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Short-lived, per-process cache of successful basic auth verifications, so
+that scripted clients don't pay for a bcrypt check on every request.
+
+Entries are keyed by the username and an HMAC of the password, so plain
+passwords are never held in memory past the request. Each entry remembers
+the user's password hash; a hit is only honored if the hash is unchanged and
+the account is still enabled, so changing the password or disabling the
+account invalidates the entry in every process.
+"""
+import hmac
+import hashlib
+
+from api.base import settings
+from framework.auth.core import User
+from website import settings as website_settings
+from website.util.cache import LRUCache
+
+credentials_cache = LRUCache(
+    maxsize=settings.API_AUTH_CACHE_SIZE,
+    ttl=settings.API_AUTH_CACHE_TTL,
+)
+
+
+def normalize_username(username):
+    return username.strip().lower()
+
+
+def make_key(username, password):
+    digest = hmac.new(
+        website_settings.SECRET_KEY,
+        password.strip().encode('utf-8'),
+        hashlib.sha256,
+    ).hexdigest()
+    return normalize_username(username), digest
+
+
+def get_user(username, password):
+    """Return the user whose credentials were verified recently, or None."""
+    if not settings.API_AUTH_CACHE_ENABLED:
+        return None
+    key = make_key(username, password)
+    # Counted here rather than by the cache, since stale entries are misses
+    entry = credentials_cache.get(key, count=False)
+    user = None
+    if entry is not None:
+        user_id, password_hash = entry
+        user = User.load(user_id)
+        if (
+            user is None or
+            user.password != password_hash or
+            user.is_disabled or
+            key[0] not in [user.username] + list(user.emails)
+        ):
+            credentials_cache.delete(key)
+            user = None
+    if user is None:
+        credentials_cache.record_miss()
+    else:
+        credentials_cache.record_hit()
+    return user
+
+
+def remember(username, password, user):
+    if settings.API_AUTH_CACHE_ENABLED and not user.is_disabled:
+        credentials_cache.set(make_key(username, password), (user._id, user.password))
+
+
+def invalidate():
+    credentials_cache.clear()
+
+
+def stats():
+    return credentials_cache.stats()
@@ -9,6 +9,7 @@ from framework.auth import cas
 from framework.sessions.model import Session
 from framework.auth.core import User, get_user
 from website import settings
+from api.base.authentication import cache
 
 
 def get_session_from_cookie(cookie_val):
@@ -41,10 +42,16 @@ class OSFBasicAuthentication(BasicAuthentication):
     def authenticate_credentials(self, userid, password):
         """
         Authenticate the userid and password against username and password.
+        Successful verifications are cached briefly; see `cache`.
         """
+        user = cache.get_user(userid, password) if userid and password else None
+        if user:
+            return (user, None)
         user = get_user(email=userid, password=password)
+        if user:
+            cache.remember(userid, password, user)
 
-        if userid and user is None:
+        if userid and not user:
             raise exceptions.AuthenticationFailed(_('Invalid username/password.'))
         elif userid is None and password is None:
             raise exceptions.NotAuthenticated()
@@ -0,0 +1,131 @@
+"""Conditional GET support for API views. Responses carry an `ETag`, and
+detail responses a `Last-Modified` header, derived from the stored
+`date_saved` of the objects they represent. Requests with a matching
+`If-None-Match`, or for detail views a recent enough `If-Modified-Since`,
+get an empty 304 response without being serialized.
+"""
+import hashlib
+import calendar
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.base.pagination import JSONAPICursorPagination
+
+
+class ConditionalGetMixin(object):
+    """Base class for the conditional GET view mixins. Responses that embed
+    or count related resources depend on more than the objects' own version,
+    so requests for them are always served in full.
+    """
+
+    version_field = 'date_saved'
+    unversioned_query_params = ('embed', 'related_counts')
+
+    def is_conditional(self, request):
+        return (
+            request.method == 'GET' and
+            not any(param in request.query_params for param in self.unversioned_query_params)
+        )
+
+    def get_etag(self, request, version):
+        """Hash the version with everything else the response depends on: the
+        query string, the representation asked for, and the current user.
+        """
+        user = request.user
+        parts = [
+            repr(version),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            '' if user.is_anonymous() else user._id,
+        ]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return etag in etags or '*' in etags
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if if_modified_since is not None and last_modified is not None:
+            return calendar.timegm(last_modified.utctimetuple()) <= if_modified_since
+        return False
+
+    def conditional_response(self, request, version, last_modified, get_response):
+        """Return a 304 if the client's copy is current, else the response from
+        `get_response`, with validators added. Objects saved before
+        `date_saved` existed have no version and are always served in full.
+        """
+        if version is None or not self.is_conditional(request):
+            return get_response()
+        etag = self.get_etag(request, version)
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = get_response()
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = quote_etag(etag)
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(calendar.timegm(last_modified.utctimetuple()))
+            # The ETag depends on these, so shared caches must too
+            patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
+
+
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    """Conditional GET for detail views. The object is loaded and its
+    permissions checked as usual; only serialization is skipped.
+    """
+
+    # overrides RetrieveModelMixin
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = getattr(instance, self.version_field, None)
+        return self.conditional_response(
+            request,
+            last_modified,
+            last_modified,
+            lambda: Response(self.get_serializer(instance).data),
+        )
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """Conditional GET for list views over a modular-odm query. The version
+    of a list is the number of matching objects and the latest time any of
+    them was saved. Computing it costs extra queries, so it is only done for
+    requests with an `If-None-Match` header; clients opt in by sending one,
+    e.g. ``If-None-Match: ""`` on the first request. Lists have no
+    `Last-Modified`, since removing an object from a list doesn't change
+    the latest save time.
+
+    Views must define `model_class` and `get_query_from_request()`, as
+    `ODMFilterMixin` views do.
+    """
+
+    model_class = None
+
+    def get_list_count(self, query):
+        if isinstance(self.paginator, JSONAPICursorPagination):
+            # Cached briefly by the paginator, so removals may take that long to show
+            return self.paginator.get_total(self.model_class, query)
+        return self.model_class.find(query).count()
+
+    def get_list_version(self):
+        query = self.get_query_from_request()
+        latest = list(self.model_class.find(query).sort('-' + self.version_field)[:1])
+        last_modified = getattr(latest[0], self.version_field, None) if latest else None
+        return self.get_list_count(query), last_modified
+
+    # overrides ListModelMixin
+    def list(self, request, *args, **kwargs):
+        parent = super(ConditionalListMixin, self)
+        if not self.is_conditional(request) or 'HTTP_IF_NONE_MATCH' not in request.META:
+            return parent.list(request, *args, **kwargs)
+        return self.conditional_response(
+            request,
+            self.get_list_version(),
+            None,
+            lambda: parent.list(request, *args, **kwargs),
+        )
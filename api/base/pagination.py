@@ -1,11 +1,30 @@
+import json
+import base64
+import binascii
+import datetime
 from collections import OrderedDict
 
+from modularodm import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.utils.urls import (
     replace_query_param, remove_query_param
 )
 
+from api.base import settings
+from api.base.utils import is_truthy
+from website.util.cache import LRUCache
+
+# Totals of cursor-paginated queries, keyed by model and query
+total_cache = LRUCache(
+    maxsize=settings.CURSOR_PAGINATION_TOTAL_CACHE_SIZE,
+    ttl=settings.CURSOR_PAGINATION_TOTAL_CACHE_TTL,
+)
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
 class JSONAPIPagination(pagination.PageNumberPagination):
     """Custom paginator that formats responses in a JSON-API compatible format."""
 
@@ -39,3 +58,164 @@ class JSONAPIPagination(pagination.PageNumberPagination):
             ])),
         ])
         return Response(response_dict)
+
+
+class JSONAPICursorPagination(pagination.BasePagination):
+    """Keyset paginator for modular-odm queries. Rather than counting and
+    skipping over earlier pages, each page is queried from the position
+    where the last one ended, encoded in opaque `next` and `prev` cursors,
+    so deep pages cost the same as the first. The total is only counted
+    when asked for with ``page[total]=true``, and is cached briefly.
+
+    Items are ordered by `ordering`, which should be an indexed field, then
+    by `_id`. Use through `CursorPaginationMixin`.
+    """
+
+    cursor_query_param = 'page[cursor]'
+    page_size_query_param = 'page[size]'
+    total_query_param = 'page[total]'
+    max_page_size = 100
+
+    def __init__(self, ordering='-date_created'):
+        self.reverse = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.REST_FRAMEWORK['PAGE_SIZE']
+        return min(max(page_size, 1), self.max_page_size)
+
+    def encode_cursor(self, obj, previous):
+        value = getattr(obj, self.field)
+        if isinstance(value, datetime.datetime):
+            value = {'datetime': value.strftime(DATETIME_FORMAT)}
+        payload = json.dumps({'value': value, 'id': obj._id, 'previous': previous})
+        return base64.urlsafe_b64encode(payload)
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            value = payload['value']
+            if isinstance(value, dict):
+                value = datetime.datetime.strptime(value['datetime'], DATETIME_FORMAT)
+            return value, payload['id'], bool(payload['previous'])
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound('Invalid cursor.')
+
+    def get_keyset_query(self, value, pk, descending):
+        """Items after (`value`, `pk`) in the given direction."""
+        operator = 'lt' if descending else 'gt'
+        return (
+            Q(self.field, operator, value) |
+            (Q(self.field, 'eq', value) & Q('_id', operator, pk))
+        )
+
+    def get_sort(self, descending):
+        prefix = '-' if descending else ''
+        return prefix + self.field, prefix + '_id'
+
+    def get_total(self, model, query):
+        key = (model.__name__, repr(query))
+        total = total_cache.get(key)
+        if total is None:
+            total = model.find(query).count()
+            total_cache.set(key, total)
+        return total
+
+    # overrides BasePagination
+    def paginate_queryset(self, queryset, request, view=None):
+        """Query the requested page. The view supplies the model and query
+        through `CursorPaginationMixin`; `queryset` is not evaluated.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        query = view.get_query_from_request()
+        model = view.model_class
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.has_cursor = bool(cursor)
+        previous = False
+        page_query = query
+        if cursor:
+            value, pk, previous = self.decode_cursor(cursor)
+            # Walking backwards, query in the opposite order and flip the page
+            page_query = query & self.get_keyset_query(value, pk, self.reverse != previous)
+        descending = self.reverse != previous
+
+        results = list(model.find(page_query).sort(*self.get_sort(descending))[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if previous:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+
+        self.total = None
+        if is_truthy(request.query_params.get(self.total_query_param)):
+            self.total = self.get_total(model, query)
+
+        self.page = results
+        return results
+
+    def get_cursor_link(self, obj, previous):
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(obj, previous))
+
+    def get_first_link(self):
+        if not self.has_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, '')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_cursor_link(self.page[-1], previous=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_cursor_link(self.page[0], previous=True)
+
+    def get_paginated_response(self, data):
+        response_dict = OrderedDict([
+            ('data', data),
+            ('links', OrderedDict([
+                ('first', self.get_first_link()),
+                ('last', None),
+                ('prev', self.get_previous_link()),
+                ('next', self.get_next_link()),
+                ('meta', OrderedDict([
+                    ('total', self.total),
+                    ('per_page', self.page_size),
+                ]))
+            ])),
+        ])
+        return Response(response_dict)
+
+
+class CursorPaginationMixin(object):
+    """View mixin that pages with `JSONAPICursorPagination` when the request
+    has a ``page[cursor]`` parameter (empty for the first page), and with
+    the view's regular paginator otherwise. Must come before the generic
+    view in the bases.
+
+    Views must define `model_class` and `get_query_from_request()`, as
+    `ODMFilterMixin` views do.
+    """
+
+    model_class = None
+    cursor_ordering = '-date_created'
+
+    # overrides GenericAPIView
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if JSONAPICursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = JSONAPICursorPagination(ordering=self.cursor_ordering)
+            else:
+                self._paginator = super(CursorPaginationMixin, self).paginator
+        return self._paginator
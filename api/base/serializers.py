@@ -2,8 +2,9 @@ import collections
 import re
 
 from rest_framework import serializers as ser
+from rest_framework.fields import SkipField
 from website.util.sanitize import strip_html
-from api.base.utils import absolute_reverse, waterbutler_url_for
+from api.base.utils import absolute_reverse, waterbutler_url_for, is_truthy
 
 
 def _rapply(d, func, *args, **kwargs):
@@ -17,6 +18,15 @@ def _rapply(d, func, *args, **kwargs):
         return func(d, *args, **kwargs)
 
 
+def _drop_key(d, key):
+    """Remove `key` from a dictionary and all dictionaries nested in it."""
+    return {
+        k: _drop_key(v, key) if isinstance(v, collections.Mapping) else v
+        for k, v in d.iteritems()
+        if k != key
+    }
+
+
 def _url_val(val, obj, serializer, **kwargs):
     """Function applied by `HyperlinksField` to get the correct value in the
     schema.
@@ -32,7 +42,8 @@ def _url_val(val, obj, serializer, **kwargs):
 class LinksField(ser.Field):
     """Links field that resolves to a links object. Used in conjunction with `Link`.
     If the object to be serialized implements `get_absolute_url`, then the return value
-    of that method is used for the `self` link.
+    of that method is used for the `self` link. `count` values are only included when
+    the request asks for them with ``?related_counts=true``.
 
     Example: ::
 
@@ -63,7 +74,10 @@ class LinksField(ser.Field):
         return obj
 
     def to_representation(self, obj):
-        ret = _rapply(self.links, _url_val, obj=obj, serializer=self.parent)
+        links = self.links
+        if not self.parent.related_counts_requested():
+            links = _drop_key(links, 'count')
+        ret = _rapply(links, _url_val, obj=obj, serializer=self.parent)
         if hasattr(obj, 'get_absolute_url'):
             ret['self'] = obj.get_absolute_url()
         return ret
@@ -141,6 +155,8 @@ class WaterbutlerLink(Link):
 class JSONAPIListSerializer(ser.ListSerializer):
 
     def to_representation(self, data):
+        data = list(data)
+        self.child.prefetch(data)
         # Don't envelope when serializing collection
         return [
             self.child.to_representation(item, envelope=None) for item in data
@@ -158,9 +174,69 @@ class JSONAPISerializer(ser.Serializer):
         kwargs['child'] = cls()
         return JSONAPIListSerializer(*args, **kwargs)
 
+    # Fields that are serialized even when not named in a sparse fieldset
+    always_included_fields = frozenset(['id', 'links'])
+    # Related resources that can be included with ``?embed=``
+    embeddable_fields = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        super(JSONAPISerializer, self).__init__(*args, **kwargs)
+        self._embeds = {}
+
+    def get_query_param(self, key):
+        request = self.context.get('request')
+        if request is None:
+            return None
+        return request.query_params.get(key)
+
+    def get_requested_fields(self, type_):
+        """Names of the fields requested with a sparse fieldset, e.g.
+        ``?fields[nodes]=title,date_created``, or None if all fields are wanted.
+        """
+        fields = self.get_query_param('fields[{}]'.format(type_))
+        if fields is None:
+            return None
+        requested = set(field.strip() for field in fields.split(','))
+        return requested | self.always_included_fields
+
+    def related_counts_requested(self):
+        return is_truthy(self.get_query_param('related_counts'))
+
+    def get_requested_embeds(self):
+        """Names of the related resources requested with e.g.
+        ``?embed=contributors,children``. Resources that are themselves
+        embedded do not embed any further.
+        """
+        embed = self.get_query_param('embed')
+        if not embed or self.context.get('embedded'):
+            return set()
+        return set(each.strip() for each in embed.split(',')) & self.embeddable_fields
+
+    def load_embeds(self, objs, embeds):
+        """Serialize the related resources named in `embeds` for all of `objs`.
+
+        :return: dict of object id -> dict of embed name -> serialized resources;
+            objects left out have nothing embedded
+        """
+        return {}
+
+    def get_embeds(self, obj, embeds):
+        if obj._id not in self._embeds:
+            self._embeds.update(self.load_embeds([obj], embeds))
+        return self._embeds.setdefault(obj._id, {})
+
+    def prefetch(self, objs):
+        """Load, in bulk, data needed to serialize a page of `objs`. Called
+        before a collection is serialized.
+        """
+        embeds = self.get_requested_embeds()
+        if embeds and objs:
+            self._embeds.update(self.load_embeds(objs, embeds))
+
     # overrides Serializer
     def to_representation(self, obj, envelope='data'):
-        """Serialize to final representation.
+        """Serialize to final representation. Fields left out of a sparse
+        fieldset are not computed.
 
         :param obj: Object to be serialized.
         :param envelope: Key for resource object.
@@ -169,7 +245,24 @@ class JSONAPISerializer(ser.Serializer):
         meta = getattr(self, 'Meta', None)
         type_ = getattr(meta, 'type_', None)
         assert type_ is not None, 'Must define Meta.type_'
-        data = super(JSONAPISerializer, self).to_representation(obj)
+        requested = self.get_requested_fields(type_)
+        data = collections.OrderedDict()
+        for field in self.fields.values():
+            if field.write_only:
+                continue
+            if requested is not None and field.field_name not in requested:
+                continue
+            try:
+                attribute = field.get_attribute(obj)
+            except SkipField:
+                continue
+            if attribute is None:
+                data[field.field_name] = None
+            else:
+                data[field.field_name] = field.to_representation(attribute)
+        embeds = self.get_requested_embeds()
+        if embeds:
+            data['embeds'] = self.get_embeds(obj, embeds)
         data['type'] = type_
         if envelope:
             ret[envelope] = data
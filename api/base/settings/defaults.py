@@ -74,6 +74,16 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Successful basic auth verifications are cached per process, to avoid
+# checking the password hash on every request
+API_AUTH_CACHE_ENABLED = True
+API_AUTH_CACHE_SIZE = 1000
+API_AUTH_CACHE_TTL = 60  # seconds
+
+# Totals of cursor-paginated lists are counted only on request, and cached
+CURSOR_PAGINATION_TOTAL_CACHE_SIZE = 1024
+CURSOR_PAGINATION_TOTAL_CACHE_TTL = 60 * 5  # seconds
+
 MIDDLEWARE_CLASSES = (
     # TokuMX transaction support
     # Needs to go before CommonMiddleware, so that transactions are always started,
@@ -154,6 +164,10 @@ SWAGGER_SETTINGS = {
         <pre>/users?filter[fullname]=meitn</pre>
         <p>You can filter on multiple fields, or the same field in different ways, by &-ing the query parameters together.</p>
         <pre>/users?filter[fullname]=lise&filter[family_name]=mei</pre>
+        <h3>Cursor pagination</h3>
+        <p>The node and user lists can also be walked with cursors, which stay fast however deep you go. Start with
+        an empty cursor and follow the "next" links; add page[total]=true if you need the total count.</p>
+        <pre>/nodes/?page[cursor]=</pre>
         <h3>Links</h3>
         <p>Responses will generally have associated links. These are helpers to keep you from having to construct
         URLs in your code or by hand. If you know the route to a high-level resource, then feel free to just go to that
@@ -10,6 +10,8 @@ from modularodm.exceptions import NoResultsFound
 from website import util as website_util  # noqa
 from website import settings as website_settings
 
+TRUTHY = set(['true', 'True', 1, '1'])
+
 
 def absolute_reverse(view_name, query_kwargs=None, args=None, kwargs=None):
     """Like django's `reverse`, except returns an absolute URL. Also add query parameters."""
@@ -19,6 +21,10 @@ def absolute_reverse(view_name, query_kwargs=None, args=None, kwargs=None):
     return url
 
 
+def is_truthy(value):
+    return value in TRUTHY
+
+
 def get_object_or_404(model_cls, query_or_pk):
     if isinstance(query_or_pk, basestring):
         query = Q('_id', 'eq', query_or_pk)
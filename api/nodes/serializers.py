@@ -1,9 +1,12 @@
 from rest_framework import serializers as ser
+from modularodm import Q
 
-from website.models import Node
+from website.models import Node, User
 from framework.auth.core import Auth
+from framework.mongo import database
 from rest_framework import exceptions
 from api.base.serializers import JSONAPISerializer, LinksField, Link, WaterbutlerLink
+from api.users.serializers import ContributorSerializer
 
 
 class NodeSerializer(JSONAPISerializer):
@@ -13,6 +16,7 @@ class NodeSerializer(JSONAPISerializer):
     category_choices = Node.CATEGORY_MAP.keys()
     category_choices_string = ', '.join(["'{}'".format(choice) for choice in category_choices])
     filterable_fields = frozenset(['title', 'description', 'public'])
+    embeddable_fields = frozenset(['contributors', 'children'])
 
     id = ser.CharField(read_only=True, source='_id')
     title = ser.CharField(required=True)
@@ -78,21 +82,163 @@ class NodeSerializer(JSONAPISerializer):
             auth = Auth(user)
         return auth
 
-    def get_node_count(self, obj):
+    def __init__(self, *args, **kwargs):
+        super(NodeSerializer, self).__init__(*args, **kwargs)
+        self._related_counts = {}
+
+    # overrides JSONAPISerializer
+    def prefetch(self, objs):
+        super(NodeSerializer, self).prefetch(objs)
+        if self.related_counts_requested():
+            self.load_related_counts(objs)
+
+    # overrides JSONAPISerializer
+    def load_embeds(self, objs, embeds):
+        """Serialize the contributors and viewable children of all of `objs`,
+        loading each kind of related resource with one query.
+        """
         auth = self.get_user_auth(self.context['request'])
-        nodes = [node for node in obj.nodes if node.can_view(auth) and node.primary]
-        return len(nodes)
+        nodes = {node._id: node for node in objs}
+        records = {
+            record['_id']: record
+            for record in database['node'].find(
+                {'_id': {'$in': list(nodes.keys())}},
+                {'nodes': True, 'contributors': True, 'visible_contributor_ids': True},
+            )
+        }
+        ret = {node_id: {} for node_id in nodes}
+        context = dict(self.context, embedded=True)
+
+        if 'contributors' in embeds:
+            users = {
+                user._id: user
+                for user in User.find(Q('_id', 'in', list(set(
+                    user_id for record in records.values() for user_id in record.get('contributors') or []
+                ))))
+            }
+            serializer = ContributorSerializer(context=context)
+            for node_id, record in records.items():
+                visible_ids = set(record.get('visible_contributor_ids') or [])
+                contributors = []
+                for user_id in record.get('contributors') or []:
+                    if user_id not in users:
+                        continue
+                    # Users are shared between nodes, so serialize before the next node
+                    users[user_id].bibliographic = user_id in visible_ids
+                    contributors.append(serializer.to_representation(users[user_id], envelope=None))
+                ret[node_id]['contributors'] = {'data': contributors}
+
+        if 'children' in embeds:
+            child_ids = {
+                node_id: [child_id for child_id, kind in record.get('nodes') or [] if kind == 'node']
+                for node_id, record in records.items()
+            }
+            children = {
+                child._id: child
+                for child in Node.find(Q('_id', 'in', [each for ids in child_ids.values() for each in ids]))
+            }
+            viewable = {}
+            for node_id, ids in child_ids.items():
+                # Admins on a node can view all of its children
+                is_admin_parent = None
+                viewable[node_id] = []
+                for child_id in ids:
+                    child = children.get(child_id)
+                    if child is None:
+                        continue
+                    if not (child.is_public or (auth.user and child.has_permission(auth.user, 'read', check_parent=False))):
+                        if is_admin_parent is None:
+                            is_admin_parent = bool(auth.user) and nodes[node_id].is_admin_parent(auth.user)
+                        if not is_admin_parent:
+                            continue
+                    viewable[node_id].append(child)
+            serializer = NodeSerializer(context=context)
+            serializer.prefetch([child for each in viewable.values() for child in each])
+            for node_id, each in viewable.items():
+                ret[node_id]['children'] = {
+                    'data': [serializer.to_representation(child, envelope=None) for child in each]
+                }
+
+        return ret
+
+    def get_node_count(self, obj):
+        return self.get_related_counts(obj)['children']
 
     def get_contrib_count(self, obj):
-        return len(obj.contributors)
+        return self.get_related_counts(obj)['contributors']
 
     def get_registration_count(self, obj):
-        auth = self.get_user_auth(self.context['request'])
-        registrations = [node for node in obj.node__registrations if node.can_view(auth)]
-        return len(registrations)
+        return self.get_related_counts(obj)['registrations']
 
     def get_pointers_count(self, obj):
-        return len(obj.nodes_pointer)
+        return self.get_related_counts(obj)['pointers']
+
+    def get_related_counts(self, obj):
+        if obj._id not in self._related_counts:
+            self.load_related_counts([obj])
+        return self._related_counts[obj._id]
+
+    def load_related_counts(self, nodes):
+        """Count the children, contributors, pointers and registrations of
+        each of `nodes` with three queries, whatever the number of nodes.
+        Only children and registrations the current user can view are counted.
+        """
+        auth = self.get_user_auth(self.context['request'])
+        nodes = {node._id: node for node in nodes}
+        child_ids = {}
+        for record in database['node'].find(
+            {'_id': {'$in': list(nodes.keys())}},
+            {'nodes': True, 'contributors': True},
+        ):
+            links = record.get('nodes') or []
+            child_ids[record['_id']] = [node_id for node_id, kind in links if kind == 'node']
+            self._related_counts[record['_id']] = {
+                'children': 0,
+                'contributors': len(record.get('contributors') or []),
+                'pointers': sum(1 for _, kind in links if kind == 'pointer'),
+                'registrations': 0,
+            }
+
+        children = {
+            record['_id']: record
+            for record in database['node'].find(
+                {'_id': {'$in': [each for ids in child_ids.values() for each in ids]}},
+                {'is_public': True, 'permissions': True},
+            )
+        }
+        for node_id, ids in child_ids.items():
+            # Admins on a node can view all of its children
+            is_admin_parent = None
+            for child_id in ids:
+                if child_id not in children:
+                    continue
+                if not self._can_view(children[child_id], auth):
+                    if is_admin_parent is None:
+                        is_admin_parent = bool(auth.user) and nodes[node_id].is_admin_parent(auth.user)
+                    if not is_admin_parent:
+                        continue
+                self._related_counts[node_id]['children'] += 1
+
+        for record in database['node'].find(
+            {'registered_from': {'$in': list(nodes.keys())}},
+            {'registered_from': True, 'is_public': True, 'permissions': True},
+        ):
+            if not self._can_view(record, auth):
+                # Rare; fall back to the full permission check
+                if not auth.user or not Node.load(record['_id']).can_view(auth):
+                    continue
+            self._related_counts[record['registered_from']]['registrations'] += 1
+
+    @staticmethod
+    def _can_view(record, auth):
+        """Whether a raw node record is public or readable by `auth.user`,
+        without checking permissions inherited from parents.
+        """
+        if record.get('is_public'):
+            return True
+        if not auth.user:
+            return False
+        return 'read' in (record.get('permissions') or {}).get(auth.user._id, [])
 
     @staticmethod
     def get_properties(obj):
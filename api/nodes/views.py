@@ -8,6 +8,8 @@ from framework.auth.core import Auth
 from website.models import Node, Pointer
 from api.users.serializers import ContributorSerializer
 from api.base.filters import ODMFilterMixin, ListFilterMixin
+from api.base.pagination import CursorPaginationMixin
+from api.base.conditional import ConditionalListMixin, ConditionalRetrieveMixin
 from api.base.utils import get_object_or_404, waterbutler_url_for
 from .serializers import NodeSerializer, NodePointersSerializer, NodeFilesSerializer
 from .permissions import ContributorOrPublic, ReadOnlyIfRegistration, ContributorOrPublicForPointers
@@ -28,7 +30,7 @@ class NodeMixin(object):
         return obj
 
 
-class NodeList(generics.ListCreateAPIView, ODMFilterMixin):
+class NodeList(CursorPaginationMixin, ConditionalListMixin, generics.ListCreateAPIView, ODMFilterMixin):
     """Projects and components.
 
     On the front end, nodes are considered 'projects' or 'components'. The difference between a project and a component
@@ -38,13 +40,16 @@ class NodeList(generics.ListCreateAPIView, ODMFilterMixin):
     project, and children nodes may have a category of project.
 
     By default, a GET will return a list of public nodes, sorted by date_modified. You can filter Nodes by their title,
-    description, and public fields.
+    description, and public fields. Pass an empty `page[cursor]` to page through the nodes by date_created instead,
+    following the `next` links.
     """
     permission_classes = (
         drf_permissions.IsAuthenticatedOrReadOnly,
     )
     serializer_class = NodeSerializer
     ordering = ('-date_modified', )  # default ordering
+    model_class = Node
+    cursor_ordering = '-date_created'
 
     # overrides ODMFilterMixin
     def get_default_odm_query(self):
@@ -79,7 +84,7 @@ class NodeList(generics.ListCreateAPIView, ODMFilterMixin):
         serializer.save(creator=user)
 
 
-class NodeDetail(generics.RetrieveUpdateDestroyAPIView, NodeMixin):
+class NodeDetail(ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView, NodeMixin):
     """Projects and component details.
 
     On the front end, nodes are considered 'projects' or 'components'. The difference between a project and a component
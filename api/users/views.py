@@ -5,6 +5,8 @@ from website.models import User, Node
 from framework.auth.core import Auth
 from api.base.utils import get_object_or_404
 from api.base.filters import ODMFilterMixin
+from api.base.pagination import CursorPaginationMixin
+from api.base.conditional import ConditionalListMixin, ConditionalRetrieveMixin
 from api.nodes.serializers import NodeSerializer
 from .serializers import UserSerializer
 
@@ -24,16 +26,19 @@ class UserMixin(object):
         return obj
 
 
-class UserList(generics.ListAPIView, ODMFilterMixin):
+class UserList(CursorPaginationMixin, ConditionalListMixin, generics.ListAPIView, ODMFilterMixin):
     """Users registered on the OSF.
 
-    You can filter on users by their id, fullname, given_name, middle_name, or family_name.
+    You can filter on users by their id, fullname, given_name, middle_name, or family_name. Pass an empty
+    `page[cursor]` to page through the users by date_registered, following the `next` links.
     """
     permission_classes = (
         drf_permissions.IsAuthenticatedOrReadOnly,
     )
     serializer_class = UserSerializer
     ordering = ('-date_registered')
+    model_class = User
+    cursor_ordering = '-date_registered'
 
     # overrides ODMFilterMixin
     def get_default_odm_query(self):
@@ -50,7 +55,7 @@ class UserList(generics.ListAPIView, ODMFilterMixin):
         return User.find(query)
 
 
-class UserDetail(generics.RetrieveAPIView, UserMixin):
+class UserDetail(ConditionalRetrieveMixin, generics.RetrieveAPIView, UserMixin):
     """Details about a specific user.
     """
     serializer_class = UserSerializer
@@ -60,11 +65,12 @@ class UserDetail(generics.RetrieveAPIView, UserMixin):
         return self.get_user()
 
 
-class UserNodes(generics.ListAPIView, UserMixin, ODMFilterMixin):
+class UserNodes(ConditionalListMixin, generics.ListAPIView, UserMixin, ODMFilterMixin):
     """Nodes belonging to a user.
 
     Return a list of nodes that the user contributes to. """
     serializer_class = NodeSerializer
+    model_class = Node
 
     # overrides ODMFilterMixin
     def get_default_odm_query(self):
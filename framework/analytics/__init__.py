@@ -6,6 +6,11 @@ from datetime import datetime
 
 from framework.mongo import database
 from framework.sessions import session
+from framework.analytics.counters import (
+    page_counters, merge_sketches, new_sketch, load_sketch,
+)
+
+from website import settings
 
 from flask import request
 
@@ -72,49 +77,57 @@ def build_page(rex, kwargs):
         return None
 
 
+def get_visitor_id():
+    """Identify the current visitor for unique counts: the logged-in user,
+    else the client address forwarded by the load balancer, so that counts
+    survive new sessions, else the session. The connecting address is not
+    used, since behind the load balancer it is the same for every visitor.
+    """
+    user_id = session.data.get('auth_user_id')
+    if user_id:
+        return u'user:{}'.format(user_id)
+    try:
+        forwarded_for = request.headers.get('X-Forwarded-For')
+    except RuntimeError:
+        forwarded_for = None
+    if forwarded_for:
+        # The first address is the client's; proxies append their own
+        return u'addr:{}'.format(forwarded_for.split(',')[0].strip())
+    return u'session:{}'.format(session._id)
+
+
 def update_counter(page, db=None):
     """Update counters for page.
 
     :param str page: Colon-delimited page key in analytics collection
-    :param db: MongoDB database or `None`
+    :param db: MongoDB database or `None`. Updates are buffered in-process
+        unless a database is given or buffering is disabled.
     """
-    db = db or database
-    collection = db['pagecounters']
-
     date = datetime.utcnow()
     date = date.strftime('%Y/%m/%d')
 
     page = clean_page(page)
 
-    d = {'$inc': {}}
-
-    visited_by_date = session.data.get('visited_by_date')
-    if not visited_by_date:
-        visited_by_date = {'date': date, 'pages': []}
+    increments = {
+        'total': 1,
+        'date.%s.total' % date: 1,
+    }
+    visitor = get_visitor_id()
+    visitors = {
+        'visitors': visitor,
+        'date.%s.visitors' % date: visitor,
+    }
 
-    if date == visited_by_date['date']:
-        if page not in visited_by_date['pages']:
-            d['$inc']['date.%s.unique' % date] = 1
-            visited_by_date['pages'].append(page)
-            session.data['visited_by_date'] = visited_by_date
+    if db is None and settings.ANALYTICS_BUFFER_COUNTERS:
+        page_counters.add(page, increments, visitors=visitors)
     else:
-        visited_by_date['date'] = date
-        visited_by_date['pages'] = []
-        d['$inc']['date.%s.unique' % date] = 1
-        visited_by_date['pages'].append(page)
-        session.data['visited_by_date'] = visited_by_date
-
-    d['$inc']['date.%s.total' % date] = 1
-
-    visited = session.data.get('visited')  # '/project/x/, project/y/'
-    if not visited:
-        visited = []
-    if page not in visited:
-        d['$inc']['unique'] = 1
-        visited.append(page)
-        session.data['visited'] = visited
-    d['$inc']['total'] = 1
-    collection.update({'_id': page}, d, True, False)
+        collection = (db or database)['pagecounters']
+        collection.update({'_id': page}, {'$inc': increments}, True, False)
+        sketches = {}
+        for field, each in visitors.items():
+            sketches[field] = new_sketch()
+            sketches[field].add(each)
+        merge_sketches(collection, page, sketches)
 
 
 def update_counters(rex, db=None):
@@ -130,27 +143,34 @@ def update_counters(rex, db=None):
         def wrapped(*args, **kwargs):
             ret = func(*args, **kwargs)
             page = build_page(rex, kwargs)
-            update_counter(page, db or database)
+            update_counter(page, db)
             return ret
         return wrapped
     return wrapper
 
 
 def get_basic_counters(page, db=None):
+    """Return the unique and total counts for `page`, including updates
+    buffered in this process but not yet written.
+
+    Unique visitors are estimated from the page's visitor sketch, plus the
+    exact ``unique`` count kept before sketches were introduced.
+    """
     db = db or database
     collection = db['pagecounters']
-    unique = 0
-    total = 0
-    collection = database['pagecounters']
+    page = clean_page(page)
     result = collection.find_one(
-        {'_id': clean_page(page)},
-        {'total': 1, 'unique': 1}
+        {'_id': page},
+        {'total': 1, 'unique': 1, 'visitors': 1}
     )
-    if result:
-        if 'unique' in result:
-            unique = result['unique']
-        if 'total' in result:
-            total = result['total']
-        return unique, total
-    else:
+    pending = page_counters.get_pending(page)
+    if not result and not pending:
         return None, None
+    result = result or {}
+    visitors = load_sketch(result.get('visitors'))
+    pending_visitors = page_counters.get_pending_sketch(page, 'visitors')
+    if pending_visitors:
+        visitors.merge(pending_visitors)
+    unique = result.get('unique', 0) + visitors.count()
+    total = result.get('total', 0) + pending.get('total', 0)
+    return unique, total
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""In-process aggregation of page counter updates.
+
+Increments are summed per page and written to the ``pagecounters`` collection
+as one ``$inc`` update per page by a background thread, every
+``ANALYTICS_FLUSH_INTERVAL`` seconds or as soon as ``ANALYTICS_FLUSH_THRESHOLD``
+events are pending. Visitors are collected in per-page HyperLogLog sketches
+that are merged into the stored sketches on flush; see `merge_sketches`.
+Updates still buffered when the process exits are flushed by an ``atexit``
+hook.
+"""
+
+import time
+import atexit
+import logging
+import threading
+import collections
+
+from website import settings
+from framework.analytics.sketches import HyperLogLog
+
+
+logger = logging.getLogger(__name__)
+
+# Revision of the sketches stored on a counter document, used to merge
+# sketches written concurrently by several processes
+SKETCH_REVISION_FIELD = 'sketch_rev'
+MAX_MERGE_ATTEMPTS = 5
+
+
+def new_sketch():
+    return HyperLogLog(precision=settings.ANALYTICS_SKETCH_PRECISION)
+
+
+def load_sketch(value):
+    return HyperLogLog.from_string(value, precision=settings.ANALYTICS_SKETCH_PRECISION)
+
+
+def get_field(document, field):
+    """Get a dotted `field`, e.g. ``date.2015/06/01.visitors``, from a
+    document.
+    """
+    for key in field.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(key)
+    return document
+
+
+def merge_sketches(collection, page, sketches):
+    """Merge `sketches`, a dict mapping dotted field names to sketches, into
+    the sketches stored on the counter document of `page`, which must exist.
+    Uses compare-and-set on the document's sketch revision, retrying if
+    another process merged first. Returns whether the merge was written.
+    """
+    projection = dict((field, True) for field in sketches)
+    projection[SKETCH_REVISION_FIELD] = True
+    for _ in range(MAX_MERGE_ATTEMPTS):
+        document = collection.find_one({'_id': page}, projection)
+        if document is None:
+            return False
+        revision = document.get(SKETCH_REVISION_FIELD)
+        merged = dict(
+            (field, load_sketch(get_field(document, field)).merge(sketch).to_string())
+            for field, sketch in sketches.items()
+        )
+        query = {'_id': page, SKETCH_REVISION_FIELD: revision}
+        if revision is None:
+            query[SKETCH_REVISION_FIELD] = {'$exists': False}
+        result = collection.update(query, {
+            '$set': merged,
+            '$inc': {SKETCH_REVISION_FIELD: 1},
+        })
+        if result and result.get('n'):
+            return True
+    logger.error('Could not merge visitor sketches for {}'.format(page))
+    return False
+
+
+class CounterBuffer(object):
+
+    def __init__(self, collection_name='pagecounters'):
+        self.collection_name = collection_name
+        self.pending = collections.defaultdict(collections.Counter)
+        self.sketches = collections.defaultdict(dict)
+        self.num_events = 0
+        self.last_flush = time.time()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, page, increments, visitors=None):
+        """Buffer `increments`, a dict mapping counter fields to amounts, for
+        the counter document of `page`. `visitors` maps sketch fields to the
+        visitor to add to them.
+        """
+        with self._lock:
+            self.pending[page].update(increments)
+            for field, visitor in (visitors or {}).items():
+                if field not in self.sketches[page]:
+                    self.sketches[page][field] = new_sketch()
+                self.sketches[page][field].add(visitor)
+            self.num_events += 1
+            should_flush = self.num_events >= settings.ANALYTICS_FLUSH_THRESHOLD
+        self._ensure_worker()
+        if should_flush:
+            self._wakeup.set()
+
+    def get_pending(self, page):
+        """Increments buffered for `page` that have not been written yet."""
+        with self._lock:
+            return dict(self.pending.get(page, {}))
+
+    def get_pending_sketch(self, page, field):
+        """A copy of the buffered sketch for `field` of `page`, or None."""
+        with self._lock:
+            sketch = self.sketches.get(page, {}).get(field)
+            return new_sketch().merge(sketch) if sketch else None
+
+    def flush(self, db=None):
+        """Write all buffered updates. Returns the number of pages updated."""
+        from framework.mongo import database
+        collection = (db or database)[self.collection_name]
+        with self._lock:
+            pending, self.pending = self.pending, collections.defaultdict(collections.Counter)
+            sketches, self.sketches = self.sketches, collections.defaultdict(dict)
+            self.num_events = 0
+            self.last_flush = time.time()
+        for page in set(pending) | set(sketches):
+            increments = pending.get(page)
+            try:
+                if increments:
+                    collection.update({'_id': page}, {'$inc': dict(increments)}, True, False)
+            except Exception:
+                logger.exception('Could not update counters for {}'.format(page))
+                # Keep the increments and visitors for the next flush
+                self.requeue(page, increments, sketches.get(page))
+                continue
+            if not sketches.get(page):
+                continue
+            try:
+                merged = merge_sketches(collection, page, sketches[page])
+            except Exception:
+                logger.exception('Could not merge visitor sketches for {}'.format(page))
+                merged = False
+            if not merged:
+                self.requeue(page, None, sketches[page])
+        return len(set(pending) | set(sketches))
+
+    def requeue(self, page, increments=None, sketches=None):
+        """Return updates that could not be written to the buffer, combining
+        them with any buffered since the flush started.
+        """
+        with self._lock:
+            if increments:
+                self.pending[page].update(increments)
+            for field, sketch in (sketches or {}).items():
+                if field in self.sketches[page]:
+                    self.sketches[page][field].merge(sketch)
+                else:
+                    self.sketches[page][field] = sketch
+
+    def _ensure_worker(self):
+        # Also restarts the worker in processes forked after it was started
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='analytics-flush')
+                    self._thread.daemon = True
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.ANALYTICS_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            if self.pending or self.sketches:
+                self.flush()
+
+
+page_counters = CounterBuffer()
+
+
+@atexit.register
+def flush_on_exit():
+    if page_counters.pending or page_counters.sketches:
+        page_counters.flush()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Fixed-size probabilistic data structures for analytics."""
+
+import math
+import base64
+import hashlib
+import struct
+
+
+def _hash(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return struct.unpack('<Q', hashlib.md5(value).digest()[:8])[0]
+
+
+class HyperLogLog(object):
+    """Estimates the number of distinct strings added using ``2 ** precision``
+    one-byte registers, with a standard error of about
+    ``1.04 / sqrt(2 ** precision)``. Small counts are close to exact. Sketches
+    of the same precision can be merged, and serialize to a short base64
+    string for storage in counter documents.
+    """
+
+    def __init__(self, precision=8, registers=None):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        if registers is not None:
+            self.registers = bytearray(registers)
+        else:
+            self.registers = bytearray(self.num_registers)
+
+    def add(self, value):
+        """Add `value`; return whether the sketch changed."""
+        hashed = _hash(value)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1 bit in the remaining bits
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Merge `other` into this sketch in place; returns this sketch."""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision')
+        for index, rank in enumerate(other.registers):
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+        return self
+
+    def count(self):
+        m = float(self.num_registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = sum(1 for rank in self.registers if rank == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_string(self):
+        return base64.b64encode(bytes(self.registers))
+
+    @classmethod
+    def from_string(cls, value, precision=8):
+        """Load a sketch serialized by `to_string`; returns an empty sketch
+        if `value` is missing or has a different precision.
+        """
+        if value:
+            try:
+                registers = base64.b64decode(value)
+            except TypeError:
+                registers = None
+            if registers is not None and len(registers) == 1 << precision:
+                return cls(precision=precision, registers=registers)
+        return cls(precision=precision)
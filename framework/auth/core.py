@@ -305,6 +305,9 @@ class User(GuidStoredObject, AddonModelMixin):
     date_registered = fields.DateTimeField(auto_now_add=dt.datetime.utcnow,
                                            index=True)
 
+    # the date this user was last saved, updated whenever any field changes
+    date_saved = fields.DateTimeField(auto_now=dt.datetime.utcnow, index=True)
+
     # watched nodes are stored via a list of WatchConfigs
     watched = fields.ForeignField("WatchConfig", list=True, backref="watched")
 
@@ -866,7 +869,7 @@ class User(GuidStoredObject, AddonModelMixin):
 
         """
         for node in self.node__contributed:
-            node.update_search()
+            node.update_search(saved_fields=['visible_contributor_ids'])
 
     def update_search_nodes_contributors(self):
         """
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Pool of authenticated SMTP connections, kept open between messages so a
+worker does one TLS handshake and login per connection rather than per
+message. To try it locally, run ``inv mailserver`` and point ``MAIL_SERVER``
+at ``localhost:1025`` with ``ttls`` and ``login`` off.
+"""
+import os
+import time
+import socket
+import smtplib
+import logging
+import threading
+import contextlib
+import collections
+
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+# Errors that only concern the message being sent; the connection is fine
+MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+# Errors after which a pooled connection should be dropped and a new one tried
+CONNECTION_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    socket.error,
+)
+
+
+class SMTPConnectionPool(object):
+    """Idle SMTP connections, keyed by server and credentials.
+
+    :param int maxsize: Most idle connections kept per server and user
+    :param int max_idle: Seconds after which an idle connection is checked
+        with NOOP before it is reused
+    """
+    def __init__(self, maxsize=None, max_idle=None):
+        self.maxsize = maxsize if maxsize is not None else settings.MAIL_POOL_SIZE
+        self.max_idle = max_idle if max_idle is not None else settings.MAIL_POOL_MAX_IDLE
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self, mail_server, username, password, ttls, login):
+        conn = smtplib.SMTP(mail_server)
+        conn.ehlo()
+        if ttls:
+            conn.starttls()
+            conn.ehlo()
+        if login:
+            conn.login(username, password)
+        return conn
+
+    def _is_alive(self, conn):
+        try:
+            return conn.noop()[0] == 250
+        except CONNECTION_ERRORS + (smtplib.SMTPException, ):
+            return False
+
+    def _check_pid(self):
+        # Connections must not be shared with forked workers
+        if os.getpid() != self._pid:
+            self._idle = collections.defaultdict(list)
+            self._pid = os.getpid()
+
+    def acquire(self, mail_server, username, password, ttls, login, fresh=False):
+        key = (mail_server, username, ttls, login)
+        while not fresh:
+            with self._lock:
+                self._check_pid()
+                if not self._idle[key]:
+                    break
+                conn, last_used = self._idle[key].pop()
+            if time.time() - last_used < self.max_idle or self._is_alive(conn):
+                return conn
+            self.discard(conn)
+        return self._connect(mail_server, username, password, ttls, login)
+
+    def release(self, conn, mail_server, username, ttls, login):
+        key = (mail_server, username, ttls, login)
+        with self._lock:
+            self._check_pid()
+            if len(self._idle[key]) < self.maxsize:
+                self._idle[key].append((conn, time.time()))
+                return
+        self.discard(conn)
+
+    def discard(self, conn):
+        try:
+            conn.quit()
+        except CONNECTION_ERRORS + (smtplib.SMTPException, ):
+            conn.close()
+
+    @contextlib.contextmanager
+    def connection(self, mail_server, username, password, ttls, login, fresh=False):
+        """Check out a connection, returning it to the pool afterwards unless
+        it failed.
+        """
+        conn = self.acquire(mail_server, username, password, ttls, login, fresh=fresh)
+        try:
+            yield conn
+        except MESSAGE_ERRORS:
+            self.release(conn, mail_server, username, ttls, login)
+            raise
+        except:
+            self.discard(conn)
+            raise
+        self.release(conn, mail_server, username, ttls, login)
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_server, username=None,
+                 password=None, ttls=True, login=True):
+        """Send a message over a pooled connection. If the connection turns
+        out to have been dropped by the server, send again on a new one.
+        """
+        kwargs = dict(
+            mail_server=mail_server,
+            username=username,
+            password=password,
+            ttls=ttls,
+            login=login,
+        )
+        try:
+            with self.connection(**kwargs) as conn:
+                return conn.sendmail(from_addr, to_addrs, msg)
+        except CONNECTION_ERRORS as error:
+            logger.warning('SMTP connection to {0} failed ({1!r}); reconnecting'.format(mail_server, error))
+        with self.connection(fresh=True, **kwargs) as conn:
+            return conn.sendmail(from_addr, to_addrs, msg)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, collections.defaultdict(list)
+        for connections in idle.values():
+            for conn, _ in connections:
+                self.discard(conn)
+
+
+pool = SMTPConnectionPool()
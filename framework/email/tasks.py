@@ -1,13 +1,53 @@
+import socket
 import smtplib
 import logging
 from email.mime.text import MIMEText
 
+from celery import signature
+
 from framework.tasks import app
+from framework.email.pool import pool
 from website import settings
 
 logger = logging.getLogger(__name__)
 
 
+def _build_message(from_addr, to_addr, subject, message, mimetype):
+    msg = MIMEText(message, mimetype, _charset='utf-8')
+    msg['Subject'] = subject
+    msg['From'] = from_addr
+    msg['To'] = to_addr
+    return msg
+
+
+def _deliver(from_addr, to_addr, msg, ttls, login, username, password, mail_server):
+    if settings.MAIL_POOL_CONNECTIONS:
+        pool.sendmail(
+            from_addr,
+            [to_addr],
+            msg.as_string(),
+            mail_server=mail_server,
+            username=username,
+            password=password,
+            ttls=ttls,
+            login=login,
+        )
+        return
+    s = smtplib.SMTP(mail_server)
+    s.ehlo()
+    if ttls:
+        s.starttls()
+        s.ehlo()
+    if login:
+        s.login(username, password)
+    s.sendmail(
+        from_addr=from_addr,
+        to_addrs=[to_addr],
+        msg=msg.as_string()
+    )
+    s.quit()
+
+
 @app.task
 def send_email(from_addr, to_addr, subject, message, mimetype='html', ttls=True, login=True,
                 username=None, password=None, mail_server=None):
@@ -32,22 +72,50 @@ def send_email(from_addr, to_addr, subject, message, mimetype='html', ttls=True,
         logger.error('Mail username and password not set; skipping send.')
         return
 
-    msg = MIMEText(message, mimetype, _charset='utf-8')
-    msg['Subject'] = subject
-    msg['From'] = from_addr
-    msg['To'] = to_addr
-
-    s = smtplib.SMTP(mail_server)
-    s.ehlo()
-    if ttls:
-        s.starttls()
-        s.ehlo()
-    if login:
-        s.login(username, password)
-    s.sendmail(
-        from_addr=from_addr,
-        to_addrs=[to_addr],
-        msg=msg.as_string()
-    )
-    s.quit()
+    msg = _build_message(from_addr, to_addr, subject, message, mimetype)
+    _deliver(from_addr, to_addr, msg, ttls, login, username, password, mail_server)
     return True
+
+
+@app.task
+def send_emails(messages, ttls=True, login=True, username=None, password=None, mail_server=None):
+    """Send a batch of emails over pooled connections. A failed message does
+    not stop the rest of the batch.
+
+    :param messages: list of dicts with keys from_addr, to_addr, subject,
+        message and mimetype, and optionally callback, a celery signature
+        that is run only if that message was sent
+    :return: list of booleans, whether each message was sent; None if
+        sending email is disabled, as with `send_email`
+    """
+    username = username or settings.MAIL_USERNAME
+    password = password or settings.MAIL_PASSWORD
+    mail_server = mail_server or settings.MAIL_SERVER
+
+    if not settings.USE_EMAIL:
+        return
+    if login and (username is None or password is None):
+        logger.error('Mail username and password not set; skipping send.')
+        return
+
+    results = []
+    for each in messages:
+        msg = _build_message(
+            each['from_addr'],
+            each['to_addr'],
+            each['subject'],
+            each['message'],
+            each.get('mimetype', 'html'),
+        )
+        try:
+            _deliver(each['from_addr'], each['to_addr'], msg, ttls, login, username, password, mail_server)
+        except (smtplib.SMTPException, socket.error):
+            logger.exception('Could not send email to {0}'.format(each['to_addr']))
+            results.append(False)
+            continue
+        results.append(True)
+        if each.get('callback'):
+            signature(each['callback']).delay()
+    sent = sum(results)
+    logger.info('Sent {0} of {1} emails'.format(sent, len(messages)))
+    return results
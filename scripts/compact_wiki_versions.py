@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Compact existing wiki histories: every non-current version that is not a
+periodic snapshot is stored as a delta against its snapshot. Versions shared
+with forks or registrations are left as they are. Reads are unaffected;
+`NodeWikiPage.load` reconstructs the content.
+
+    python -m scripts.compact_wiki_versions dry
+"""
+import sys
+import logging
+
+from modularodm import Q
+
+from scripts import utils as scripts_utils
+from website.app import init_app
+from website.models import Node
+from website.addons.wiki.model import NodeWikiPage, snapshot_position, is_version_shared
+
+logger = logging.getLogger(__name__)
+
+
+def get_targets():
+    return Node.find(Q('wiki_pages_versions', 'ne', {}))
+
+
+def compact_page_history(node, version_ids, dry=True):
+    """Compact the version list of one wiki page of `node`. Returns the number
+    of versions compacted (or that would be, on a dry run).
+    """
+    count = 0
+    for position in range(len(version_ids) - 1):
+        base_position = snapshot_position(position)
+        if position == base_position:
+            continue
+        page = NodeWikiPage.load(version_ids[position])
+        if page is None or page.is_compacted or is_version_shared(page, node):
+            continue
+        base = NodeWikiPage.load(version_ids[base_position])
+        if dry:
+            count += 1
+        elif page.compact(base):
+            count += 1
+    return count
+
+
+def main(dry=True):
+    count = 0
+    for node in get_targets():
+        for key, version_ids in node.wiki_pages_versions.items():
+            n_compacted = compact_page_history(node, version_ids, dry=dry)
+            if n_compacted:
+                logger.info('Compacted {0} versions of wiki page {1} on node {2}'.format(
+                    n_compacted, key, node._id
+                ))
+            count += n_compacted
+    logger.info('Compacted {} wiki versions'.format(count))
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        scripts_utils.add_file_logger(logger, __file__)
+    init_app(routes=False, set_backends=True)
+    main(dry=dry)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Remove the page lists and filters that were stored in sessions to count
+unique page visits, now that unique visitors are counted with sketches stored
+on the counter documents.
+
+Existing `unique` counts on `pagecounters` documents are kept as they are:
+`get_basic_counters` adds the visitors counted by the sketch to them. The
+visitors behind the old counts were never recorded, so there is nothing to
+convert.
+
+    python -m scripts.migrate_unique_visitors dry
+"""
+import sys
+import logging
+
+from framework.mongo import database
+from scripts import utils as scripts_utils
+from website.app import init_app
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEYS = [
+    'visited',
+    'visited_by_date',
+    'visited_filter',
+    'visited_filter_date',
+    'visited_today_filter',
+]
+
+
+def get_query():
+    return {
+        '$or': [
+            {'data.{}'.format(key): {'$exists': True}}
+            for key in SESSION_KEYS
+        ]
+    }
+
+
+def main(dry=True):
+    count = database['session'].find(get_query()).count()
+    logger.info('Removing visit tracking from {} sessions'.format(count))
+    if not dry:
+        database['session'].update(
+            get_query(),
+            {'$unset': dict(('data.{}'.format(key), '') for key in SESSION_KEYS)},
+            multi=True,
+        )
+    legacy = database['pagecounters'].find({'unique': {'$exists': True}}).count()
+    logger.info('{} page counters keep their existing unique counts'.format(legacy))
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        scripts_utils.add_file_logger(logger, __file__)
+    init_app(routes=False, set_backends=True)
+    main(dry=dry)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Backfill `NodeWikiPage.rendered_text` for wiki versions saved before the
+plain-text rendering was stored, so the search indexer stops re-rendering
+them on every node update. Rendering a page also stores its HTML
+(`rendered_html`), which is otherwise backfilled lazily when pages are viewed.
+
+    python -m scripts.migrate_wiki_rendered_text dry
+"""
+import sys
+import logging
+
+from modularodm import Q
+
+from framework.mongo import database
+from scripts import utils as scripts_utils
+from website.app import init_app
+from website.addons.wiki.model import NodeWikiPage, html_to_text
+
+logger = logging.getLogger(__name__)
+
+
+def get_targets():
+    return NodeWikiPage.find(Q('rendered_text', 'eq', None))
+
+
+def migrate_page(page, dry=True):
+    if page.node is None:
+        logger.warning('Wiki page {} has no node; skipping'.format(page._id))
+        return False
+    text = html_to_text(page.html(page.node))
+    if not dry:
+        # Write directly to avoid `NodeWikiPage.save` reindexing the node
+        database['nodewikipage'].update(
+            {'_id': page._id},
+            {'$set': {'rendered_text': text}},
+        )
+    return True
+
+
+def main(dry=True):
+    count = 0
+    for page in get_targets():
+        if migrate_page(page, dry=dry):
+            count += 1
+    logger.info('Rendered {} wiki pages'.format(count))
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        scripts_utils.add_file_logger(logger, __file__)
+    app = init_app(routes=True, set_backends=True)
+    with app.test_request_context():
+        main(dry=dry)
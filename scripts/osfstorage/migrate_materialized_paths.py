@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Backfill the stored materialized path and ancestor ids of every
+`OsfStorageFileNode`. Each file tree is loaded with one query and written with
+direct database updates, so the script does not depend on the parent chain
+being cached.
+"""
+
+import logging
+
+from modularodm import Q
+
+from framework.mongo import database
+from framework.transactions.context import TokuTransaction
+
+from website.app import init_app
+from website.addons.osfstorage.model import OsfStorageNodeSettings
+
+from scripts import utils as script_utils
+
+
+logger = logging.getLogger(__name__)
+
+
+def compute_positions(records, root_id):
+    """Compute `(materialized_path, ancestor_ids)` for each record of a file
+    tree reachable from `root_id`. `records` are raw file node documents.
+    """
+    children = {}
+    for record in records:
+        children.setdefault(record.get('parent'), []).append(record)
+
+    positions = {root_id: ('/', [])}
+    stack = [root_id]
+    while stack:
+        parent_id = stack.pop()
+        parent_path, parent_ancestors = positions[parent_id]
+        for child in children.get(parent_id, []):
+            is_folder = child['kind'] == 'folder'
+            positions[child['_id']] = (
+                u'{}{}{}'.format(parent_path, child['name'], '/' if is_folder else ''),
+                parent_ancestors + [parent_id],
+            )
+            if is_folder:
+                stack.append(child['_id'])
+    return positions
+
+
+def migrate_tree(node_settings, dry_run=True):
+    records = list(database['osfstoragefilenode'].find(
+        {'node_settings': node_settings._id},
+        {'name': True, 'kind': True, 'parent': True, '_materialized_path': True},
+    ))
+    positions = compute_positions(records, node_settings.root_node._id)
+    count = 0
+    for record in records:
+        if record['_id'] not in positions:
+            logger.warning('File node {} is not attached to its root'.format(record['_id']))
+            continue
+        path, ancestor_ids = positions[record['_id']]
+        if record.get('_materialized_path') == path:
+            continue
+        count += 1
+        if not dry_run:
+            database['osfstoragefilenode'].update(
+                {'_id': record['_id']},
+                {'$set': {'_materialized_path': path, 'ancestor_ids': ancestor_ids}},
+            )
+    return count
+
+
+def get_targets():
+    return OsfStorageNodeSettings.find(Q('root_node', 'ne', None))
+
+
+def main(dry_run=True):
+    count = 0
+    for node_settings in get_targets():
+        try:
+            with TokuTransaction():
+                count += migrate_tree(node_settings, dry_run=dry_run)
+        except Exception as error:
+            logger.error('Could not migrate file tree of {0}'.format(node_settings._id))
+            logger.exception(error)
+    logger.info('Updated {0} file nodes'.format(count))
+
+
+if __name__ == '__main__':
+    import sys
+    dry_run = 'dry' in sys.argv
+    if not dry_run:
+        script_utils.add_file_logger(logger, __file__)
+    init_app(set_backends=True, routes=False)
+    main(dry_run=dry_run)
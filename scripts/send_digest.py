@@ -1,13 +1,25 @@
-"""Script for sending OSF email digests to subscribed users and removing the records once sent."""
+"""Script for sending OSF email digests to subscribed users and removing the records once sent.
+
+Digests are streamed from the database one user at a time, rendered in
+batches, and delivered by a pool of worker threads. Before a batch is handed
+to a worker its records are marked as being sent. Each user's records are
+removed as soon as their email has gone out, and unmarked if it failed. If
+the script is interrupted, records that were left marked were not emailed,
+so the next run unmarks and sends them.
+"""
 
 import datetime
 import logging
-from bson.code import Code
+import operator
+import itertools
+import collections
+from multiprocessing.pool import ThreadPool
 
 from modularodm import Q
 
 from framework import sentry
 from framework.auth.core import User
+from framework.email import tasks as email_tasks
 from framework.mongo import database as db
 from framework.tasks import app as celery_app
 from scripts import utils as script_utils
@@ -33,45 +45,160 @@ def main():
     script_utils.add_file_logger(logger, __file__)
     app = init_app(attach_request_handlers=False)
     celery_app.main = 'scripts.send_digest'
+    unmark_interrupted_digest_notifications()
     grouped_digests = group_digest_notifications_by_user()
     with app.test_request_context():
         send_digest(grouped_digests)
 
 
-def send_digest(grouped_digests):
-    """ Send digest emails and remove digests for sent messages in a callback.
+def send_digest(grouped_digests, workers=None, batch_size=None):
+    """ Send digest emails and remove digests for sent messages.
     :param grouped_digests: digest notification messages from the past 24 hours grouped by user
-    :return:
+    :param workers: number of threads delivering emails
+    :param batch_size: number of users whose digests are sent together
+    :return: number of users whose digests were sent
     """
-    for group in grouped_digests:
-        user = User.load(group['user_id'])
-        if not user:
-            sentry.log_exception()
-            sentry.log_message("A user with this username does not exist.")
+    workers = workers or settings.DIGEST_WORKERS
+    batch_size = batch_size or settings.MAIL_BATCH_SIZE
+    pool = ThreadPool(workers)
+    in_flight = collections.deque()
+    sent = 0
+    try:
+        # Render in this thread, which has the app context; workers only
+        # talk to the mail server. At most two batches per worker are
+        # rendered ahead, so memory use does not grow with the number of users.
+        for groups in iter_chunks(grouped_digests, batch_size):
+            batch = prepare_batch(groups)
+            if not batch:
+                continue
+            in_flight.append(pool.apply_async(deliver_batch, (batch, )))
+            if len(in_flight) >= workers * 2:
+                sent += finish_batch(*in_flight.popleft().get())
+        while in_flight:
+            sent += finish_batch(*in_flight.popleft().get())
+    finally:
+        pool.close()
+        pool.join()
+    logger.info('Sent email digests to {0} users'.format(sent))
+    return sent
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
             return
+        yield chunk
+
+
+def prepare_batch(groups):
+    """Render the digest emails for `groups` and mark their records as being
+    sent.
+
+    :return: list of (digest ids, message) pairs
+    """
+    users = {
+        user._id: user
+        for user in User.find(Q('_id', 'in', [group['user_id'] for group in groups]))
+    }
+    batch = []
+    for group in groups:
+        user = users.get(group['user_id'])
+        if not user:
+            sentry.log_message('A user with this username does not exist.')
+            continue
 
         info = group['info']
-        digest_notification_ids = [message['_id'] for message in info]
         sorted_messages = group_messages_by_node(info)
 
         if sorted_messages:
-            logger.info('Sending email digest to user {0!r}'.format(user))
-            mails.send_mail(
-                to_addr=user.username,
+            subject, message = mails.render_mail(
+                mails.DIGEST,
                 mimetype='html',
-                mail=mails.DIGEST,
                 name=user.fullname,
                 message=sorted_messages,
-                callback=remove_sent_digest_notifications.si(
-                    digest_notification_ids=digest_notification_ids
-                )
             )
+            batch.append((
+                [each['_id'] for each in info],
+                {
+                    'from_addr': settings.FROM_EMAIL,
+                    'to_addr': user.username,
+                    'subject': subject,
+                    'message': message,
+                    'mimetype': 'html',
+                },
+            ))
+    if batch:
+        digest_ids = [each for ids, _ in batch for each in ids]
+        db['notificationdigest'].update(
+            {'_id': {'$in': digest_ids}},
+            {'$set': {'sending': True}},
+            multi=True,
+        )
+    return batch
+
+
+def deliver_batch(batch):
+    """Send a batch of rendered digests, removing each user's digests as soon
+    as their email is sent. Runs in a worker thread.
+
+    :return: the batch, and whether each of its emails was sent
+    """
+    ttls = login = not settings.DEBUG_MODE
+    results = []
+    for digest_ids, message in batch:
+        # Sent one at a time so that an interruption can't lose track of
+        # which were sent; SMTP connections are pooled across calls
+        result = email_tasks.send_emails([message], ttls=ttls, login=login)
+        # None if sending email is disabled; treat the digests as delivered
+        sent = result is None or result[0]
+        if sent:
+            db['notificationdigest'].remove({'_id': {'$in': digest_ids}})
+        results.append(sent)
+    return batch, results
+
+
+def finish_batch(batch, results):
+    """Unmark the digests whose emails could not be sent, so that they are
+    retried on the next run.
+
+    :return: number of emails sent
+    """
+    failed_ids = [
+        each
+        for (digest_ids, _), sent in zip(batch, results) if not sent
+        for each in digest_ids
+    ]
+    if failed_ids:
+        logger.warning('Could not send {0} digest notifications; they will be retried'.format(len(failed_ids)))
+        db['notificationdigest'].update(
+            {'_id': {'$in': failed_ids}},
+            {'$unset': {'sending': True}},
+            multi=True,
+        )
+    return sum(1 for sent in results if sent)
+
+
+def unmark_interrupted_digest_notifications():
+    """Unmark digests that a previous, interrupted run was sending, so that
+    they are sent by this run. Digests are removed as soon as their email is
+    sent, so those left marked were not sent.
+    """
+    count = db['notificationdigest'].find({'sending': True}).count()
+    if count:
+        logger.warning('Unmarking {0} digest notifications left by an interrupted run'.format(count))
+        db['notificationdigest'].update(
+            {'sending': True},
+            {'$unset': {'sending': True}},
+            multi=True,
+        )
+    return count
 
 
 @celery_app.task
 def remove_sent_digest_notifications(digest_notification_ids=None):
-    for digest_id in digest_notification_ids:
-        NotificationDigest.remove(Q('_id', 'eq', digest_id))
+    NotificationDigest.remove(Q('_id', 'in', digest_notification_ids or []))
 
 
 def group_messages_by_node(notifications):
@@ -81,9 +208,11 @@ def group_messages_by_node(notifications):
     return d
 
 
-def group_digest_notifications_by_user():
-    """ Group digest notification messages from the past 24 hours by user
-    :return: [{
+def group_digest_notifications_by_user(cutoff=None):
+    """ Group digest notification messages from before `cutoff` (default: now)
+    by user. Reads a single cursor sorted by user, so only one user's
+    messages are held in memory at a time.
+    :return: iterator of {
                 'user_id': 'se8ea',
                 'info': [{
                     'message': {
@@ -94,31 +223,27 @@ def group_digest_notifications_by_user():
                     '_id': NotificationDigest._id
                 }, ...
                 }]
-              },
-              {
-                'user_id': ...
-              }]
+              }
     """
-    return db['notificationdigest'].group(
-        key={'user_id': 1},
-        condition={
-            'timestamp': {
-                '$lt': datetime.datetime.utcnow()
-            }
+    cursor = db['notificationdigest'].find(
+        {
+            'timestamp': {'$lt': cutoff or datetime.datetime.utcnow()},
+            'sending': {'$ne': True},
         },
-        initial={'info': []},
-        reduce=Code(
-            """
-            function(curr, result) {
-                result.info.push({
-                    'message': curr.message,
-                    'node_lineage': curr.node_lineage,
-                    '_id': curr._id
-                });
-            };
-            """
-        )
-    )
+        {'user_id': True, 'message': True, 'node_lineage': True},
+    ).sort([('user_id', 1), ('timestamp', 1)])
+    for user_id, records in itertools.groupby(cursor, key=operator.itemgetter('user_id')):
+        yield {
+            'user_id': user_id,
+            'info': [
+                {
+                    'message': record['message'],
+                    'node_lineage': record['node_lineage'],
+                    '_id': record['_id'],
+                }
+                for record in records
+            ],
+        }
 
 
 if __name__ == '__main__':
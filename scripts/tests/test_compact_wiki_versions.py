@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import mock
+from nose.tools import *  # noqa
+
+from tests.base import OsfTestCase
+from tests.factories import ProjectFactory
+
+from framework.auth.core import Auth
+
+from scripts.compact_wiki_versions import main
+
+
+class TestCompactWikiVersions(OsfTestCase):
+
+    @mock.patch('website.addons.wiki.model.WIKI_COMPACT_VERSIONS', False)
+    def setUp(self):
+        super(TestCompactWikiVersions, self).setUp()
+        self.project = ProjectFactory()
+        auth = Auth(user=self.project.creator)
+        content = u'\n'.join(u'line {}'.format(i) for i in range(100))
+        for i in range(3):
+            self.project.update_node_wiki('home', content + u'\nedit {}'.format(i), auth)
+        self.version_ids = self.project.wiki_pages_versions['home']
+
+    def stored(self, position):
+        return self.db['nodewikipage'].find_one({'_id': self.version_ids[position]})
+
+    def test_dry_run_does_not_compact(self):
+        main(dry=True)
+        assert_is_not_none(self.stored(1)['content'])
+
+    def test_compacts_history(self):
+        main(dry=False)
+        assert_is_not_none(self.stored(0)['content'])
+        assert_is_none(self.stored(1)['content'])
+        assert_is_not_none(self.stored(2)['content'])
+        assert_equal(self.project.get_wiki_page('home', version=2).content, u'\n'.join(u'line {}'.format(i) for i in range(100)) + u'\nedit 1')
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from nose.tools import *  # noqa
+
+from tests.base import OsfTestCase
+from tests.factories import ProjectFactory
+
+from website.addons.osfstorage.model import OsfStorageFileNode
+
+from scripts.osfstorage.migrate_materialized_paths import main
+
+
+class TestMigrateMaterializedPaths(OsfTestCase):
+
+    def setUp(self):
+        super(TestMigrateMaterializedPaths, self).setUp()
+        self.project = ProjectFactory()
+        self.node_settings = self.project.get_addon('osfstorage')
+        self.root = self.node_settings.root_node
+        self.folder = self.root.append_folder('Cloud')
+        self.child = self.folder.append_file('Carp')
+        # Simulate records created before paths were stored
+        self.db['osfstoragefilenode'].update(
+            {},
+            {'$set': {'_materialized_path': None, 'ancestor_ids': []}},
+            multi=True,
+        )
+        OsfStorageFileNode._clear_caches()
+
+    def test_dry_run(self):
+        main(dry_run=True)
+        assert_is_none(OsfStorageFileNode.load(self.child._id)._materialized_path)
+
+    def test_backfill(self):
+        main(dry_run=False)
+        OsfStorageFileNode._clear_caches()
+        child = OsfStorageFileNode.load(self.child._id)
+        assert_equal(child._materialized_path, '/Cloud/Carp')
+        assert_equal(child.ancestor_ids, [self.root._id, self.folder._id])
+        assert_equal(OsfStorageFileNode.load(self.folder._id)._materialized_path, '/Cloud/')
+        assert_equal(OsfStorageFileNode.load(self.root._id)._materialized_path, '/')
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from nose.tools import *  # noqa
+
+from tests.base import OsfTestCase
+
+from framework.sessions.model import Session
+
+from scripts.migrate_unique_visitors import main
+
+
+class TestMigrateUniqueVisitors(OsfTestCase):
+
+    def setUp(self):
+        super(TestMigrateUniqueVisitors, self).setUp()
+        self.session = Session(data={
+            'auth_user_id': 'abc12',
+            'visited': ['node:abc12'],
+            'visited_by_date': {'date': '2015/06/01', 'pages': ['node:abc12']},
+        })
+        self.session.save()
+
+    def get_data(self):
+        return self.db['session'].find_one({'_id': self.session._id})['data']
+
+    def test_dry_run(self):
+        main(dry=True)
+        assert_in('visited', self.get_data())
+
+    def test_removes_visit_tracking(self):
+        main(dry=False)
+        assert_equal(self.get_data(), {'auth_user_id': 'abc12'})
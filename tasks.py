@@ -315,10 +315,19 @@ def elasticsearch():
         print("Your system is not recognized, you will have to start elasticsearch manually")
 
 @task
-def migrate_search(delete=False, index=settings.ELASTIC_INDEX):
-    """Migrate the search-enabled models."""
+def migrate_search(delete=False, index=settings.ELASTIC_INDEX, workers=None, chunk_size=500, resume=True):
+    """Migrate the search-enabled models. Interrupted migrations resume from
+    their checkpoint unless `resume` is False.
+    """
+    import multiprocessing
     from website.search_migration.migrate import migrate
-    migrate(delete, index=index)
+    migrate(
+        delete,
+        index=index,
+        workers=int(workers or multiprocessing.cpu_count()),
+        chunk_size=int(chunk_size),
+        resume=resume,
+    )
 
 @task
 def rebuild_search():
@@ -7,10 +7,12 @@ import mock
 from nose.tools import *  # flake8: noqa
 
 from framework.auth import cas
+from framework.bcrypt import check_password_hash
 from tests.base import ApiTestCase
 from tests.factories import ProjectFactory, UserFactory
 
 from api.base.settings import API_BASE
+from api.base.authentication import cache as auth_cache
 
 
 class TestOAuthValidation(ApiTestCase):
@@ -61,3 +63,47 @@ class TestOAuthValidation(ApiTestCase):
         res = self.app.get(self.unreachable_url, auth='some_valid_token', auth_type='jwt', expect_errors=True)
         assert_equal(res.status_code, 403, msg=res.json)
 
+
+
+class TestBasicAuthCache(ApiTestCase):
+    """Test that verified basic auth credentials are cached"""
+    def setUp(self):
+        super(TestBasicAuthCache, self).setUp()
+        auth_cache.invalidate()
+        auth_cache.credentials_cache.reset_stats()
+        self.user = UserFactory.build()
+        self.user.set_password('justapoorboy')
+        self.user.save()
+        self.basic_auth = (self.user.username, 'justapoorboy')
+        self.project = ProjectFactory(is_public=False, creator=self.user)
+        self.url = "/{}nodes/{}/".format(API_BASE, self.project._id)
+
+    @mock.patch('framework.auth.core.check_password_hash', wraps=check_password_hash)
+    def test_password_checked_once(self, mock_check):
+        for _ in range(3):
+            res = self.app.get(self.url, auth=self.basic_auth)
+            assert_equal(res.status_code, 200)
+        assert_equal(mock_check.call_count, 1)
+        stats = auth_cache.stats()
+        assert_equal(stats['hits'], 2)
+        assert_equal(stats['misses'], 1)
+
+    def test_wrong_password_not_served_from_cache(self):
+        self.app.get(self.url, auth=self.basic_auth)
+        res = self.app.get(self.url, auth=(self.user.username, 'wrong'), expect_errors=True)
+        assert_equal(res.status_code, 403)
+
+    def test_password_change_invalidates(self):
+        self.app.get(self.url, auth=self.basic_auth)
+        self.user.set_password('newpassword')
+        self.user.save()
+        res = self.app.get(self.url, auth=self.basic_auth, expect_errors=True)
+        assert_equal(res.status_code, 403)
+        assert_equal(len(auth_cache.credentials_cache), 0)
+
+    def test_disabling_account_invalidates(self):
+        self.app.get(self.url, auth=self.basic_auth)
+        self.user.is_disabled = True
+        self.user.save()
+        assert_is_none(auth_cache.get_user(*self.basic_auth))
+        assert_equal(len(auth_cache.credentials_cache), 0)
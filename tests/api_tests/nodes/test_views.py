@@ -6,6 +6,7 @@ from website.models import Node
 from framework.auth.core import Auth
 from website.util.sanitize import strip_html
 from api.base.settings.defaults import API_BASE
+from api.base.pagination import total_cache
 
 from tests.base import ApiTestCase, fake
 from tests.factories import (
@@ -100,6 +101,92 @@ class TestNodeList(ApiTestCase):
 
         Node.remove()
 
+    def test_conditional_list(self):
+        res = self.app.get(self.url, headers={'If-None-Match': '""'})
+        assert_equal(res.status_code, 200)
+        etag = res.headers['ETag']
+        res = self.app.get(self.url, headers={'If-None-Match': etag})
+        assert_equal(res.status_code, 304)
+        ProjectFactory(is_public=True)
+        res = self.app.get(self.url, headers={'If-None-Match': etag})
+        assert_equal(res.status_code, 200)
+        assert_equal(len(res.json['data']), 2)
+
+    def test_unconditional_list_has_no_validators(self):
+        res = self.app.get(self.url)
+        assert_not_in('ETag', res.headers)
+        assert_not_in('Last-Modified', res.headers)
+
+    def test_list_ignores_if_modified_since(self):
+        res = self.app.get(self.url, headers={'If-Modified-Since': 'Fri, 31 Dec 2100 23:59:59 GMT'})
+        assert_equal(res.status_code, 200)
+
+    @mock.patch('api.base.pagination.JSONAPICursorPagination.get_total')
+    def test_conditional_cursor_list_uses_cached_total(self, mock_get_total):
+        mock_get_total.return_value = 1
+        url = self.url + '?page[cursor]='
+        res = self.app.get(url, headers={'If-None-Match': '""'})
+        res = self.app.get(url, headers={'If-None-Match': res.headers['ETag']})
+        assert_equal(res.status_code, 304)
+        assert_true(mock_get_total.called)
+
+    def test_cursor_pagination_walks_all_nodes(self):
+        others = [ProjectFactory(is_public=True) for _ in range(2)]
+        url = self.url + '?page[size]=1&page[cursor]='
+        ids = []
+        while url:
+            res = self.app.get(url, auth=self.basic_auth)
+            assert_equal(res.status_code, 200)
+            ids.extend(each['id'] for each in res.json['data'])
+            url = res.json['links']['next']
+        assert_equal(
+            sorted(ids),
+            sorted([self.public._id, self.private._id] + [each._id for each in others])
+        )
+        assert_equal(len(ids), len(set(ids)))
+
+    def test_cursor_pagination_prev_link(self):
+        ProjectFactory(is_public=True)
+        res = self.app.get(self.url + '?page[size]=1&page[cursor]=')
+        first_id = res.json['data'][0]['id']
+        assert_is_none(res.json['links']['prev'])
+        res = self.app.get(res.json['links']['next'])
+        res = self.app.get(res.json['links']['prev'])
+        assert_equal([each['id'] for each in res.json['data']], [first_id])
+
+    def test_cursor_pagination_total_on_request(self):
+        total_cache.clear()
+        res = self.app.get(self.url + '?page[cursor]=')
+        assert_is_none(res.json['links']['meta']['total'])
+        res = self.app.get(self.url + '?page[cursor]=&page[total]=true')
+        assert_equal(res.json['links']['meta']['total'], 1)
+
+    def test_embed_contributors_and_children(self):
+        public_child = NodeFactory(parent=self.public, creator=self.user, is_public=True)
+        NodeFactory(parent=self.public, creator=self.non_contrib, is_public=False)
+        self.public.add_contributor(self.non_contrib, visible=False, auth=Auth(self.user), save=True)
+        res = self.app.get(self.url + '?embed=contributors,children', auth=self.basic_auth)
+        assert_equal(res.status_code, 200)
+        node = [each for each in res.json['data'] if each['id'] == self.public._id][0]
+        contributors = node['embeds']['contributors']['data']
+        assert_equal(
+            [(each['id'], each['bibliographic']) for each in contributors],
+            [(self.user._id, True), (self.non_contrib._id, False)]
+        )
+        # The private child is viewable because the user is an admin on the parent
+        assert_equal(len(node['embeds']['children']['data']), 2)
+        # Children do not embed further
+        assert_not_in('embeds', node['embeds']['children']['data'][0])
+
+        res = self.app.get(self.url + '?embed=children')
+        node = [each for each in res.json['data'] if each['id'] == self.public._id][0]
+        children = node['embeds']['children']['data']
+        assert_equal([each['id'] for each in children], [public_child._id])
+
+    def test_invalid_cursor(self):
+        res = self.app.get(self.url + '?page[cursor]=garbage', expect_errors=True)
+        assert_equal(res.status_code, 404)
+
 
 class TestNodeFiltering(ApiTestCase):
 
@@ -436,6 +523,68 @@ class TestNodeDetail(ApiTestCase):
         res = self.app.get(self.private_url, auth=self.basic_auth_two, expect_errors=True)
         assert_equal(res.status_code, 403)
 
+    def test_conditional_get_with_etag(self):
+        res = self.app.get(self.public_url)
+        etag = res.headers['ETag']
+        res = self.app.get(self.public_url, headers={'If-None-Match': etag})
+        assert_equal(res.status_code, 304)
+        assert_equal(res.headers['ETag'], etag)
+
+        self.public_project.title = 'Project Uno'
+        self.public_project.save()
+        res = self.app.get(self.public_url, headers={'If-None-Match': etag})
+        assert_equal(res.status_code, 200)
+        assert_equal(res.json['data']['title'], 'Project Uno')
+        assert_not_equal(res.headers['ETag'], etag)
+
+    def test_conditional_get_with_last_modified(self):
+        res = self.app.get(self.public_url)
+        last_modified = res.headers['Last-Modified']
+        res = self.app.get(self.public_url, headers={'If-Modified-Since': last_modified})
+        assert_equal(res.status_code, 304)
+
+    def test_etag_depends_on_user(self):
+        res = self.app.get(self.public_url)
+        res = self.app.get(self.public_url, auth=self.basic_auth, headers={'If-None-Match': res.headers['ETag']})
+        assert_equal(res.status_code, 200)
+
+    def test_conditional_get_checks_permissions(self):
+        res = self.app.get(self.private_url, auth=self.basic_auth)
+        res = self.app.get(
+            self.private_url,
+            auth=self.basic_auth_two,
+            headers={'If-None-Match': res.headers['ETag']},
+            expect_errors=True,
+        )
+        assert_equal(res.status_code, 403)
+
+    def test_sparse_fieldset(self):
+        res = self.app.get(self.public_url + '?fields[nodes]=title,date_created')
+        assert_equal(res.status_code, 200)
+        assert_equal(
+            set(res.json['data'].keys()),
+            {'id', 'type', 'links', 'title', 'date_created'}
+        )
+
+    def test_related_counts_omitted_by_default(self):
+        res = self.app.get(self.public_url)
+        assert_not_in('count', res.json['data']['links']['children'])
+        assert_not_in('count', res.json['data']['links']['contributors'])
+
+    def test_related_counts_only_count_viewable_children(self):
+        NodeFactory(parent=self.public_project, creator=self.user, is_public=True)
+        NodeFactory(parent=self.public_project, creator=self.user_two, is_public=False)
+        self.public_project.add_pointer(self.private_project, auth=Auth(self.user), save=True)
+        res = self.app.get(self.public_url + '?related_counts=true')
+        links = res.json['data']['links']
+        assert_equal(links['children']['count'], 1)
+        assert_equal(links['contributors']['count'], 1)
+        assert_equal(links['pointers']['count'], 1)
+        assert_equal(links['registrations']['count'], 0)
+        # Admins on the project can view all of its children
+        res = self.app.get(self.public_url + '?related_counts=true', auth=self.basic_auth)
+        assert_equal(res.json['data']['links']['children']['count'], 2)
+
 
 class TestNodeUpdate(ApiTestCase):
 
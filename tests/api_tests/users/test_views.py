@@ -179,6 +179,15 @@ class TestUserNodes(ApiTestCase):
         assert_not_in(self.deleted_folder._id, ids)
         assert_not_in(self.deleted_project_user_one._id, ids)
 
+    def test_embed_contributors(self):
+        url = "/{}users/{}/nodes/?embed=contributors".format(API_BASE, self.user_one._id)
+        res = self.app.get(url, auth=self.auth_one)
+        for node in res.json['data']:
+            contributors = node['embeds']['contributors']['data']
+            assert_equal([each['id'] for each in contributors], [self.user_one._id])
+            assert_true(contributors[0]['bibliographic'])
+            assert_not_in('children', node['embeds'])
+
     def test_get_projects_not_logged_in(self):
         url = "/{}users/{}/nodes/".format(API_BASE, self.user_one._id)
         res = self.app.get(url)
@@ -111,6 +111,10 @@ class DbTestCase(unittest.TestCase):
         settings.PIWIK_HOST = None
         cls._original_enable_email_subscriptions = settings.ENABLE_EMAIL_SUBSCRIPTIONS
         settings.ENABLE_EMAIL_SUBSCRIPTIONS = False
+        cls._original_search_cache_enabled = settings.SEARCH_CACHE_ENABLED
+        settings.SEARCH_CACHE_ENABLED = False
+        cls._original_analytics_buffer_counters = settings.ANALYTICS_BUFFER_COUNTERS
+        settings.ANALYTICS_BUFFER_COUNTERS = False
 
         teardown_database(database=database_proxy._get_current_object())
         # TODO: With `database` as a `LocalProxy`, we should be able to simply
@@ -133,6 +137,8 @@ class DbTestCase(unittest.TestCase):
         settings.DB_NAME = cls._original_db_name
         settings.PIWIK_HOST = cls._original_piwik_host
         settings.ENABLE_EMAIL_SUBSCRIPTIONS = cls._original_enable_email_subscriptions
+        settings.SEARCH_CACHE_ENABLED = cls._original_search_cache_enabled
+        settings.ANALYTICS_BUFFER_COUNTERS = cls._original_analytics_buffer_counters
 
 
 class AppTestCase(unittest.TestCase):
@@ -5,6 +5,7 @@ Unit tests for analytics logic in framework/analytics/__init__.py
 
 import unittest
 
+import mock
 from nose.tools import *  # flake8: noqa  (PEP8 asserts)
 from flask import Flask
 
@@ -12,6 +13,9 @@ from datetime import datetime
 
 from framework import analytics, sessions
 from framework.sessions import session
+from framework.analytics import counters
+from framework.analytics.counters import CounterBuffer
+from framework.analytics.sketches import HyperLogLog
 
 from tests.base import OsfTestCase
 from tests.factories import UserFactory, ProjectFactory
@@ -75,9 +79,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, self.fid), db=self.db)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}'.format(self.node, self.fid)
-
-        session.data['visited'].append(page)
         download_file_(node=self.node, fid=self.fid)
 
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, self.fid), db=self.db)
@@ -96,9 +97,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}:{2}'.format(self.node, self.fid, self.vid), db=self.db)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}:{2}'.format(self.node, self.fid, self.vid)
-
-        session.data['visited'].append(page)
         download_file_version_(node=self.node, fid=self.fid, vid=self.vid)
 
         count = analytics.get_basic_counters('download:{0}:{1}:{2}'.format(self.node, self.fid, self.vid), db=self.db)
@@ -116,6 +114,56 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters(page, db=self.db)
         assert_equal(count, (3, 5))
 
+    def test_unique_survives_new_session(self):
+        page = 'download:{0}:{1}'.format(self.node._id, self.fid)
+        with Flask('forwarded').test_request_context(headers={'X-Forwarded-For': '1.2.3.4, 10.0.0.1'}):
+            analytics.update_counter(page, db=self.db)
+            sessions.set_session(sessions.Session())
+            analytics.update_counter(page, db=self.db)
+        assert_equal(analytics.get_basic_counters(page, db=self.db), (1, 2))
+        assert_not_in('visited', session.data)
+
+    @mock.patch('framework.analytics.get_visitor_id')
+    def test_unique_counts_visitors(self, mock_visitor_id):
+        page = 'download:{0}:{1}'.format(self.node._id, self.fid)
+        for idx in range(20):
+            mock_visitor_id.return_value = 'user:{}'.format(idx % 10)
+            analytics.update_counter(page, db=self.db)
+        assert_equal(analytics.get_basic_counters(page, db=self.db), (10, 20))
+
+    def test_unique_includes_legacy_count(self):
+        page = 'download:{0}:{1}'.format(self.node._id, self.fid)
+        self.db['pagecounters'].insert({'_id': page, 'total': 5, 'unique': 3})
+        analytics.update_counter(page, db=self.db)
+        assert_equal(analytics.get_basic_counters(page, db=self.db), (4, 6))
+
+    def test_visitor_id(self):
+        session.data['auth_user_id'] = 'abc12'
+        assert_equal(analytics.get_visitor_id(), 'user:abc12')
+
+    def test_visitor_id_uses_forwarded_address(self):
+        with Flask('forwarded').test_request_context(
+                headers={'X-Forwarded-For': '1.2.3.4, 10.0.0.1'},
+                environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+            assert_equal(analytics.get_visitor_id(), 'addr:1.2.3.4')
+
+    def test_visitor_id_falls_back_to_session(self):
+        with Flask('direct').test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+            assert_equal(analytics.get_visitor_id(), 'session:{}'.format(session._id))
+
+    @mock.patch('website.settings.ANALYTICS_BUFFER_COUNTERS', True)
+    def test_update_counter_buffered(self):
+        page = 'download:{0}:{1}'.format(self.node._id, self.fid)
+        analytics.update_counter(page)
+        analytics.update_counter(page)
+        assert_is_none(self.db['pagecounters'].find_one({'_id': page}))
+        # Buffered increments are included in reads from this process
+        assert_equal(analytics.get_basic_counters(page), (1, 2))
+
+        analytics.page_counters.flush()
+        assert_equal(self.db['pagecounters'].find_one({'_id': page})['total'], 2)
+        assert_equal(analytics.get_basic_counters(page), (1, 2))
+
     @unittest.skip('Reverted the fix for #2281. Unskip this once we use GUIDs for keys in the download counts collection')
     def test_update_counters_different_files(self):
         # Regression test for https://github.com/CenterForOpenScience/osf.io/issues/2281
@@ -133,9 +181,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, fid2), db=self.db)
         assert_equal(count, (None, None))
 
-        page = 'download:{0}:{1}'.format(self.node, fid1)
-
-        session.data['visited'].append(page)
         download_file_(node=self.node, fid=fid1)
         download_file_(node=self.node, fid=fid2)
 
@@ -143,3 +188,109 @@ class TestUpdateCounters(UpdateCountersTestCase):
         assert_equal(count, (1, 2))
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, fid2), db=self.db)
         assert_equal(count, (1, 1))
+
+
+class TestCounterBuffer(OsfTestCase):
+
+    def setUp(self):
+        super(TestCounterBuffer, self).setUp()
+        self.buffer = CounterBuffer()
+
+    def test_flush_combines_increments(self):
+        self.buffer.add('node:abc', {'total': 1, 'date.2015/06/01.total': 1})
+        self.buffer.add('node:abc', {'total': 1})
+        self.buffer.add('node:def', {'total': 1})
+        db = mock.MagicMock()
+        assert_equal(self.buffer.flush(db=db), 2)
+        db['pagecounters'].update.assert_any_call(
+            {'_id': 'node:abc'}, {'$inc': {'total': 2, 'date.2015/06/01.total': 1}}, True, False
+        )
+        assert_equal(db['pagecounters'].update.call_count, 2)
+
+    def test_flush_writes_counts_and_visitors(self):
+        self.buffer.add('node:abc', {'total': 1}, visitors={'visitors': 'user:abc'})
+        self.buffer.add('node:abc', {'total': 1}, visitors={'visitors': 'user:def'})
+        self.buffer.add('node:abc', {'total': 1}, visitors={'visitors': 'user:abc'})
+        self.buffer.flush(db=self.db)
+        record = self.db['pagecounters'].find_one({'_id': 'node:abc'})
+        assert_equal(record['total'], 3)
+        assert_equal(HyperLogLog.from_string(record['visitors']).count(), 2)
+        assert_equal(self.buffer.get_pending('node:abc'), {})
+
+    @mock.patch('framework.analytics.counters.merge_sketches')
+    def test_flush_keeps_visitors_if_merge_fails(self, mock_merge):
+        mock_merge.return_value = False
+        self.buffer.add('node:abc', {'total': 1}, visitors={'visitors': 'user:abc'})
+        self.buffer.flush(db=self.db)
+        assert_equal(self.db['pagecounters'].find_one({'_id': 'node:abc'})['total'], 1)
+        # Increments were written; visitors wait for the next flush
+        assert_equal(self.buffer.get_pending('node:abc'), {})
+        assert_equal(self.buffer.get_pending_sketch('node:abc', 'visitors').count(), 1)
+
+        mock_merge.return_value = True
+        self.buffer.flush(db=self.db)
+        assert_equal(mock_merge.call_count, 2)
+        assert_is_none(self.buffer.get_pending_sketch('node:abc', 'visitors'))
+
+    def test_merge_sketches_retries_on_conflict(self):
+        collection = self.db['pagecounters']
+        collection.insert({'_id': 'node:abc', 'total': 1})
+        sketch = HyperLogLog()
+        sketch.add('user:abc')
+        original_update = collection.update
+        calls = []
+
+        def concurrent_update(query, document, *args, **kwargs):
+            if not calls:
+                # Another process merges first
+                original_update({'_id': 'node:abc'}, {'$inc': {'sketch_rev': 1}})
+            calls.append(query)
+            return original_update(query, document, *args, **kwargs)
+
+        with mock.patch.object(collection, 'update', side_effect=concurrent_update):
+            assert_true(counters.merge_sketches(collection, 'node:abc', {'visitors': sketch}))
+        assert_equal(len(calls), 2)
+        record = collection.find_one({'_id': 'node:abc'})
+        assert_equal(record['sketch_rev'], 2)
+
+    @mock.patch('website.settings.ANALYTICS_FLUSH_THRESHOLD', 2)
+    @mock.patch.object(CounterBuffer, '_ensure_worker')
+    def test_threshold_wakes_worker(self, mock_ensure_worker):
+        self.buffer.add('node:abc', {'total': 1})
+        assert_false(self.buffer._wakeup.is_set())
+        self.buffer.add('node:abc', {'total': 1})
+        assert_true(self.buffer._wakeup.is_set())
+
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def test_small_counts_are_exact(self):
+        sketch = HyperLogLog()
+        for idx in range(20):
+            sketch.add('user:{}'.format(idx % 5))
+        assert_equal(sketch.count(), 5)
+
+    def test_large_counts_are_estimated(self):
+        sketch = HyperLogLog(precision=10)
+        for idx in range(20000):
+            sketch.add('user:{}'.format(idx))
+        assert_almost_equal(sketch.count(), 20000, delta=20000 * 0.1)
+
+    def test_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for idx in range(10):
+            first.add('user:{}'.format(idx))
+            second.add('user:{}'.format(idx + 5))
+        assert_equal(first.merge(second).count(), 15)
+
+    def test_round_trip(self):
+        sketch = HyperLogLog()
+        sketch.add(u'user:\xe9')
+        loaded = HyperLogLog.from_string(sketch.to_string())
+        assert_false(loaded.add(u'user:\xe9'))
+        assert_equal(loaded.count(), 1)
+
+    def test_from_string_wrong_precision(self):
+        sketch = HyperLogLog(precision=4)
+        sketch.add('user:abc')
+        assert_equal(HyperLogLog.from_string(sketch.to_string()).count(), 0)
@@ -4,6 +4,7 @@ import functools
 import json
 import logging
 import itertools
+import threading
 
 import celery
 import mock  # noqa
@@ -17,6 +18,7 @@ from scripts import cleanup_failed_registrations as scripts
 
 from framework.auth import Auth
 from framework.tasks import handlers
+from framework.exceptions import HTTPError
 
 from website.archiver import (
     ARCHIVER_INITIATED,
@@ -36,6 +38,8 @@ from website import settings
 from website.util import waterbutler_url_for
 from website.project.model import Node, NodeLog
 from website.addons.base import StorageAddonBase
+from website.addons.base import crawler
+from website.addons.osfstorage import settings as osfstorage_settings
 from website.util import api_url_for
 
 from tests import factories
@@ -193,6 +197,102 @@ class TestStorageAddonBase(ArchiverTestCase):
         for addon in [a for a in settings.ADDONS_ARCHIVABLE if a not in ['wiki']]:
             self._test_addon(addon)
 
+class TestFileTreeCrawler(ArchiverTestCase):
+
+    def setUp(self):
+        super(TestFileTreeCrawler, self).setUp()
+        self.addon = self.src.get_or_add_addon('dropbox', auth=self.auth)
+        self.crawler = crawler.FileTreeCrawler(self.addon, self.user)
+        self.session = mock.Mock()
+        session_patcher = mock.patch.object(self.crawler, 'get_session', return_value=self.session)
+        session_patcher.start()
+        self.addCleanup(session_patcher.stop)
+
+    def _response(self, status_code, data=None, headers=None):
+        return mock.Mock(
+            status_code=status_code,
+            headers=headers or {},
+            json=mock.Mock(return_value={'data': data or []}),
+        )
+
+    @mock.patch('website.addons.base.crawler.time.sleep')
+    def test_fetch_retries_throttled_requests(self, mock_sleep):
+        self.session.get.side_effect = [
+            self._response(429, headers={'Retry-After': '3'}),
+            self._response(503),
+            self._response(200, data=FILE_TREE['children']),
+        ]
+        assert_equal(self.crawler.fetch('http://wb/data'), FILE_TREE['children'])
+        assert_equal(self.session.get.call_count, 3)
+        assert_equal(mock_sleep.call_args_list[0], call(3.0))
+
+    @mock.patch('website.addons.base.crawler.time.sleep')
+    @mock.patch('website.settings.ARCHIVE_CRAWL_MAX_RETRIES', 1)
+    def test_fetch_gives_up(self, mock_sleep):
+        self.session.get.return_value = self._response(503)
+        with assert_raises(HTTPError):
+            self.crawler.fetch('http://wb/data')
+        assert_equal(self.session.get.call_count, 2)
+
+    def test_sessions_are_per_thread(self):
+        other = crawler.FileTreeCrawler(self.addon, self.user, workers=2)
+        session = other.get_session()
+        assert_is(other.get_session(), session)
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(other.get_session()))
+        thread.start()
+        thread.join()
+        assert_is_not(sessions[0], session)
+        assert_equal(session.get_adapter('http://wb/')._pool_maxsize, 2)
+
+    def test_crawl_builds_tree(self):
+        listings = {
+            '/': FILE_TREE['children'],
+            '/qwerty': FILE_TREE['children'][1]['children'],
+        }
+        with mock.patch.object(self.crawler, 'fetch', side_effect=lambda url, version=None: json.loads(json.dumps(listings[url]))):
+            with mock.patch.object(self.addon, '_get_fileobj_child_metadata_url', side_effect=lambda folder, *args, **kwargs: folder['path']):
+                tree = self.crawler.crawl({'path': '/', 'name': '', 'kind': 'folder'})
+        assert_equal(tree, FILE_TREE)
+
+    def test_crawl_lists_only_root_at_version(self):
+        self.crawler.version = 'latest-published'
+        listings = {
+            '/': FILE_TREE['children'],
+            '/qwerty': FILE_TREE['children'][1]['children'],
+        }
+        versions = {}
+
+        def get_url(folder, user, cookie=None, version=None):
+            versions[folder['path']] = version
+            return folder['path']
+        with mock.patch.object(self.crawler, 'fetch', side_effect=lambda url, version=None: json.loads(json.dumps(listings[url]))) as mock_fetch:
+            with mock.patch.object(self.addon, '_get_fileobj_child_metadata_url', side_effect=get_url):
+                self.crawler.crawl({'path': '/', 'name': '', 'kind': 'folder'})
+        assert_equal(versions, {'/': 'latest-published', '/qwerty': None})
+        assert_equal(
+            mock_fetch.call_args_list,
+            [call('/', version='latest-published'), call('/qwerty', version=None)]
+        )
+
+
+class TestTokenBucket(OsfTestCase):
+
+    @mock.patch('website.addons.base.crawler.time')
+    def test_acquire_waits_for_tokens(self, mock_time):
+        mock_time.time.return_value = 100
+        bucket = crawler.TokenBucket(rate=2)
+        bucket.acquire()
+        bucket.acquire()
+        assert_false(mock_time.sleep.called)
+
+        def advance(seconds):
+            mock_time.time.return_value += seconds
+        mock_time.sleep.side_effect = advance
+        bucket.acquire()
+        mock_time.sleep.assert_called_once_with(0.5)
+
+
 class TestArchiverTasks(ArchiverTestCase):
 
     @use_fake_addons
@@ -219,6 +319,42 @@ class TestArchiverTasks(ArchiverTestCase):
         assert_equal(res.target_name, 'dropbox')
         assert_equal(res.disk_usage, 128 + 256)
 
+    @use_fake_addons
+    def test_stat_addon_stores_manifest(self):
+        stat_addon('dropbox', self.archive_job._id)
+        target = self.archive_job.get_target('dropbox')
+        assert_equal(target.manifest, archiver_utils.build_file_manifest(FILE_TREE))
+        assert_equal(target.num_files, 2)
+        assert_equal(target.disk_usage, 128 + 256)
+
+    @use_fake_addons
+    @mock.patch('celery.chord')
+    @mock.patch('website.archiver.tasks.stat_addon.si')
+    def test_archive_skips_archived_targets(self, mock_stat, mock_chord):
+        self.archive_job.update_target('osfstorage', ARCHIVER_SUCCESS)
+        archive(job_pk=self.archive_job._id)
+        mock_stat.assert_called_once_with(addon_short_name='dropbox', job_pk=self.archive_job._id)
+
+    @use_fake_addons
+    @mock.patch('website.archiver.tasks.archive_node.delay')
+    @mock.patch('celery.chord')
+    def test_archive_all_targets_archived(self, mock_chord, mock_archive_node):
+        for target in self.archive_job.target_addons:
+            self.archive_job.update_target(target.name, ARCHIVER_SUCCESS)
+        archive(job_pk=self.archive_job._id)
+        assert_false(mock_chord.called)
+        mock_archive_node.assert_called_once_with([], job_pk=self.archive_job._id)
+
+    @use_fake_addons
+    @mock.patch('website.archiver.tasks.archive_addon.delay')
+    def test_archive_node_skips_archived_targets(self, mock_archive_addon):
+        settings.MAX_ARCHIVE_SIZE = 1024 ** 3
+        results = [stat_addon(addon, self.archive_job._id) for addon in ['osfstorage', 'dropbox']]
+        self.archive_job.update_target('osfstorage', ARCHIVER_SUCCESS)
+        archive_node(results, job_pk=self.archive_job._id)
+        assert_equal(mock_archive_addon.call_count, 1)
+        assert_equal(mock_archive_addon.call_args[1]['addon_short_name'], 'dropbox')
+
     @use_fake_addons
     @mock.patch('website.archiver.tasks.archive_addon.delay')
     def test_archive_node_pass(self, mock_archive_addon):
@@ -377,6 +513,13 @@ class TestArchiverUtils(ArchiverTestCase):
         assert_equal(a_stat_result.num_files, 2)
         assert_equal(len(a_stat_result.targets), 2)
 
+    def test_build_file_manifest(self):
+        manifest = archiver_utils.build_file_manifest(FILE_TREE)
+        assert_equal(manifest, [
+            {'path': 'Afile.file', 'size': 128, 'hashes': {}},
+            {'path': 'A Folder/coolphoto.png', 'size': 256, 'hashes': {}},
+        ])
+
     @use_fake_addons
     def test_archive_provider_for(self):
         provider = self.src.get_addon(settings.ARCHIVE_PROVIDER)
@@ -415,6 +558,62 @@ class TestArchiverUtils(ArchiverTestCase):
         archiver_utils.delete_registration_tree(reg)
         assert_false(proj.node__registrations)
 
+class TestVerifyArchive(OsfTestCase):
+
+    def setUp(self):
+        super(TestVerifyArchive, self).setUp()
+        self.reg = factories.RegistrationFactory()
+        self.user = self.reg.creator
+        self.node_settings = self.reg.get_or_add_addon('osfstorage', auth=Auth(self.user))
+        self.node_settings.save()
+        self.target = ArchiveTarget(name='dropbox')
+        self.target.set_manifest(archiver_utils.build_file_manifest(FILE_TREE))
+        folder = self.node_settings.root_node.append_folder('Archive of Dropbox')
+        self.files = {
+            'Afile.file': folder.append_file('Afile.file'),
+            'A Folder/coolphoto.png': folder.append_folder('A Folder').append_file('coolphoto.png'),
+        }
+
+    def _add_version(self, path, size, **metadata):
+        metadata['size'] = size
+        location = {
+            'service': 'cloud',
+            osfstorage_settings.WATERBUTLER_RESOURCE: 'resource',
+            'object': path,
+        }
+        self.files[path].create_version(self.user, location, metadata=metadata)
+
+    def test_verify_archive(self):
+        self._add_version('Afile.file', 128)
+        self._add_version('A Folder/coolphoto.png', 256)
+        assert_equal(archiver_utils.verify_archive(self.reg, self.target, 'Archive of Dropbox'), [])
+
+    def test_verify_archive_missing_folder(self):
+        errors = archiver_utils.verify_archive(self.reg, self.target, 'Archive of Box')
+        assert_equal(len(errors), 1)
+
+    def test_verify_archive_wrong_size(self):
+        self._add_version('Afile.file', 128)
+        self._add_version('A Folder/coolphoto.png', 255)
+        errors = archiver_utils.verify_archive(self.reg, self.target, 'Archive of Dropbox')
+        assert_equal(len(errors), 1)
+        assert_in('A Folder/coolphoto.png', errors[0])
+
+    def test_verify_archive_missing_file(self):
+        self._add_version('Afile.file', 128)
+        self.files['A Folder/coolphoto.png'].delete()
+        errors = archiver_utils.verify_archive(self.reg, self.target, 'Archive of Dropbox')
+        assert_equal(len(errors), 1)
+        assert_in('was not archived', errors[0])
+
+    def test_verify_archive_hash_mismatch(self):
+        self.target.manifest[0]['hashes'] = {'md5': 'abc', 'sha1': 'def'}
+        self._add_version('Afile.file', 128, md5='xyz')
+        self._add_version('A Folder/coolphoto.png', 256)
+        errors = archiver_utils.verify_archive(self.reg, self.target, 'Archive of Dropbox')
+        assert_equal(errors, [u'Afile.file failed md5 verification'])
+
+
 class TestArchiverListeners(ArchiverTestCase):
 
     @mock.patch('celery.chain')
@@ -497,6 +696,7 @@ class TestArchiverListeners(ArchiverTestCase):
         listeners.archive_callback(self.dst)
         mock_send.assert_called_with(self.dst, self.user, urls=None)
 
+    @mock.patch('website.settings.ARCHIVE_JOB_MAX_RETRIES', 0)
     def test_archive_callback_done_errors(self):
         self.dst.archive_job.update_target('dropbox', ARCHIVER_SUCCESS)
         self.dst.archive_job.update_target('osfstorage', ARCHIVER_FAILURE)
@@ -505,6 +705,27 @@ class TestArchiverListeners(ArchiverTestCase):
             listeners.archive_callback(self.dst)
         assert(mock_fail.called_with(ARCHIVER_NETWORK_ERROR, self.src, self.dst, self.user, self.dst.archive_job.target_addons))
 
+    @mock.patch('framework.tasks.handlers.enqueue_task')
+    def test_archive_callback_retries_failed_targets(self, mock_enqueue):
+        self.dst.archive_job.update_target('dropbox', ARCHIVER_SUCCESS)
+        self.dst.archive_job.update_target('osfstorage', ARCHIVER_FAILURE)
+        with mock.patch('website.archiver.utils.handle_archive_fail') as mock_fail:
+            listeners.archive_callback(self.dst)
+        assert_false(mock_fail.called)
+        assert_true(mock_enqueue.called)
+        job = self.dst.archive_job
+        assert_equal(job.retries, 1)
+        assert_false(job.sent)
+        assert_equal(job.status, ARCHIVER_INITIATED)
+        assert_equal([target.name for target in job.pending_targets], ['osfstorage'])
+
+        # Fails for good once the retries are used up
+        job.update_target('osfstorage', ARCHIVER_FAILURE)
+        with mock.patch('website.archiver.utils.handle_archive_fail') as mock_fail:
+            listeners.archive_callback(self.dst)
+        assert_true(mock_fail.called)
+        assert_equal(mock_enqueue.call_count, 1)
+
     def test_archive_callback_updates_archiving_state_when_done(self):
         proj = factories.NodeFactory()
         factories.NodeFactory(parent=proj)
@@ -776,6 +997,64 @@ class TestArchiveJobModel(OsfTestCase):
         assert_equal(item['stat_result'], target.stat_result)
         assert_equal(item['errors'], target.errors)
 
+    def test_progress(self):
+        job = ArchiveJob()
+        for name, size in [('osfstorage', 128), ('dropbox', 256)]:
+            target = ArchiveTarget(name=name)
+            target.set_manifest([{'path': 'file', 'size': size, 'hashes': {}}])
+            job.target_addons.append(target)
+        job.save()
+        job.update_target('dropbox', ARCHIVER_SUCCESS)
+        assert_equal(job.progress(), {
+            'files_completed': 1,
+            'files_total': 2,
+            'bytes_completed': 256,
+            'bytes_total': 384,
+        })
+        assert_equal([t.name for t in job.pending_targets], ['osfstorage'])
+
+    @mock.patch('website.settings.ARCHIVE_MANIFEST_MAX_FILES', 1)
+    def test_large_manifest_is_not_stored(self):
+        target = ArchiveTarget(name='dropbox')
+        target.set_manifest([
+            {'path': 'a', 'size': 1, 'hashes': {}},
+            {'path': 'b', 'size': 2, 'hashes': {}},
+        ])
+        assert_equal(target.manifest, [])
+        assert_equal(target.num_files, 2)
+        assert_equal(target.disk_usage, 3)
+
+    def test_update_target_keeps_stat_result(self):
+        target = ArchiveTarget(name='dropbox', stat_result={'num_files': 2})
+        target.save()
+        job = ArchiveJob()
+        job.target_addons.append(target)
+        job.save()
+        job.update_target('dropbox', ARCHIVER_SUCCESS)
+        assert_equal(target.stat_result, {'num_files': 2})
+
+    def test_reset_failed_targets(self):
+        job = ArchiveJob()
+        for name in ['osfstorage', 'dropbox']:
+            target = ArchiveTarget(name=name)
+            target.save()
+            job.target_addons.append(target)
+        job.save()
+        job.update_target('osfstorage', ARCHIVER_SUCCESS)
+        failed = job.get_target('dropbox')
+        failed.status = ARCHIVER_FAILURE
+        failed.errors = ['Timed out']
+        failed.save()
+        job.done = True
+        job.status = ARCHIVER_FAILURE
+        job.save()
+        job.reset_failed_targets()
+        assert_false(job.done)
+        assert_equal(job.status, ARCHIVER_INITIATED)
+        assert_equal(job.get_target('osfstorage').status, ARCHIVER_SUCCESS)
+        assert_equal(job.get_target('dropbox').status, ARCHIVER_INITIATED)
+        assert_equal(job.get_target('dropbox').errors, [])
+
     @use_fake_addons
     def test_get_target(self):
         proj = factories.ProjectFactory()
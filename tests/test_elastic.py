@@ -1,21 +1,26 @@
 # -*- coding: utf-8 -*-
-import unittest
+import shutil
 import logging
+import tempfile
+import unittest
 
 from nose.tools import *  # flake8: noqa (PEP8 asserts)
 import mock
 
 from framework.auth.core import Auth
 from website import settings
+from website.models import Node
 import website.search.search as search
 from website.search import elastic_search
+from website.search import cache as search_cache
 from website.search.util import build_query
+from website.search_migration import migrate as migration
 from website.search_migration.migrate import migrate
 
 from tests.base import OsfTestCase
 from tests.test_features import requires_search
 from tests.factories import (
-    UserFactory, ProjectFactory, NodeFactory,
+    UserFactory, ProjectFactory, NodeFactory, AuthUserFactory,
     UnregUserFactory, UnconfirmedUserFactory,
     RegistrationFactory
 )
@@ -276,6 +281,31 @@ class TestRegistrationRetractions(SearchTestCase):
         assert_equal(len(docs), 1)
 
 
+class TestPartialUpdateFields(unittest.TestCase):
+
+    def test_title_change(self):
+        assert_equal(
+            elastic_search.get_partial_update_fields(['title']),
+            {'title', 'normalized_title'}
+        )
+
+    def test_tag_change(self):
+        assert_equal(
+            elastic_search.get_partial_update_fields(['tags']),
+            {'tags'}
+        )
+
+    def test_wiki_change_rebuilds(self):
+        assert_is_none(elastic_search.get_partial_update_fields(['tags', 'wiki_pages_current']))
+
+    def test_visibility_change_rebuilds(self):
+        assert_is_none(elastic_search.get_partial_update_fields(['title', 'is_public']))
+        assert_is_none(elastic_search.get_partial_update_fields(['is_deleted']))
+
+    def test_no_fields_rebuilds(self):
+        assert_is_none(elastic_search.get_partial_update_fields(None))
+
+
 @requires_search
 class TestPublicNodes(SearchTestCase):
 
@@ -350,6 +380,24 @@ class TestPublicNodes(SearchTestCase):
         docs = query('category:project AND ' + self.project.title)['results']
         assert_equal(len(docs), 1)
 
+    def test_change_title_sends_partial_update(self):
+        es = elastic_search.es
+        with mock.patch.object(es, 'update', wraps=es.update) as mock_update:
+            with mock.patch.object(es, 'index', wraps=es.index) as mock_index:
+                self.project.set_title('Blue Ordinary', self.consolidate_auth, save=True)
+        assert_false(mock_index.called)
+        doc = mock_update.call_args[1]['body']['doc']
+        assert_equal(set(doc.keys()), {'title', 'normalized_title'})
+
+    def test_make_public_rebuilds_document(self):
+        project = ProjectFactory(title='Killer Queen', creator=self.user)
+        es = elastic_search.es
+        with mock.patch.object(es, 'update') as mock_update:
+            project.set_privacy('public')
+        assert_false(mock_update.called)
+        docs = query('category:project AND "Killer Queen"')['results']
+        assert_equal(len(docs), 1)
+
     def test_add_tags(self):
 
         tags = ['stonecoldcrazy', 'just a poor boy', 'from-a-poor-family']
@@ -403,6 +451,25 @@ class TestPublicNodes(SearchTestCase):
         docs = query(wiki_content)['results']
         assert_equal(len(docs), 0)
 
+    def test_delete_wiki(self):
+        # Deleting a page must drop its text from the indexed document
+        wiki_content = 'Bohemian rhapsody'
+        self.project.update_node_wiki('scaramouche', wiki_content, self.consolidate_auth)
+        assert_equal(len(query(wiki_content)['results']), 1)
+
+        self.project.delete_node_wiki('scaramouche', self.consolidate_auth)
+
+        docs = query(wiki_content)['results']
+        assert_equal(len(docs), 0)
+
+    def test_rename_wiki(self):
+        wiki_content = 'Galileo figaro'
+        self.project.update_node_wiki('fandango', wiki_content, self.consolidate_auth)
+        self.project.rename_node_wiki('fandango', 'magnifico', self.consolidate_auth)
+
+        assert_equal(len(query('wikis.fandango:galileo')['results']), 0)
+        assert_equal(len(query('wikis.magnifico:galileo')['results']), 1)
+
     def test_add_contributor(self):
         # Add a contributor, then verify that project is found when searching
         # for contributor.
@@ -709,6 +776,12 @@ class TestSearchMigration(SearchTestCase):
 
     def setUp(self):
         super(TestSearchMigration, self).setUp()
+        # Keep checkpoints out of the real log directory
+        log_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_path)
+        log_path_patcher = mock.patch.object(settings, 'LOG_PATH', log_path)
+        log_path_patcher.start()
+        self.addCleanup(log_path_patcher.stop)
         self.es = search.search_engine.es
         search.delete_index(settings.ELASTIC_INDEX)
         search.create_index(settings.ELASTIC_INDEX)
@@ -745,3 +818,106 @@ class TestSearchMigration(SearchTestCase):
             var = self.es.indices.get_aliases()
             assert_equal(var[settings.ELASTIC_INDEX + '_v{}'.format(n + 1)]['aliases'].keys()[0], settings.ELASTIC_INDEX)
             assert not var.get(settings.ELASTIC_INDEX + '_v{}'.format(n))
+
+    def test_migration_resumes_from_checkpoint(self):
+        migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app)
+        new_index = settings.ELASTIC_INDEX + '_v2'
+        search.create_index(new_index)
+        migration.save_checkpoint(settings.ELASTIC_INDEX, {
+            'index': new_index,
+            'nodes': {'last_id': None, 'iterated': 0, 'indexed': 0, 'done': True},
+        })
+        migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app)
+        var = self.es.indices.get_aliases()
+        assert_equal(var[new_index]['aliases'].keys()[0], settings.ELASTIC_INDEX)
+        # Nodes were already marked as done, so only the user was indexed
+        assert_equal(search.count(index=new_index), 1)
+        assert_is_none(migration.load_checkpoint(settings.ELASTIC_INDEX))
+
+    def test_iter_id_chunks(self):
+        others = [ProjectFactory(is_public=True) for _ in range(2)]
+        ProjectFactory(is_public=False)
+        chunks = list(migration.iter_id_chunks(Node, migration.NODE_FILTER, chunk_size=2))
+        expected = sorted([self.project._id] + [each._id for each in others])
+        assert_equal(chunks, [expected[:2], expected[2:]])
+        chunks = list(migration.iter_id_chunks(Node, migration.NODE_FILTER, start_after=expected[0]))
+        assert_equal(chunks, [expected[1:]])
+
+    def test_indexing_errors_are_counted_not_raised(self):
+        new_index = settings.ELASTIC_INDEX + '_v2'
+        search.create_index(new_index)
+        checkpoint = {'index': new_index}
+        with mock.patch('website.search_migration.migrate.search.bulk_index', return_value=(0, [{'index': {'status': 400}}])):
+            migration.migrate_nodes(new_index, checkpoint)
+        assert_equal(checkpoint['nodes']['failed'], 1)
+        assert_equal(checkpoint['nodes']['indexed'], 0)
+        assert_true(checkpoint['nodes']['done'])
+        migration.clear_checkpoint(new_index)
+
+    def test_alias_not_swapped_when_verification_fails(self):
+        migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app)
+        with mock.patch('website.search_migration.migrate.search.count', return_value=0):
+            with assert_raises(migration.MigrationVerificationError):
+                migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app, resume=False)
+        var = self.es.indices.get_aliases()
+        assert_equal(var[settings.ELASTIC_INDEX + '_v1']['aliases'].keys()[0], settings.ELASTIC_INDEX)
+        assert_not_in(settings.ELASTIC_INDEX, var[settings.ELASTIC_INDEX + '_v2']['aliases'])
+        migration.clear_checkpoint(settings.ELASTIC_INDEX)
+
+
+class TestSearchResultCache(OsfTestCase):
+
+    def setUp(self):
+        super(TestSearchResultCache, self).setUp()
+        settings.SEARCH_CACHE_ENABLED = True
+        search_cache.invalidate()
+        search_cache.results_cache.reset_stats()
+        alias_patcher = mock.patch('website.search.cache.search.get_alias_target', return_value='test_v1')
+        self.mock_alias = alias_patcher.start()
+        self.addCleanup(alias_patcher.stop)
+        share_alias_patcher = mock.patch('website.search.cache.search.get_share_alias_target', return_value='share_v1')
+        self.mock_share_alias = share_alias_patcher.start()
+        self.addCleanup(share_alias_patcher.stop)
+        search_cache._alias_state.update(targets={}, checked=0)
+
+    def tearDown(self):
+        super(TestSearchResultCache, self).tearDown()
+        settings.SEARCH_CACHE_ENABLED = False
+
+    @mock.patch('website.search.views.search.search')
+    def test_anonymous_queries_are_cached(self, mock_search):
+        mock_search.return_value = {'results': [], 'counts': {}}
+        self.app.get('/api/v1/search/', params={'q': 'bowie'})
+        self.app.get('/api/v1/search/', params={'q': '  bowie '})
+        assert_equal(mock_search.call_count, 1)
+        assert_equal(search_cache.stats()['hits'], 1)
+        assert_equal(search_cache.stats()['misses'], 1)
+
+    @mock.patch('website.search.views.search.search')
+    def test_logged_in_queries_bypass_cache(self, mock_search):
+        mock_search.return_value = {'results': [], 'counts': {}}
+        user = AuthUserFactory()
+        self.app.get('/api/v1/search/', params={'q': 'bowie'}, auth=user.auth)
+        self.app.get('/api/v1/search/', params={'q': 'bowie'}, auth=user.auth)
+        assert_equal(mock_search.call_count, 2)
+
+    @mock.patch('website.search.views.search.search')
+    def test_alias_change_invalidates(self, mock_search):
+        mock_search.return_value = {'results': [], 'counts': {}}
+        self.app.get('/api/v1/search/', params={'q': 'bowie'})
+        self.mock_alias.return_value = 'test_v2'
+        search_cache._alias_state['checked'] = 0
+        self.app.get('/api/v1/search/', params={'q': 'bowie'})
+        assert_equal(mock_search.call_count, 2)
+
+    @mock.patch('website.settings.USE_SHARE', True)
+    @mock.patch('website.search.views.search.share_providers')
+    def test_share_alias_change_invalidates(self, mock_providers):
+        mock_providers.return_value = {'providerMap': {}}
+        self.app.get('/api/v1/share/providers/')
+        self.app.get('/api/v1/share/providers/')
+        assert_equal(mock_providers.call_count, 1)
+        self.mock_share_alias.return_value = 'share_v2'
+        search_cache._alias_state['checked'] = 0
+        self.app.get('/api/v1/share/providers/')
+        assert_equal(mock_providers.call_count, 2)
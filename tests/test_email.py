@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+import smtplib
+import unittest
+
+import mock
+from nose.tools import *  # noqa (PEP8 asserts)
+
+from framework.email import tasks
+from framework.email.pool import SMTPConnectionPool
+from website import settings
+
+SERVER = dict(mail_server='smtp.example.com', username='user', password='secret', ttls=True, login=True)
+
+
+class TestSMTPConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('smtplib.SMTP')
+        self.mock_smtp = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_smtp.side_effect = lambda *args, **kwargs: mock.Mock()
+        self.pool = SMTPConnectionPool(maxsize=2, max_idle=30)
+
+    def test_reuses_connection(self):
+        for _ in range(3):
+            self.pool.sendmail('from@example.com', ['to@example.com'], 'message', **SERVER)
+        assert_equal(self.mock_smtp.call_count, 1)
+
+    def test_logs_in_once_per_connection(self):
+        with self.pool.connection(**SERVER) as conn:
+            pass
+        conn.starttls.assert_called_once_with()
+        conn.login.assert_called_once_with('user', 'secret')
+
+    def test_reconnects_when_disconnected(self):
+        with self.pool.connection(**SERVER) as conn:
+            pass
+        conn.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+        conn.quit.side_effect = smtplib.SMTPServerDisconnected()
+        self.pool.sendmail('from@example.com', ['to@example.com'], 'message', **SERVER)
+        assert_equal(self.mock_smtp.call_count, 2)
+        conn.close.assert_called_once_with()
+
+    def test_keeps_connection_after_message_error(self):
+        with assert_raises(smtplib.SMTPRecipientsRefused):
+            with self.pool.connection(**SERVER):
+                raise smtplib.SMTPRecipientsRefused({})
+        with self.pool.connection(**SERVER):
+            pass
+        assert_equal(self.mock_smtp.call_count, 1)
+
+    @mock.patch('time.time')
+    def test_checks_idle_connections(self, mock_time):
+        mock_time.return_value = 0
+        with self.pool.connection(**SERVER) as conn:
+            pass
+        conn.noop.return_value = (421, 'Timeout')
+        mock_time.return_value = 60
+        with self.pool.connection(**SERVER):
+            pass
+        assert_equal(self.mock_smtp.call_count, 2)
+
+    def test_limits_idle_connections(self):
+        with self.pool.connection(**SERVER) as conn:
+            with self.pool.connection(**SERVER):
+                with self.pool.connection(**SERVER):
+                    pass
+        assert_equal(len(self.pool._idle.values()[0]), 2)
+        # The connection released last does not fit in the pool
+        conn.quit.assert_called_once_with()
+
+
+class TestSendEmails(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [
+            {
+                'from_addr': 'from@example.com',
+                'to_addr': 'to{}@example.com'.format(idx),
+                'subject': 'Hello',
+                'message': 'World',
+                'mimetype': 'plain',
+            }
+            for idx in range(3)
+        ]
+
+    @mock.patch('framework.email.tasks.signature')
+    @mock.patch('framework.email.tasks._deliver')
+    def test_send_emails_tracks_each_message(self, mock_deliver, mock_signature):
+        mock_deliver.side_effect = [None, smtplib.SMTPRecipientsRefused({}), None]
+        callback = mock.Mock()
+        self.messages[1]['callback'] = callback
+        self.messages[2]['callback'] = callback
+        with mock.patch.object(settings, 'USE_EMAIL', True):
+            results = tasks.send_emails(self.messages, username='user', password='secret')
+        assert_equal(results, [True, False, True])
+        # Callbacks only run for messages that were sent
+        mock_signature.assert_called_once_with(callback)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from nose.tools import *  # flake8: noqa (PEP8 asserts)
+import mock
+
+from framework.auth.core import Auth
+import website.search.search as search
+from website.search import local_search
+from website.search.util import build_query
+
+from tests.base import OsfTestCase
+from tests.factories import UserFactory, ProjectFactory
+
+
+class TestLocalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = local_search.LocalIndex()
+        self.index.add('project', 'abc12', {
+            'id': 'abc12',
+            'title': "Bowie's Greatest Hits",
+            'tags': ['glam rock', 'space'],
+            'contributors': [{'fullname': 'David Bowie'}],
+            'category': 'project',
+        })
+        self.index.add('user', 'usr12', {
+            'id': 'usr12',
+            'user': 'David Jones',
+            'category': 'user',
+        })
+
+    def matches(self, query_string):
+        return set(key[1] for key in local_search.evaluate(local_search.parse(query_string), self.index))
+
+    def test_term(self):
+        assert_equal(self.matches('greatest'), {'abc12'})
+
+    def test_plural_and_possessive(self):
+        assert_equal(self.matches('bowie'), {'abc12'})
+        assert_equal(self.matches('hit'), {'abc12'})
+
+    def test_prefix(self):
+        assert_equal(self.matches('dav*'), {'abc12', 'usr12'})
+
+    def test_field_and_phrase(self):
+        assert_equal(self.matches('tags:"glam rock"'), {'abc12'})
+        assert_equal(self.matches('tags:"rock glam"'), set())
+        assert_equal(self.matches('contributors:bowie'), {'abc12'})
+
+    def test_boolean_operators(self):
+        assert_equal(self.matches('dav* AND category:user'), {'usr12'})
+        assert_equal(self.matches('dav* NOT id:"usr12"'), {'abc12'})
+        assert_equal(self.matches('jones OR space'), {'abc12', 'usr12'})
+
+    def test_remove(self):
+        self.index.remove('user', 'usr12')
+        assert_equal(self.matches('dav*'), {'abc12'})
+        assert_equal(len(self.index), 1)
+
+
+class TestLocalSearchEngine(OsfTestCase):
+
+    def setUp(self):
+        super(TestLocalSearchEngine, self).setUp()
+        local_search.delete_all()
+        patcher = mock.patch.object(search, 'search_engine', local_search)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = UserFactory(fullname='David Bowie')
+        self.project = ProjectFactory(title='Ziggy Stardust', creator=self.user, is_public=True)
+
+    def test_search_projects(self):
+        results = search.search(build_query('stardust'))
+        assert_equal(len(results['results']), 1)
+        assert_equal(results['counts']['project'], 1)
+
+    def test_partial_update(self):
+        self.project.set_title('Aladdin Sane', Auth(self.user), save=True)
+        assert_equal(len(search.search(build_query('stardust'))['results']), 0)
+        assert_equal(len(search.search(build_query('aladdin'))['results']), 1)
+
+    def test_make_private(self):
+        self.project.set_privacy('private')
+        assert_equal(len(search.search(build_query('stardust'))['results']), 0)
+
+    def test_search_contributor(self):
+        results = search.search_contributor('dav')
+        assert_equal(len(results['users']), 1)
+        assert_equal(results['users'][0]['id'], self.user._id)
+
+        results = search.search_contributor('dav', exclude=[self.user])
+        assert_equal(len(results['users']), 0)
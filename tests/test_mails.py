@@ -15,4 +15,17 @@ def test_plain_mail():
 def test_html_mail():
     mail = mails.Mail('test', subject='A test email')
     rendered = mail.html(name='World')
-    assert_equal(rendered.strip(), 'Hello <p>World</p>')
\ No newline at end of file
+    assert_equal(rendered.strip(), 'Hello <p>World</p>')
+
+@mock.patch('website.mails.settings.MAIL_BATCH_SIZE', 2)
+@mock.patch('website.mails.settings.USE_CELERY', False)
+def test_send_rendered_mails_in_batches():
+    mailer = mock.Mock(side_effect=lambda batch, **kwargs: [True] * len(batch))
+    messages = [
+        {'to_addr': 'user{}@example.com'.format(idx), 'subject': 'Hi', 'message': 'Hello', 'mimetype': 'plain'}
+        for idx in range(3)
+    ]
+    results = mails.send_rendered_mails(messages, mailer=mailer)
+    assert_equal(results, [True, True, True])
+    assert_equal([len(each[0][0]) for each in mailer.call_args_list], [2, 1])
+    assert_equal(mailer.call_args_list[0][0][0][0]['from_addr'], settings.FROM_EMAIL)
@@ -15,6 +15,7 @@ from framework.auth.signals import contributor_removed
 from framework.auth.signals import node_deleted
 from scripts.send_digest import group_digest_notifications_by_user
 from scripts.send_digest import group_messages_by_node
+from scripts.send_digest import unmark_interrupted_digest_notifications
 from scripts.send_digest import remove_sent_digest_notifications
 from scripts.send_digest import send_digest
 from website.notifications import constants
@@ -617,6 +618,38 @@ class TestNotificationUtils(OsfTestCase):
         }]
         assert_equal(data, expected)
 
+    def test_get_configured_project_ids_excludes_projects_with_deleted_ancestor(self):
+        component = factories.NodeFactory(parent=self.node, creator=self.user)
+        subscription = factories.NotificationSubscriptionFactory(
+            _id=component._id + '_comments',
+            owner=component,
+            event_name='comments'
+        )
+        subscription.email_transactional.append(self.user)
+        subscription.save()
+        self.node.is_deleted = True
+        self.node.save()
+        self.project_subscription.email_transactional.remove(self.user)
+        self.project_subscription.save()
+        configured_ids = utils.get_configured_projects(self.user)
+        assert_equal(configured_ids, [])
+
+    def test_format_data_nested_components(self):
+        grandchild = factories.NodeFactory(parent=self.node, creator=self.user)
+        data = utils.format_data(self.user, [self.project._id])
+        node_item = [each for each in data[0]['children'] if 'node' in each][0]
+        assert_equal(node_item['node']['id'], self.node._id)
+        assert_equal(node_item['kind'], 'node')
+        grandchild_item = [each for each in node_item['children'] if 'node' in each][0]
+        assert_equal(grandchild_item['node']['id'], grandchild._id)
+        comments = [
+            each['event'] for each in grandchild_item['children']
+            if each['kind'] == 'event' and each['event']['title'] == 'comments'
+        ][0]
+        # Inherited from the nearest ancestor the user is subscribed on
+        assert_equal(comments['notificationType'], 'adopt_parent')
+        assert_equal(comments['parent_notification_type'], 'email_transactional')
+
     def test_format_data_user_subscriptions_includes_private_parent_if_configured_children(self):
         private_project = factories.ProjectFactory()
         node = factories.NodeFactory(parent=private_project)
@@ -1055,6 +1088,61 @@ class TestSendEmails(OsfTestCase):
         emails.check_parent(node._id, 'comments', [], user, node, datetime.datetime.utcnow())
         assert_false(mock_send.called)
 
+    @mock.patch('website.notifications.emails.send')
+    def test_notify_batches_recipients(self, mock_send):
+        users = [factories.UserFactory() for _ in range(3)]
+        for each in users:
+            self.project.add_contributor(each, permissions=['read', 'write', 'admin'])
+            self.project_subscription.email_transactional.append(each)
+        self.project.save()
+        self.project_subscription.save()
+        time_now = datetime.datetime.utcnow()
+        emails.notify(self.node._id, 'comments', self.user, self.node, time_now)
+        mock_send.assert_called_once_with(
+            [self.project.creator._id] + [each._id for each in users],
+            'email_transactional', self.node._id, 'comments', self.user, self.node, time_now
+        )
+
+    @mock.patch('website.notifications.emails.send')
+    def test_notify_nearest_subscription_wins(self, mock_send):
+        self.node_subscription.email_digest.append(self.project.creator)
+        self.node_subscription.save()
+        time_now = datetime.datetime.utcnow()
+        sent_subscribers = emails.notify(self.node._id, 'comments', self.user, self.node, time_now)
+        mock_send.assert_called_once_with(
+            [self.project.creator._id], 'email_digest', self.node._id, 'comments', self.user, self.node, time_now
+        )
+        assert_equal(sent_subscribers, [self.project.creator._id])
+
+    @mock.patch('website.notifications.emails.send')
+    def test_notify_resolves_deep_component_in_one_subscription_query(self, mock_send):
+        component = factories.NodeFactory(parent=self.node)
+        time_now = datetime.datetime.utcnow()
+        with mock.patch.object(NotificationSubscription, 'find', wraps=NotificationSubscription.find) as mock_find:
+            emails.notify(component._id, 'comments', self.user, component, time_now)
+        assert_equal(mock_find.call_count, 1)
+        mock_send.assert_called_once_with(
+            [self.project.creator._id], 'email_transactional', component._id, 'comments', self.user, component, time_now
+        )
+
+    @mock.patch('website.notifications.emails.send')
+    def test_notify_splits_direct_replies(self, mock_send):
+        user = factories.UserFactory()
+        self.project.add_contributor(user, permissions=['read', 'write'], save=True)
+        self.project_subscription.email_transactional.append(user)
+        self.project_subscription.save()
+        time_now = datetime.datetime.utcnow()
+        emails.notify(self.project._id, 'comments', self.user, self.project, time_now, target_user=user)
+        assert_equal(mock_send.call_count, 2)
+        mock_send.assert_any_call(
+            [self.project.creator._id], 'email_transactional', self.project._id, 'comments',
+            self.user, self.project, time_now, target_user=user
+        )
+        mock_send.assert_any_call(
+            [user._id], 'email_transactional', self.project._id, 'comment_replies',
+            self.user, self.project, time_now, target_user=user
+        )
+
     # @mock.patch('website.notifications.emails.email_transactional')
     # def test_send_calls_correct_mail_function(self, email_transactional):
     #     emails.send([self.user], 'email_transactional', self.project._id, 'comments',
@@ -1068,7 +1156,7 @@ class TestSendEmails(OsfTestCase):
     #     )
     #     assert_true(email_transactional.called)
 
-    @mock.patch('website.mails.send_mail')
+    @mock.patch('website.mails.send_rendered_mail')
     def test_send_email_transactional(self, send_mail):
         # assert that send_mail is called with the correct person & args
         subscribed_users = [self.user._id]
@@ -1106,12 +1194,9 @@ class TestSendEmails(OsfTestCase):
             localized_timestamp=emails.localize_timestamp(timestamp, self.user),
         )
 
-        assert_true(send_mail.called)
-        send_mail.assert_called_with(
-            to_addr=self.user.username,
-            mail=mails.TRANSACTIONAL,
+        rendered_subject, rendered_message = mails.render_mail(
+            mails.TRANSACTIONAL,
             mimetype='html',
-            name=self.user.fullname,
             node_title=self.project.title,
             node_id=self.project._id,
             subject=subject,
@@ -1119,6 +1204,46 @@ class TestSendEmails(OsfTestCase):
             url=self.project.absolute_url + 'settings/',
         )
 
+        assert_true(send_mail.called)
+        send_mail.assert_called_with(
+            to_addr=self.user.username,
+            subject=rendered_subject,
+            message=rendered_message,
+            mimetype='html',
+        )
+
+    @mock.patch('website.mails.send_rendered_mail')
+    def test_send_email_transactional_renders_once_per_timezone(self, mock_send):
+        users = [factories.UserFactory(timezone='Etc/UTC') for _ in range(3)]
+        users.append(factories.UserFactory(timezone='America/New_York'))
+        timestamp = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
+        with mock.patch('website.mails.render_message', wraps=mails.render_message) as mock_render:
+            emails.email_transactional(
+                [u._id for u in users] + [self.project.creator._id], self.project._id, 'comments',
+                user=self.project.creator,
+                node=self.project,
+                timestamp=timestamp,
+                gravatar_url=self.user.gravatar_url,
+                content='',
+                parent_comment='',
+                url=self.project.absolute_url,
+            )
+        # One event body and one wrapper per timezone
+        assert_equal(mock_render.call_count, 4)
+        assert_equal(
+            [each[1]['to_addr'] for each in mock_send.call_args_list],
+            [u.username for u in users]
+        )
+
+    def test_group_recipients(self):
+        users = [
+            factories.UserFactory(timezone='Etc/UTC', locale='en_US'),
+            factories.UserFactory(timezone='America/New_York', locale='en_US'),
+            factories.UserFactory(timezone='Etc/UTC', locale='en_US'),
+        ]
+        groups = emails.group_recipients([u._id for u in users], self.user, self.project._id)
+        assert_equal(groups.values(), [[users[0], users[2]], [users[1]]])
+
     def test_send_email_digest_creates_digest_notification(self):
         subscribed_users = [factories.UserFactory()._id]
         digest_count_before = NotificationDigest.find().count()
@@ -1232,7 +1357,7 @@ class TestSendDigest(OsfTestCase):
             node_lineage=[project._id]
         )
         d2.save()
-        user_groups = group_digest_notifications_by_user()
+        user_groups = list(group_digest_notifications_by_user())
         expected = [{
                     u'user_id': user._id,
                     u'info': [{
@@ -1251,11 +1376,11 @@ class TestSendDigest(OsfTestCase):
         }]
 
         assert_equal(len(user_groups), 2)
-        assert_equal(user_groups, expected)
+        assert_equal(user_groups, sorted(expected, key=lambda group: group['user_id']))
 
-    @mock.patch('scripts.send_digest.remove_sent_digest_notifications')
-    @mock.patch('website.mails.send_mail')
-    def test_send_digest_called_with_correct_args(self, mock_send_mail, mock_callback):
+    @mock.patch('framework.email.tasks.send_emails')
+    def test_send_digest_called_with_correct_args(self, mock_send_emails):
+        mock_send_emails.side_effect = lambda messages, **kwargs: [True] * len(messages)
         d = factories.NotificationDigestFactory(
             user_id=factories.UserFactory()._id,
             timestamp=datetime.datetime.utcnow(),
@@ -1263,25 +1388,101 @@ class TestSendDigest(OsfTestCase):
             node_lineage=[factories.ProjectFactory()._id]
         )
         d.save()
-        user_groups = group_digest_notifications_by_user()
+        user_groups = list(group_digest_notifications_by_user())
         send_digest(user_groups)
-        assert_true(mock_send_mail.called)
-        assert_equals(mock_send_mail.call_count, len(user_groups))
+        assert_equal(mock_send_emails.call_count, 1)
+        messages = mock_send_emails.call_args[0][0]
+        assert_equals(len(messages), len(user_groups))
 
         last_user_index = len(user_groups) - 1
         user = User.load(user_groups[last_user_index]['user_id'])
-        digest_notification_ids = [message['_id'] for message in user_groups[last_user_index]['info']]
-
-        args, kwargs = mock_send_mail.call_args
-
-        assert_equal(kwargs['to_addr'], user.username)
-        assert_equal(kwargs['mimetype'], 'html')
-        assert_equal(kwargs['mail'], mails.DIGEST)
-        assert_equal(kwargs['name'], user.fullname)
-        message = group_messages_by_node(user_groups[last_user_index]['info'])
-        assert_equal(kwargs['message'], message)
-        assert_equal(kwargs['callback'],
-                mock_callback.si(digest_notification_ids=digest_notification_ids))
+
+        message = messages[last_user_index]
+        subject, body = mails.render_mail(
+            mails.DIGEST,
+            mimetype='html',
+            name=user.fullname,
+            message=group_messages_by_node(user_groups[last_user_index]['info']),
+        )
+        assert_equal(message['to_addr'], user.username)
+        assert_equal(message['mimetype'], 'html')
+        assert_equal(message['subject'], subject)
+        assert_equal(message['message'], body)
+        # Sent digests are removed
+        assert_equal(NotificationDigest.find(Q('_id', 'eq', d._id)).count(), 0)
+
+    @mock.patch('framework.email.tasks.send_emails')
+    def test_send_digest_keeps_digests_that_were_not_sent(self, mock_send_emails):
+        mock_send_emails.side_effect = lambda messages, **kwargs: [False] * len(messages)
+        d = factories.NotificationDigestFactory(
+            user_id=factories.UserFactory()._id,
+            timestamp=datetime.datetime.utcnow(),
+            message='Hello',
+            node_lineage=[factories.ProjectFactory()._id]
+        )
+        assert_equal(send_digest(group_digest_notifications_by_user()), 0)
+        d.reload()
+        assert_false(d.sending)
+        # Retried on the next run
+        assert_equal(len(list(group_digest_notifications_by_user())), 1)
+
+    @mock.patch('framework.email.tasks.send_emails')
+    def test_send_digest_in_batches(self, mock_send_emails):
+        mock_send_emails.side_effect = lambda messages, **kwargs: [True] * len(messages)
+        project = factories.ProjectFactory()
+        for _ in range(5):
+            factories.NotificationDigestFactory(
+                user_id=factories.UserFactory()._id,
+                timestamp=datetime.datetime.utcnow(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+        assert_equal(send_digest(group_digest_notifications_by_user(), workers=2, batch_size=2), 5)
+        assert_equal(mock_send_emails.call_count, 5)
+        assert_equal(NotificationDigest.find().count(), 0)
+
+    @mock.patch('framework.email.tasks.send_emails')
+    def test_send_digest_removes_each_sent_digest(self, mock_send_emails):
+        project = factories.ProjectFactory()
+        digests = [
+            factories.NotificationDigestFactory(
+                user_id=factories.UserFactory()._id,
+                timestamp=datetime.datetime.utcnow(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+            for _ in range(2)
+        ]
+        remaining = []
+
+        def send_emails(messages, **kwargs):
+            # The first user's digest is gone before the second is sent
+            remaining.append(NotificationDigest.find().count())
+            return [True]
+        mock_send_emails.side_effect = send_emails
+        send_digest(group_digest_notifications_by_user(), workers=1, batch_size=2)
+        assert_equal(remaining, [2, 1])
+
+    def test_unmark_interrupted_digest_notifications(self):
+        project = factories.ProjectFactory()
+        interrupted = factories.NotificationDigestFactory(
+            user_id=factories.UserFactory()._id,
+            timestamp=datetime.datetime.utcnow(),
+            message='Hello',
+            node_lineage=[project._id],
+            sending=True,
+        )
+        pending = factories.NotificationDigestFactory(
+            user_id=factories.UserFactory()._id,
+            timestamp=datetime.datetime.utcnow(),
+            message='Hello',
+            node_lineage=[project._id],
+        )
+        assert_equal(unmark_interrupted_digest_notifications(), 1)
+        interrupted.reload()
+        assert_false(interrupted.sending)
+        assert_equal(NotificationDigest.find().count(), 2)
+        assert_equal(len(list(group_digest_notifications_by_user())), 2)
 
     def test_remove_sent_digest_notifications(self):
         d = factories.NotificationDigestFactory(
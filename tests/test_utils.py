@@ -2,6 +2,7 @@
 import os
 import mock
 import unittest
+import threading
 from flask import Flask
 from nose.tools import *  # noqa (PEP8 asserts)
 import datetime
@@ -15,6 +16,7 @@ from website.routes import process_rules, OsfWebRenderer
 from website import settings
 from website.util import paths
 from website.util.mimetype import get_mimetype
+from website.util.cache import LRUCache
 from website.util import web_url_for, api_url_for, is_json_request, waterbutler_url_for, conjunct, api_v2_url
 from website.project import utils as project_utils
 
@@ -305,6 +307,56 @@ class TestWebsiteUtils(unittest.TestCase):
         assert_equal(conjunct(words, conj='or'), 'a, b, or c')
 
 
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_and_set(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        assert_equal(cache.get('a'), 1)
+        assert_is_none(cache.get('b'))
+        assert_equal(cache.stats()['hits'], 1)
+        assert_equal(cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert_equal(cache.get('a'), 1)
+        assert_is_none(cache.get('b'))
+        assert_equal(len(cache), 2)
+
+    @mock.patch('website.util.cache.time.time')
+    def test_entries_expire(self, mock_time):
+        mock_time.return_value = 100
+        cache = LRUCache(ttl=10)
+        cache.set('a', 1)
+        mock_time.return_value = 111
+        assert_is_none(cache.get('a'))
+
+    def test_delete_matching(self):
+        cache = LRUCache()
+        cache.set(('a', 1), 1)
+        cache.set(('b', 1), 2)
+        cache.delete_matching(lambda key: key[0] == 'a')
+        assert_is_none(cache.get(('a', 1)))
+        assert_equal(cache.get(('b', 1)), 2)
+
+    def test_record_hit_and_miss_from_threads(self):
+        cache = LRUCache()
+        threads = [
+            threading.Thread(target=lambda: [(cache.record_hit(), cache.record_miss()) for _ in range(1000)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_equal(cache.stats()['hits'], 4000)
+        assert_equal(cache.stats()['misses'], 4000)
+
+
 class TestProjectUtils(OsfTestCase):
 
     def set_registered_date(self, reg, date):
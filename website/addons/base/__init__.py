@@ -7,7 +7,6 @@ from bson import ObjectId
 from flask import request
 from modularodm import fields
 from mako.lookup import TemplateLookup
-from time import sleep
 
 import furl
 import requests
@@ -26,6 +25,7 @@ from framework.exceptions import (
 from website import settings
 from website.addons.base import exceptions
 from website.addons.base import serializer
+from website.addons.base.crawler import FileTreeCrawler
 from website.project.model import Node
 from website.util import waterbutler_url_for
 
@@ -852,7 +852,7 @@ class StorageAddonBase(object):
             name = name + ": {folder}".format(folder=folder_name)
         return name
 
-    def _get_fileobj_child_metadata(self, filenode, user, cookie=None, version=None):
+    def _get_fileobj_child_metadata_url(self, filenode, user, cookie=None, version=None):
         kwargs = dict(
             provider=self.config.short_name,
             path=filenode.get('path', ''),
@@ -864,41 +864,30 @@ class StorageAddonBase(object):
             kwargs['cookie'] = cookie
         if version:
             kwargs['version'] = version
-        metadata_url = waterbutler_url_for(
+        return waterbutler_url_for(
             'metadata',
             **kwargs
         )
-        res = requests.get(metadata_url)
+
+    def _parse_fileobj_child_metadata(self, res, version=None):
         if res.status_code != 200:
             raise HTTPError(res.status_code, data={
                 'error': res.json(),
             })
-        # TODO: better throttling?
-        sleep(1.0 / 5.0)
         return res.json().get('data', [])
 
     def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None):
         """
-        Recursively get file metadata
+        Get file metadata for the whole tree below `filenode`; see
+        `crawler.FileTreeCrawler`
         """
         filenode = filenode or {
             'path': '/',
             'kind': 'folder',
             'name': self.root_node.name,
         }
-        if filenode.get('kind') == 'file':
-            return filenode
-        elif 'size' in filenode:
-            return filenode
-        kwargs = {
-            'version': version,
-            'cookie': cookie,
-        }
-        filenode['children'] = [
-            self._get_file_tree(child, user, cookie=cookie)
-            for child in self._get_fileobj_child_metadata(filenode, user, **kwargs)
-        ]
-        return filenode
+        crawler = FileTreeCrawler(self, user, cookie=cookie, version=version)
+        return crawler.crawl(filenode)
 
 class AddonOAuthNodeSettingsBase(AddonNodeSettingsBase):
     _meta = {
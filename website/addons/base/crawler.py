@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Concurrent, rate-limited collection of addon file trees for the archiver.
+
+Folder listings at each level of the tree are fetched in parallel, each worker
+thread reusing its own HTTP session. Requests to a provider are limited by a token bucket shared by
+every crawl in the process, and throttled (429) or failed (5xx) requests are
+retried with exponential backoff.
+"""
+import time
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from website import settings
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket(object):
+    """Allows `rate` acquisitions per second on average, with bursts of up to
+    `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(provider):
+    """The token bucket limiting requests to `provider` in this process."""
+    with _buckets_lock:
+        if provider not in _buckets:
+            rate = settings.ARCHIVE_CRAWL_RATE_LIMITS.get(
+                provider,
+                settings.ARCHIVE_CRAWL_RATE_LIMITS['default'],
+            )
+            _buckets[provider] = TokenBucket(rate)
+        return _buckets[provider]
+
+
+def is_folder(filenode):
+    return filenode.get('kind') != 'file' and 'size' not in filenode
+
+
+class FileTreeCrawler(object):
+    """Fills in the ``children`` of every folder below `root` using the
+    metadata hooks of a `StorageAddonBase`.
+    """
+
+    def __init__(self, addon, user, cookie=None, version=None, workers=None):
+        self.addon = addon
+        self.user = user
+        self.cookie = cookie
+        self.version = version
+        self.workers = workers or settings.ARCHIVE_CRAWL_WORKERS
+        self.bucket = get_bucket(addon.config.short_name)
+        self.num_requests = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def get_session(self):
+        """The HTTP session of the calling thread, since sessions aren't
+        thread safe.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=self.workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    def fetch(self, url, version=None):
+        """Fetch and parse one folder listing, retrying throttled and failed
+        requests.
+        """
+        delay = settings.ARCHIVE_CRAWL_BACKOFF
+        for attempt in range(settings.ARCHIVE_CRAWL_MAX_RETRIES + 1):
+            self.bucket.acquire()
+            with self._lock:
+                self.num_requests += 1
+            res = self.get_session().get(url, timeout=settings.ARCHIVE_CRAWL_TIMEOUT)
+            if res.status_code in RETRY_STATUSES and attempt < settings.ARCHIVE_CRAWL_MAX_RETRIES:
+                retry_after = res.headers.get('Retry-After', '')
+                wait = float(retry_after) if retry_after.isdigit() else delay
+                logger.info('Got {0} listing {1}; retrying in {2}s'.format(res.status_code, url, wait))
+                time.sleep(wait)
+                delay *= 2
+                continue
+            return self.addon._parse_fileobj_child_metadata(res, version=version)
+
+    def crawl(self, root):
+        start = time.time()
+        pool = ThreadPool(self.workers)
+        try:
+            level = [root] if is_folder(root) else []
+            version = self.version
+            while level:
+                # URLs are built here rather than in the workers, since
+                # building them may touch the database
+                urls = [
+                    self.addon._get_fileobj_child_metadata_url(
+                        folder, self.user, cookie=self.cookie, version=version
+                    )
+                    for folder in level
+                ]
+                listings = pool.map(lambda url: self.fetch(url, version=version), urls)
+                next_level = []
+                for folder, children in zip(level, listings):
+                    folder['children'] = children
+                    next_level.extend(child for child in children if is_folder(child))
+                level = next_level
+                # Only the root is listed at the requested version
+                version = None
+        finally:
+            pool.close()
+            pool.join()
+        logger.info('Listed {0} folders of {1} on {2} in {3:.2f}s'.format(
+            self.num_requests, self.addon.config.short_name, self.addon.owner._id, time.time() - start
+        ))
+        return root
@@ -49,6 +49,7 @@ class OsfStorageNodeSettings(StorageAddonBase, AddonNodeSettingsBase):
         self.save()
         # Note: The "root" node will always be "named" empty string
         root = OsfStorageFileNode(name='', kind='folder', node_settings=self)
+        root.set_tree_position(None)
         root.save()
         self.root_node = root
         self.save()
@@ -136,6 +137,12 @@ class OsfStorageFileNode(StoredObject):
     versions = fields.ForeignField('OsfStorageFileVersion', list=True)
     node_settings = fields.ForeignField('OsfStorageNodeSettings', required=True, index=True)
 
+    # Stored materialized path and ids of all ancestors, root first; kept up
+    # to date by `_create_child`, `move_under` and `utils.copy_files`. None for
+    # records not yet backfilled by scripts/osfstorage/migrate_materialized_paths.py
+    _materialized_path = fields.StringField(index=True)
+    ancestor_ids = fields.StringField(list=True, index=True)
+
     @classmethod
     def create_child_by_path(cls, path, node_settings):
         """Attempts to create a child node from a path formatted as
@@ -189,6 +196,16 @@ class OsfStorageFileNode(StoredObject):
             Q('node_settings', 'eq', node_settings)
         )
 
+    @classmethod
+    def get_by_materialized_path(cls, materialized_path, node_settings):
+        """Look up a file or folder by its materialized path, e.g.
+        ``/folder/file.txt`` or ``/folder/``.
+        """
+        return cls.find_one(
+            Q('_materialized_path', 'eq', materialized_path) &
+            Q('node_settings', 'eq', node_settings)
+        )
+
     @classmethod
     def get_file(cls, path, node_settings):
         return cls.find_one(
@@ -218,28 +235,58 @@ class OsfStorageFileNode(StoredObject):
     def node(self):
         return self.node_settings.owner
 
+    @property
+    @utils.must_be('folder')
+    def descendants(self):
+        """All files and folders below this folder, in one query."""
+        return self.__class__.find(Q('ancestor_ids', 'eq', self._id))
+
     def materialized_path(self):
-        """creates the full path to a the given filenode
-        Note: Possibly high complexity/ many database calls
-        USE SPARINGLY
-        """
+        """The full path to this file node, e.g. ``/folder/file.txt``"""
+        if self._materialized_path is not None:
+            return self._materialized_path
         if not self.parent:
             return '/'
-        # Note: ODM cache can be abused here
-        # for highly nested folders calling
-        # list(self.__class__.find(Q(nodesetting),Q(folder))
-        # may result in a massive increase in performance
-        def lineage():
-            current = self
-            while current:
-                yield current
-                current = current.parent
-
-        path = os.path.join(*reversed([x.name for x in lineage()]))
+        # Not yet backfilled; walk up the tree
+        path = os.path.join(*reversed([x.name for x in self._walk_lineage()]))
         if self.is_folder:
             return '/{}/'.format(path)
         return '/{}'.format(path)
 
+    def _walk_lineage(self):
+        current = self
+        while current:
+            yield current
+            current = current.parent
+
+    def lineage(self):
+        """This node followed by its ancestors, ending with the root folder"""
+        if self._materialized_path is None:
+            return list(self._walk_lineage())
+        ancestors = {
+            ancestor._id: ancestor
+            for ancestor in self.__class__.find(Q('_id', 'in', self.ancestor_ids))
+        }
+        return [self] + [ancestors[each] for each in reversed(self.ancestor_ids)]
+
+    def set_tree_position(self, parent):
+        """Set the stored materialized path and ancestors of this node for
+        its name and `parent`. Does not save.
+        """
+        if parent is None:
+            self._materialized_path = '/'
+            self.ancestor_ids = []
+            return
+        self._materialized_path = '{}{}{}'.format(
+            parent.materialized_path(),
+            self.name,
+            '/' if self.is_folder else '',
+        )
+        if parent._materialized_path is not None:
+            self.ancestor_ids = parent.ancestor_ids + [parent._id]
+        else:
+            self.ancestor_ids = [each._id for each in reversed(list(parent._walk_lineage()))]
+
     @utils.must_be('folder')
     def find_child_by_name(self, name, kind='file'):
         return self.__class__.find_one(
@@ -262,6 +309,7 @@ class OsfStorageFileNode(StoredObject):
             parent=self,
             node_settings=self.node_settings
         )
+        child.set_tree_position(self)
         if save:
             child.save()
         return child
@@ -320,6 +368,8 @@ class OsfStorageFileNode(StoredObject):
         trashed.parent = self.parent
         trashed.versions = self.versions
         trashed.node_settings = self.node_settings
+        trashed._materialized_path = self._materialized_path
+        trashed.ancestor_ids = self.ancestor_ids
 
         trashed.save()
 
@@ -349,14 +399,37 @@ class OsfStorageFileNode(StoredObject):
         return utils.copy_files(self, destination_parent.node_settings, destination_parent, name=name)
 
     def move_under(self, destination_parent, name=None):
+        old_path = self.materialized_path()
+        old_ancestor_ids = list(self.ancestor_ids)
+
         self.name = name or self.name
         self.parent = destination_parent
         self.node_settings = destination_parent.node_settings
+        self.set_tree_position(destination_parent)
 
         self.save()
 
+        # Moving to the same path in another node changes only the ancestors
+        if self.is_folder and (
+            self._materialized_path != old_path or
+            self.ancestor_ids != old_ancestor_ids
+        ):
+            self._update_descendant_paths(old_path, old_ancestor_ids)
+
         return self
 
+    def _update_descendant_paths(self, old_path, old_ancestor_ids):
+        """Rewrite the stored paths and ancestors of descendants after this
+        folder was moved or renamed.
+        """
+        depth = len(old_ancestor_ids)
+        for descendant in self.descendants:
+            if descendant._materialized_path is None:
+                continue
+            descendant._materialized_path = self._materialized_path + descendant._materialized_path[len(old_path):]
+            descendant.ancestor_ids = self.ancestor_ids + descendant.ancestor_ids[depth:]
+            descendant.save()
+
     def __repr__(self):
         return '<{}(name={!r}, node_settings={!r})>'.format(
             self.__class__.__name__,
@@ -487,3 +560,6 @@ class OsfStorageTrashedFileNode(StoredObject):
     parent = fields.ForeignField('OsfStorageFileNode', index=True)
     versions = fields.ForeignField('OsfStorageFileVersion', list=True)
     node_settings = fields.ForeignField('OsfStorageNodeSettings', required=True, index=True)
+    # Position in the file tree at the time of deletion
+    _materialized_path = fields.StringField()
+    ancestor_ids = fields.StringField(list=True)
@@ -19,3 +19,6 @@ WATERBUTLER_SETTINGS = {
 WATERBUTLER_RESOURCE = 'folder'
 
 DISK_SAVING_MODE = settings.DISK_SAVING_MODE
+
+# Number of file nodes inserted per batch when copying a folder
+COPY_CHUNK_SIZE = 500
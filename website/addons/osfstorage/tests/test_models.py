@@ -227,6 +227,71 @@ class TestOsfstorageFileNode(StorageTestCase):
         child = self.node_settings.root_node.append_folder('Cloud').append_file('Carp')
         assert_equals('/Cloud/Carp', child.materialized_path())
 
+    def test_materialized_path_is_stored(self):
+        folder = self.node_settings.root_node.append_folder('Cloud')
+        child = folder.append_file('Carp')
+        assert_equal(child._materialized_path, '/Cloud/Carp')
+        assert_equal(child.ancestor_ids, [self.node_settings.root_node._id, folder._id])
+        assert_equal(self.node_settings.root_node._materialized_path, '/')
+
+    def test_materialized_path_not_backfilled(self):
+        child = self.node_settings.root_node.append_folder('Cloud').append_file('Carp')
+        child._materialized_path = None
+        assert_equals('/Cloud/Carp', child.materialized_path())
+
+    def test_lineage(self):
+        folder = self.node_settings.root_node.append_folder('Cloud')
+        child = folder.append_file('Carp')
+        assert_equal(child.lineage(), [child, folder, self.node_settings.root_node])
+
+    def test_descendants(self):
+        folder = self.node_settings.root_node.append_folder('Cloud')
+        subfolder = folder.append_folder('Sub')
+        child = subfolder.append_file('Carp')
+        assert_equal(set(folder.descendants), {subfolder, child})
+
+    def test_get_by_materialized_path(self):
+        child = self.node_settings.root_node.append_folder('Cloud').append_file('Carp')
+        assert_equal(
+            model.OsfStorageFileNode.get_by_materialized_path('/Cloud/Carp', self.node_settings),
+            child
+        )
+
+    def test_copy_folder_paths(self):
+        folder = self.node_settings.root_node.append_folder('Cloud')
+        folder.append_file('Carp')
+        copy_to = self.node_settings.root_node.append_folder('Sky')
+
+        copied = folder.copy_under(copy_to)
+        copied_child = copied.find_child_by_name('Carp')
+
+        assert_equal(copied.materialized_path(), '/Sky/Cloud/')
+        assert_equal(copied_child.materialized_path(), '/Sky/Cloud/Carp')
+        assert_equal(copied_child.ancestor_ids, [self.node_settings.root_node._id, copy_to._id, copied._id])
+
+    def test_move_folder_updates_descendant_paths(self):
+        folder = self.node_settings.root_node.append_folder('Cloud')
+        child = folder.append_folder('Sub').append_file('Carp')
+        move_to = self.node_settings.root_node.append_folder('Sky')
+
+        folder.move_under(move_to, name='Fog')
+        child.reload()
+
+        assert_equal(child.materialized_path(), '/Sky/Fog/Sub/Carp')
+        assert_equal(child.ancestor_ids[:3], [self.node_settings.root_node._id, move_to._id, folder._id])
+        assert_equal(len(child.ancestor_ids), 4)
+
+    def test_move_folder_to_same_path_in_other_node(self):
+        folder = self.node_settings.root_node.append_folder('Cloud')
+        child = folder.append_file('Carp')
+        other_settings = ProjectFactory(creator=self.user).get_addon('osfstorage')
+
+        folder.move_under(other_settings.root_node)
+        child.reload()
+
+        assert_equal(child.materialized_path(), '/Cloud/Carp')
+        assert_equal(child.ancestor_ids, [other_settings.root_node._id, folder._id])
+
     def test_copy(self):
         to_copy = self.node_settings.root_node.append_file('Carp')
         copy_to = self.node_settings.root_node.append_folder('Cloud')
@@ -71,3 +71,61 @@ class TestSerializeRevision(StorageTestCase):
             anon=True
         )
         assert_equal(expected, observed)
+
+
+class TestCopyFiles(StorageTestCase):
+
+    def setUp(self):
+        super(TestCopyFiles, self).setUp()
+        self.root = self.node_settings.root_node
+        self.folder = self.root.append_folder('Cloud')
+        self.subfolder = self.folder.append_folder('Sub')
+        self.file = self.subfolder.append_file('Carp')
+        self.file.versions = [factories.FileVersionFactory(creator=self.user)]
+        self.file.save()
+        self.destination = self.root.append_folder('Sky')
+
+    def test_copy_subtree(self):
+        copied = utils.copy_files(self.folder, self.node_settings, parent=self.destination)
+        copied_sub = copied.find_child_by_name('Sub', kind='folder')
+        copied_file = copied_sub.find_child_by_name('Carp')
+
+        assert_not_equal(copied_file._id, self.file._id)
+        assert_equal(copied_file.versions, self.file.versions)
+        assert_equal(copied_file.materialized_path(), '/Sky/Cloud/Sub/Carp')
+        assert_equal(
+            copied_file.ancestor_ids,
+            [self.root._id, self.destination._id, copied._id, copied_sub._id]
+        )
+        assert_equal(set(copied.descendants), {copied_sub, copied_file})
+
+    def test_copy_subtree_in_chunks(self):
+        progress = []
+        for idx in range(5):
+            self.folder.append_file(str(idx))
+        copied = utils.copy_files(self.folder, self.node_settings, parent=self.destination)
+        utils.copy_subtree(
+            self.folder,
+            copied.append_folder('Again'),
+            progress=lambda *args: progress.append(args),
+            chunk_size=3,
+        )
+        assert_equal(progress, [(3, 7), (6, 7), (7, 7)])
+
+    def test_copy_subtree_without_stored_paths(self):
+        self.db['osfstoragefilenode'].update(
+            {'_id': {'$in': [self.subfolder._id, self.file._id]}},
+            {'$set': {'_materialized_path': None, 'ancestor_ids': []}},
+            multi=True,
+        )
+        copied = utils.copy_files(self.folder, self.node_settings, parent=self.destination)
+        copied_file = copied.find_child_by_name('Sub', kind='folder').find_child_by_name('Carp')
+        assert_equal(copied_file.materialized_path(), '/Sky/Cloud/Sub/Carp')
+
+    def test_copy_to_other_node(self):
+        fork = self.project.fork_node(self.auth_obj)
+        fork_settings = fork.get_addon('osfstorage')
+        copied_file = fork_settings.root_node.find_child_by_name('Cloud', kind='folder') \
+            .find_child_by_name('Sub', kind='folder').find_child_by_name('Carp')
+        assert_equal(copied_file.node_settings, fork_settings)
+        assert_equal(copied_file.versions, self.file.versions)
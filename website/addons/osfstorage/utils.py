@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
+import bson
 import httplib
 import logging
 import functools
 
 from modularodm.exceptions import ValidationValueError
 
+from framework.mongo import database
 from framework.exceptions import HTTPError
 from framework.analytics import update_counter
 
@@ -101,16 +104,20 @@ def must_be(_type):
     return _must_be
 
 
-def copy_files(src, target_settings, parent=None, name=None):
+def copy_files(src, target_settings, parent=None, name=None, progress=None):
     """Copy the files from src to the target nodesettings
     :param OsfStorageFileNode src: The source to copy children from
     :param OsfStorageNodeSettings target_settings: The node settings of the project to copy files to
     :param OsfStorageFileNode parent: The parent of to attach the clone of src to, if applicable
+    :param callable progress: Called with the number of descendants copied so
+        far and the total after each batch is inserted
     """
+    start = time.time()
     cloned = src.clone()
     cloned.parent = parent
     cloned.name = name or cloned.name
     cloned.node_settings = target_settings
+    cloned.set_tree_position(parent)
 
     if src.is_file:
         cloned.versions = src.versions
@@ -118,7 +125,69 @@ def copy_files(src, target_settings, parent=None, name=None):
     cloned.save()
 
     if src.is_folder:
-        for child in src.children:
-            copy_files(child, target_settings, parent=cloned)
+        count = copy_subtree(src, cloned, progress=progress)
+        logger.info('Copied {0} file nodes from {1} to {2} in {3:.2f}s'.format(
+            count + 1, src._id, cloned._id, time.time() - start
+        ))
 
     return cloned
+
+
+def get_subtree_records(src):
+    """Fetch the raw records of every descendant of folder `src`, parents
+    before their children. Uses a single query if `src` has a stored position,
+    else one query per level of the tree.
+    """
+    collection = database['osfstoragefilenode']
+    if src._materialized_path is not None:
+        records = list(collection.find({'ancestor_ids': src._id}))
+        found = set(record['_id'] for record in records) | {src._id}
+        # Descendants created before paths were stored are not found by the
+        # ancestor query; walk the tree instead if the result has gaps
+        if all(record['parent'] in found for record in records) and (
+                records or not collection.find_one({'parent': src._id})):
+            return sorted(records, key=lambda record: len(record['ancestor_ids']))
+    records = []
+    level = [src._id]
+    while level:
+        children = list(collection.find({'parent': {'$in': level}}))
+        records.extend(children)
+        level = [child['_id'] for child in children if child['kind'] == 'folder']
+    return records
+
+
+def copy_subtree(src, cloned, progress=None, chunk_size=None):
+    """Copy all descendants of folder `src` under its copy `cloned` with
+    batched inserts. File versions are shared with the source, as in
+    `copy_files`. Returns the number of file nodes copied.
+    """
+    chunk_size = chunk_size or settings.COPY_CHUNK_SIZE
+    records = get_subtree_records(src)
+    positions = {cloned._id: (cloned.materialized_path(), cloned.ancestor_ids)}
+    id_map = {src._id: cloned._id}
+    for record in records:
+        id_map[record['_id']] = str(bson.ObjectId())
+
+    copies = []
+    for record in records:
+        copy = dict(record)
+        copy.pop('__backrefs', None)
+        copy['_id'] = id_map[record['_id']]
+        copy['parent'] = id_map[record['parent']]
+        copy['node_settings'] = cloned.node_settings._id
+        parent_path, parent_ancestors = positions[copy['parent']]
+        copy['_materialized_path'] = u'{0}{1}{2}'.format(
+            parent_path, record['name'], '/' if record['kind'] == 'folder' else ''
+        )
+        copy['ancestor_ids'] = parent_ancestors + [copy['parent']]
+        positions[copy['_id']] = (copy['_materialized_path'], copy['ancestor_ids'])
+        copies.append(copy)
+
+    for idx in range(0, len(copies), chunk_size):
+        database['osfstoragefilenode'].insert(copies[idx:idx + chunk_size])
+        copied = min(idx + chunk_size, len(copies))
+        logger.debug('Copied {0} of {1} file nodes under {2}'.format(copied, len(copies), cloned._id))
+        if progress:
+            progress(copied, len(copies))
+
+    return len(copies)
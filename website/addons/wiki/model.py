@@ -13,12 +13,20 @@ from modularodm import fields
 
 from framework.forms.utils import sanitize
 from framework.guid.model import GuidStoredObject
+from framework.mongo import database
 
 from website import settings
 from website.addons.base import AddonNodeSettingsBase
 from website.addons.wiki import utils as wiki_utils
-from website.addons.wiki.settings import WIKI_CHANGE_DATE
+from website.addons.wiki.settings import (
+    WIKI_CHANGE_DATE,
+    WIKI_RENDER_CACHE_SIZE,
+    WIKI_RENDER_VERSION,
+    WIKI_COMPACT_VERSIONS,
+    WIKI_SNAPSHOT_INTERVAL,
+)
 from website.project.signals import write_permissions_revoked
+from website.util.cache import LRUCache
 
 from .exceptions import (
     NameEmptyError,
@@ -29,6 +37,11 @@ from .exceptions import (
 
 logger = logging.getLogger(__name__)
 
+# Rendered HTML keyed on (page id, version, node id); the node is part of the
+# key because wikilinks resolve against the node the page is viewed from.
+# Renderings for the node that owns the page are also stored on the page.
+render_cache = LRUCache(maxsize=WIKI_RENDER_CACHE_SIZE)
+
 
 class AddonWikiNodeSettings(AddonNodeSettingsBase):
 
@@ -94,6 +107,86 @@ def render_content(content, node):
     return sanitized_content
 
 
+def html_to_text(html):
+    return sanitize(html, tags=[], strip=True)
+
+
+def snapshot_position(position):
+    """Index in a version list of the full snapshot that the version at
+    `position` is diffed against.
+    """
+    return position - position % WIKI_SNAPSHOT_INTERVAL
+
+
+def is_version_shared(page, node):
+    """Whether the version `page` may be referred to by a node other than
+    `node`. Forks and registrations share the versions their source had when
+    they were made, and don't own them.
+    """
+    if page.node is None or page.node._id != node._id:
+        return True
+    return database['node'].find({'$or': [
+        {'forked_from': node._id, 'forked_date': {'$gte': page.date}},
+        {'registered_from': node._id, 'registered_date': {'$gte': page.date}},
+    ]}).limit(1).count(True) > 0
+
+
+def compact_version(node, version_ids, position):
+    """Compact the version at `position` of a page's list of version ids on
+    `node`, unless it is a snapshot, the current version, or shared with a
+    fork or registration.
+    """
+    if not WIKI_COMPACT_VERSIONS:
+        return False
+    base_position = snapshot_position(position)
+    if position == base_position or position >= len(version_ids) - 1:
+        return False
+    page = NodeWikiPage.load(version_ids[position])
+    if page is None or is_version_shared(page, node):
+        return False
+    base = NodeWikiPage.load(version_ids[base_position])
+    return page.compact(base)
+
+
+def get_version_summaries(version_ids):
+    """Return the version number, date and author name of each version in
+    `version_ids`, in the same order, without loading page content. Uses one
+    query for the versions and one for their authors.
+    """
+    versions = {
+        each['_id']: each
+        for each in database['nodewikipage'].find(
+            {'_id': {'$in': list(version_ids)}},
+            {'version': True, 'date': True, 'user': True},
+        )
+    }
+    user_ids = list(set(each.get('user') for each in versions.values()) - {None})
+    fullnames = {
+        each['_id']: each.get('fullname')
+        for each in database['user'].find({'_id': {'$in': user_ids}}, {'fullname': True})
+    }
+    return [
+        {
+            'version': versions[version_id].get('version'),
+            'date': versions[version_id].get('date'),
+            'user_fullname': fullnames.get(versions[version_id].get('user')),
+        }
+        for version_id in version_ids
+        if version_id in versions
+    ]
+
+
+def get_page_names(page_ids):
+    """Map each of `page_ids` to its page name using a single query."""
+    return {
+        each['_id']: each.get('page_name')
+        for each in database['nodewikipage'].find(
+            {'_id': {'$in': list(page_ids)}},
+            {'page_name': True},
+        )
+    }
+
+
 class NodeWikiPage(GuidStoredObject):
 
     _id = fields.StringField(primary=True)
@@ -103,10 +196,38 @@ class NodeWikiPage(GuidStoredObject):
     date = fields.DateTimeField(auto_now_add=datetime.datetime.utcnow)
     is_current = fields.BooleanField()
     content = fields.StringField(default='')
+    # Plain text of `content`, computed when the version is saved and used by
+    # the search indexer. Versions are immutable, so it never goes stale.
+    rendered_text = fields.StringField()
+    # Sanitized HTML of `content` rendered for `node`, and the key it was
+    # rendered with; see `render_key`
+    rendered_html = fields.StringField()
+    rendered_html_key = fields.StringField()
+    # Versions between snapshots may be stored as a delta against the full
+    # version `content_base`, with `content` left empty; see `compact_version`.
+    # `load` reconstructs `content`, so readers never see the delta.
+    content_delta = fields.StringField()
+    content_base = fields.StringField()
 
     user = fields.ForeignField('user')
     node = fields.ForeignField('node')
 
+    @classmethod
+    def load(cls, *args, **kwargs):
+        page = super(NodeWikiPage, cls).load(*args, **kwargs)
+        if page is not None and page.content is None and page.content_delta is not None:
+            base = cls.load(page.content_base)
+            if base is None:
+                logger.error('Base version {0} of wiki page {1} is missing'.format(page.content_base, page._id))
+                page.content = ''
+            else:
+                page.content = wiki_utils.patch_content(base.content, page.content_delta)
+        return page
+
+    @property
+    def is_compacted(self):
+        return self.content_delta is not None
+
     @property
     def deep_url(self):
         return '{}wiki/{}/'.format(self.node.deep_url, self.page_name)
@@ -119,8 +240,42 @@ class NodeWikiPage(GuidStoredObject):
     def rendered_before_update(self):
         return self.date < WIKI_CHANGE_DATE
 
+    def render_key(self, node):
+        """Identifies everything besides `content` the HTML depends on: the
+        renderer version and the node that wikilinks resolve against.
+        """
+        return '{0}:{1}'.format(WIKI_RENDER_VERSION, node.url)
+
     def html(self, node):
         """The cleaned HTML of the page"""
+        render_key = self.render_key(node)
+        if self.rendered_html is not None and self.rendered_html_key == render_key:
+            return self.rendered_html
+
+        if self._id is None:
+            # Not saved yet, so there is no id to key the cache on
+            html = self._render_html(node)
+        else:
+            key = (self._id, self.version, node._id)
+            html = render_cache.get(key)
+            if html is None:
+                html = self._render_html(node)
+                render_cache.set(key, html)
+        if self._id is not None and self.node and self.node._id == node._id:
+            self._store_rendered_html(html, render_key)
+        return html
+
+    def _store_rendered_html(self, html, render_key):
+        self.rendered_html = html
+        self.rendered_html_key = render_key
+        if self._is_loaded and not self.is_compacted:
+            # Backfill without `save`, which would reindex the node
+            database['nodewikipage'].update(
+                {'_id': self._id},
+                {'$set': {'rendered_html': html, 'rendered_html_key': render_key}},
+            )
+
+    def _render_html(self, node):
         sanitized_content = render_content(self.content, node=node)
         try:
             return linkify(
@@ -133,8 +288,9 @@ class NodeWikiPage(GuidStoredObject):
 
     def raw_text(self, node):
         """ The raw text of the page, suitable for using in a test search"""
-
-        return sanitize(self.html(node), tags=[], strip=True)
+        if self.rendered_text is None:
+            return html_to_text(self.html(node))
+        return self.rendered_text
 
     def get_draft(self, node):
         """
@@ -158,15 +314,60 @@ class NodeWikiPage(GuidStoredObject):
         return self.content
 
     def save(self, *args, **kwargs):
+        html = None
+        if self.rendered_text is None and self.node:
+            html = self.html(self.node)
+            self.rendered_text = html_to_text(html)
         rv = super(NodeWikiPage, self).save(*args, **kwargs)
+        if html is not None and self.rendered_html is None:
+            # The page was rendered before it had an id; keep the HTML now
+            render_cache.set((self._id, self.version, self.node._id), html)
+            self._store_rendered_html(html, self.render_key(self.node))
         if self.node:
-            self.node.update_search()
+            self.node.update_search(saved_fields=['wiki_pages_current'])
         return rv
 
     def rename(self, new_name, save=True):
         self.page_name = new_name
+        self.clear_rendered_html()
         if save:
             self.save()
 
+    def compact(self, base):
+        """Store this version as a delta against the full version `base`, if
+        the delta is sufficiently smaller than the content. The stored HTML is
+        dropped as well; old versions are re-rendered on the rare occasions
+        they are viewed.
+
+        :return: True if the version was compacted
+        """
+        if self.is_compacted or base is None or base._id == self._id or base.is_compacted:
+            return False
+        delta = wiki_utils.diff_content(base.content, self.content)
+        if len(delta) * 2 > len(self.content):
+            return False
+        # Write directly to avoid `save` reindexing the node, then evict the
+        # cached copies so that the next load reconstructs from the delta
+        database['nodewikipage'].update(
+            {'_id': self._id},
+            {'$set': {
+                'content': None,
+                'content_delta': delta,
+                'content_base': base._id,
+                'rendered_html': None,
+                'rendered_html_key': None,
+            }},
+        )
+        self._clear_caches(self._id)
+        return True
+
+    def clear_rendered_html(self):
+        """Drop the stored and cached HTML of this version, so that it is
+        rendered again on next view.
+        """
+        self.rendered_html = None
+        self.rendered_html_key = None
+        render_cache.delete_matching(lambda key: key[0] == self._id)
+
     def to_json(self):
         return {}
@@ -7,3 +7,22 @@ SHAREJS_URL = '{}:{}'.format(SHAREJS_HOST, SHAREJS_PORT)
 
 # TODO: Change to release date for wiki change
 WIKI_CHANGE_DATE = datetime.datetime.utcfromtimestamp(1423760098)
+
+# Number of rendered wiki page versions kept in memory per process
+WIKI_RENDER_CACHE_SIZE = 512
+# Bump to invalidate the HTML stored with every wiki version, e.g. after
+# changing the Markdown extensions or the sanitizer whitelist
+WIKI_RENDER_VERSION = 1
+
+# Store non-current wiki versions as deltas against a full snapshot taken
+# every WIKI_SNAPSHOT_INTERVAL versions
+WIKI_COMPACT_VERSIONS = True
+WIKI_SNAPSHOT_INTERVAL = 10
+
+# Broadcasts to ShareJS are sent from a background thread so requests do not
+# wait on the ShareJS server. Broadcasts are dropped when the queue is full.
+SHAREJS_BROADCAST_ASYNC = True
+SHAREJS_BROADCAST_QUEUE_SIZE = 1000
+SHAREJS_BROADCAST_RETRIES = 3
+SHAREJS_BROADCAST_RETRY_DELAY = 0.5  # seconds, doubled after each attempt
+SHAREJS_BROADCAST_TIMEOUT = 5
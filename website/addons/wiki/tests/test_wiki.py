@@ -6,7 +6,9 @@ import httplib as http
 
 import mock
 import time
+import unittest
 
+import requests
 from nose.tools import *  # noqa
 from modularodm.exceptions import ValidationValueError
 
@@ -18,11 +20,15 @@ from tests.factories import (
 
 from website.addons.wiki import settings
 from website.addons.wiki.exceptions import InvalidVersionError
-from website.addons.wiki.views import _serialize_wiki_toc, _get_wiki_web_urls, _get_wiki_api_urls
-from website.addons.wiki.model import NodeWikiPage, render_content
+from website.addons.wiki.views import (
+    _serialize_wiki_toc, _get_wiki_web_urls, _get_wiki_api_urls, _get_wiki_versions,
+    _get_wiki_pages_current,
+)
+from website.addons.wiki.model import NodeWikiPage, render_content, render_cache
 from website.addons.wiki.utils import (
     get_sharejs_uuid, generate_private_uuid, share_db, delete_share_doc,
-    migrate_uuid, format_wiki_version,
+    migrate_uuid, format_wiki_version, diff_content, patch_content,
+    SharejsBroadcaster,
 )
 from website.addons.wiki.tests.config import EXAMPLE_DOCS, EXAMPLE_OPS
 from framework.auth import Auth
@@ -161,6 +167,44 @@ class TestWikiViews(OsfTestCase):
         serialized = _serialize_wiki_toc(project, auth=auth)
         assert_equal(len(serialized), 1)
 
+    def test_serialize_wiki_toc_pages_current(self):
+        project = ProjectFactory()
+        auth = Auth(project.creator)
+        child = NodeFactory(parent=project, creator=project.creator)
+        child.update_node_wiki('home', 'Hello', auth)
+        child.update_node_wiki('Second page', 'World', auth)
+        project.save()
+
+        serialized = _serialize_wiki_toc(project, auth=auth)
+        assert_equal(
+            [page['name'] for page in serialized[0]['pages_current']],
+            ['home', 'Second page'],
+        )
+
+    def test_get_wiki_pages_current_does_not_load_pages(self):
+        self.project.update_node_wiki('home', 'Hello', self.consolidate_auth)
+        with mock.patch.object(NodeWikiPage, 'load') as mock_load:
+            pages = _get_wiki_pages_current(self.project)
+        assert_false(mock_load.called)
+        assert_equal(pages[0]['name'], 'home')
+
+    def test_get_wiki_versions(self):
+        other = UserFactory()
+        self.project.add_contributor(other, save=True)
+        self.project.update_node_wiki('home', 'First', self.consolidate_auth)
+        self.project.update_node_wiki('home', 'Second', Auth(other))
+        with mock.patch.object(NodeWikiPage, 'load') as mock_load:
+            versions = _get_wiki_versions(self.project, 'home')
+        assert_false(mock_load.called)
+        assert_equal([each['version'] for each in versions], [2, 1])
+        assert_equal(versions[0]['user_fullname'], other.fullname)
+        assert_equal(versions[1]['user_fullname'], self.user.fullname)
+
+    def test_get_wiki_versions_anonymous(self):
+        self.project.update_node_wiki('home', 'First', self.consolidate_auth)
+        versions = _get_wiki_versions(self.project, 'home', anonymous=True)
+        assert_equal(versions[0]['user_fullname'], 'A user')
+
     def test_get_wiki_url_pointer_component(self):
         """Regression test for issues
         https://github.com/CenterForOpenScience/osf/issues/363 and
@@ -703,6 +747,152 @@ class TestWikiLinks(OsfTestCase):
         assert_equal(expected, wiki.html(node))
 
 
+class TestWikiRenderCache(OsfTestCase):
+
+    def setUp(self):
+        super(TestWikiRenderCache, self).setUp()
+        render_cache.clear()
+        self.project = ProjectFactory()
+
+    def test_rendered_text_is_stored_on_save(self):
+        wiki = NodeWikiFactory(content='# Title\n\n*emphasis*', node=self.project)
+        wiki.reload()
+        assert_equal(wiki.rendered_text.strip(), u'Title\nemphasis')
+
+    @mock.patch('website.addons.wiki.model.render_content')
+    def test_raw_text_uses_stored_text(self, mock_render):
+        wiki = NodeWikiPage(content='Some content', node=self.project, rendered_text='cached text')
+        assert_equal(wiki.raw_text(self.project), 'cached text')
+        assert_false(mock_render.called)
+
+    def test_html_is_rendered_once_per_version(self):
+        wiki = NodeWikiFactory(content='Some content', node=self.project)
+        with mock.patch('website.addons.wiki.model.render_content', wraps=render_content) as mock_render:
+            first = wiki.html(self.project)
+            second = wiki.html(self.project)
+        assert_equal(first, second)
+        assert_equal(mock_render.call_count, 0)  # rendered and cached when saved
+
+    def test_rendered_html_is_stored_on_save(self):
+        wiki = NodeWikiFactory(content='*emphasis*', node=self.project)
+        wiki.reload()
+        assert_in('<em>emphasis</em>', wiki.rendered_html)
+        assert_equal(wiki.rendered_html_key, wiki.render_key(self.project))
+
+    def test_stored_html_is_used_without_rendering(self):
+        wiki = NodeWikiFactory(content='*emphasis*', node=self.project)
+        render_cache.clear()
+        with mock.patch('website.addons.wiki.model.render_content') as mock_render:
+            html = wiki.html(self.project)
+        assert_false(mock_render.called)
+        assert_in('<em>emphasis</em>', html)
+
+    def test_stale_render_key_is_rerendered_and_backfilled(self):
+        wiki = NodeWikiFactory(content='*emphasis*', node=self.project)
+        self.db['nodewikipage'].update(
+            {'_id': wiki._id},
+            {'$set': {'rendered_html': 'stale', 'rendered_html_key': 'old'}},
+        )
+        render_cache.clear()
+        wiki.reload()
+        assert_in('<em>emphasis</em>', wiki.html(self.project))
+        wiki.reload()
+        assert_in('<em>emphasis</em>', wiki.rendered_html)
+
+    def test_rename_clears_rendered_html(self):
+        wiki = NodeWikiFactory(page_name='old', content='*emphasis*', node=self.project)
+        wiki.rename('new')
+        assert_is_none(wiki.rendered_html)
+        assert_in('<em>emphasis</em>', wiki.html(self.project))
+
+    def test_new_pages_are_rendered_from_their_own_content(self):
+        auth = Auth(user=self.project.creator)
+        self.project.update_node_wiki('first', '*first page*', auth)
+        self.project.update_node_wiki('second', '*second page*', auth)
+        for name in ['first', 'second']:
+            wiki = self.project.get_wiki_page(name)
+            assert_in('<em>{} page</em>'.format(name), wiki.html(self.project))
+            assert_equal(wiki.rendered_text.strip(), u'{} page'.format(name))
+            wiki.reload()
+            assert_in('<em>{} page</em>'.format(name), wiki.rendered_html)
+
+    def test_html_is_keyed_on_viewing_node(self):
+        wiki = NodeWikiFactory(content='[[other]]', node=self.project)
+        fork = ProjectFactory()
+        assert_in(self.project.web_url_for('project_wiki_view', wname='other'), wiki.html(self.project))
+        assert_in(fork.web_url_for('project_wiki_view', wname='other'), wiki.html(fork))
+
+
+class TestWikiContentDelta(unittest.TestCase):
+
+    def test_round_trip(self):
+        base = u'\n'.join(u'line {}'.format(i) for i in range(50))
+        content = base.replace(u'line 10', u'changed\nadded') + u'\nend'
+        delta = diff_content(base, content)
+        assert_equal(patch_content(base, delta), content)
+        assert_less(len(delta), len(content))
+
+    def test_empty_content(self):
+        assert_equal(patch_content(u'abc', diff_content(u'abc', u'')), u'')
+        assert_equal(patch_content(u'', diff_content(u'', u'abc')), u'abc')
+
+
+class TestWikiVersionCompaction(OsfTestCase):
+
+    def setUp(self):
+        super(TestWikiVersionCompaction, self).setUp()
+        self.project = ProjectFactory()
+        self.auth = Auth(user=self.project.creator)
+        self.base_content = u'\n'.join(u'line {}'.format(i) for i in range(100))
+
+    def update(self, n):
+        for i in range(n):
+            content = self.base_content.replace(u'line 50', u'edit {}'.format(i))
+            self.project.update_node_wiki('home', content, self.auth)
+
+    def stored(self, version):
+        return self.db['nodewikipage'].find_one({'_id': self.project.wiki_pages_versions['home'][version - 1]})
+
+    def test_previous_versions_are_compacted(self):
+        self.update(3)
+        assert_is_not_none(self.stored(1)['content'])  # snapshot
+        assert_is_none(self.stored(2)['content'])
+        assert_equal(self.stored(2)['content_base'], self.project.wiki_pages_versions['home'][0])
+        assert_is_not_none(self.stored(3)['content'])  # current
+
+    def test_compacted_versions_are_reconstructed(self):
+        self.update(3)
+        NodeWikiPage._clear_caches()
+        page = self.project.get_wiki_page('home', version=2)
+        assert_equal(page.content, self.base_content.replace(u'line 50', u'edit 1'))
+
+    @mock.patch('website.addons.wiki.model.WIKI_SNAPSHOT_INTERVAL', 2)
+    def test_snapshots_are_kept_in_full(self):
+        self.update(4)
+        assert_is_none(self.stored(2)['content'])
+        assert_is_not_none(self.stored(3)['content'])
+
+    @mock.patch('website.addons.wiki.model.WIKI_COMPACT_VERSIONS', False)
+    def test_compaction_disabled(self):
+        self.update(3)
+        assert_is_not_none(self.stored(2)['content'])
+
+    def test_versions_shared_with_fork_are_kept(self):
+        self.update(2)
+        fork = self.project.fork_node(self.auth)
+        self.update(1)
+        assert_is_not_none(self.stored(2)['content'])
+
+        fork.update_node_wiki('home', self.base_content, self.auth)
+        assert_is_not_none(self.stored(2)['content'])
+
+    def test_versions_made_after_fork_are_compacted(self):
+        self.update(1)
+        self.project.fork_node(self.auth)
+        self.update(2)
+        assert_is_none(self.stored(2)['content'])
+
+
 class TestWikiUuid(OsfTestCase):
 
     def setUp(self):
@@ -1027,6 +1217,9 @@ class TestWikiShareJSMongo(OsfTestCase):
         current_content = self.wiki_page.get_draft(self.project)
         assert_equals(current_content, new_content)
 
+    def test_share_db_reuses_client(self):
+        assert_is(share_db().connection, share_db().connection)
+
     def tearDown(self):
         super(TestWikiShareJSMongo, self).tearDown()
         self.db.drop_collection('docs')
@@ -1038,6 +1231,45 @@ class TestWikiShareJSMongo(OsfTestCase):
         settings.SHARE_DATABASE_NAME = cls._original_sharejs_db_name
 
 
+class TestSharejsBroadcaster(unittest.TestCase):
+
+    def setUp(self):
+        self.broadcaster = SharejsBroadcaster(maxsize=2)
+        self.session = mock.Mock()
+        self.url = 'http://localhost:7007/lock/abc/'
+
+    @mock.patch('website.addons.wiki.utils.time.sleep')
+    def test_send_retries_server_errors(self, mock_sleep):
+        self.session.post.side_effect = [
+            mock.Mock(status_code=503),
+            mock.Mock(status_code=200),
+        ]
+        assert_true(self.broadcaster.send(self.url, None, retries=2, session=self.session))
+        assert_equal(self.session.post.call_count, 2)
+
+    @mock.patch('website.addons.wiki.utils.time.sleep')
+    def test_send_gives_up(self, mock_sleep):
+        self.session.post.side_effect = requests.ConnectionError
+        assert_false(self.broadcaster.send(self.url, None, retries=2, session=self.session))
+        assert_equal(self.session.post.call_count, 3)
+
+    @mock.patch('website.addons.wiki.utils.requests.Session')
+    def test_put_sends_in_background(self, mock_session):
+        mock_session.return_value = self.session
+        self.session.post.return_value = mock.Mock(status_code=200)
+        assert_true(self.broadcaster.put(self.url, ['abc']))
+        self.broadcaster.join()
+        self.session.post.assert_called_once_with(
+            self.url, json=['abc'], timeout=settings.SHAREJS_BROADCAST_TIMEOUT
+        )
+
+    @mock.patch.object(SharejsBroadcaster, '_ensure_worker')
+    def test_put_drops_when_queue_full(self, mock_ensure_worker):
+        assert_true(self.broadcaster.put(self.url, None))
+        assert_true(self.broadcaster.put(self.url, None))
+        assert_false(self.broadcaster.put(self.url, None))
+
+
 class TestWikiUtils(OsfTestCase):
 
     def setUp(self):
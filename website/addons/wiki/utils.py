@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 import os
+import json
+import time
+import Queue
 import urllib
 import uuid
+import difflib
+import logging
+import threading
 
 from pymongo import MongoClient
 import requests
@@ -13,6 +19,13 @@ from website.addons.wiki import settings as wiki_settings
 from website.addons.wiki.exceptions import InvalidVersionError
 
 
+logger = logging.getLogger(__name__)
+
+# Long-lived ShareJS database client; `MongoClient` pools its connections
+_share_client = None
+_share_client_lock = threading.Lock()
+
+
 def generate_private_uuid(node, wname):
     """
     Generate private uuid for internal use in sharejs namespacing.
@@ -60,7 +73,8 @@ def migrate_uuid(node, wname):
     db = share_db()
     old_sharejs_uuid = get_sharejs_uuid(node, wname)
 
-    broadcast_to_sharejs('lock', old_sharejs_uuid)
+    # Lock editors out before moving the documents
+    broadcast_to_sharejs('lock', old_sharejs_uuid, wait=True)
 
     generate_private_uuid(node, wname)
     new_sharejs_uuid = get_sharejs_uuid(node, wname)
@@ -87,9 +101,13 @@ def migrate_uuid(node, wname):
 
 
 def share_db():
-    """Generate db client for sharejs db"""
-    client = MongoClient(settings.DB_HOST, settings.DB_PORT)
-    return client[wiki_settings.SHAREJS_DB_NAME]
+    """Return the sharejs db, using a client shared by the whole process."""
+    global _share_client
+    if _share_client is None:
+        with _share_client_lock:
+            if _share_client is None:
+                _share_client = MongoClient(settings.DB_HOST, settings.DB_PORT)
+    return _share_client[wiki_settings.SHAREJS_DB_NAME]
 
 
 def get_sharejs_content(node, wname):
@@ -100,12 +118,82 @@ def get_sharejs_content(node, wname):
     return doc_item['_data'] if doc_item else ''
 
 
-def broadcast_to_sharejs(action, sharejs_uuid, node=None, wiki_name='home', data=None):
+class SharejsBroadcaster(object):
+    """Sends broadcasts to ShareJS from a background thread, in the order they
+    were queued. Failed posts are retried with exponential backoff; broadcasts
+    are dropped if the queue is full or ShareJS stays unreachable.
+    """
+
+    def __init__(self, maxsize):
+        self.queue = Queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Also restarts the worker in processes forked after it was started
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='sharejs-broadcast')
+                    self._thread.daemon = True
+                    self._thread.start()
+
+    def _run(self):
+        # Sessions aren't thread safe, so the worker keeps its own
+        session = requests.Session()
+        while True:
+            url, data = self.queue.get()
+            try:
+                self.send(url, data, session=session)
+            except Exception:
+                logger.exception('Unexpected error broadcasting to sharejs')
+            finally:
+                self.queue.task_done()
+
+    def send(self, url, data, retries=None, session=requests):
+        """Post to ShareJS, retrying on connection errors and server errors.
+        Returns whether the broadcast was delivered.
+        """
+        if retries is None:
+            retries = wiki_settings.SHAREJS_BROADCAST_RETRIES
+        delay = wiki_settings.SHAREJS_BROADCAST_RETRY_DELAY
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(delay)
+                delay *= 2
+            try:
+                resp = session.post(url, json=data, timeout=wiki_settings.SHAREJS_BROADCAST_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout):
+                continue
+            if resp.status_code < 500:
+                return True
+        logger.warning('Could not broadcast to sharejs: {}'.format(url))
+        return False
+
+    def put(self, url, data):
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait((url, data))
+        except Queue.Full:
+            logger.warning('Sharejs broadcast queue is full; dropping {}'.format(url))
+            return False
+        return True
+
+    def join(self):
+        """Block until every queued broadcast has been handled."""
+        self.queue.join()
+
+
+broadcaster = SharejsBroadcaster(maxsize=wiki_settings.SHAREJS_BROADCAST_QUEUE_SIZE)
+
+
+def broadcast_to_sharejs(action, sharejs_uuid, node=None, wiki_name='home', data=None, wait=False):
     """
     Broadcast an action to all documents connected to a wiki.
     Actions include 'lock', 'unlock', 'redirect', and 'delete'
     'redirect' and 'delete' both require a node to be specified
     'unlock' requires data to be a list of contributors with write permission
+    Broadcasts are sent in the background unless `wait` is True.
     """
 
     url = 'http://{host}:{port}/{action}/{id}/'.format(
@@ -122,10 +210,11 @@ def broadcast_to_sharejs(action, sharejs_uuid, node=None, wiki_name='home', data
         )
         url = os.path.join(url, redirect_url)
 
-    try:
-        requests.post(url, json=data)
-    except requests.ConnectionError:
-        pass    # Assume sharejs is not online
+    if wait or not wiki_settings.SHAREJS_BROADCAST_ASYNC:
+        # Assume sharejs is not online if it cannot be reached
+        broadcaster.send(url, data, retries=0)
+    else:
+        broadcaster.put(url, data)
 
 
 def format_wiki_version(version, num_versions, allow_preview):
@@ -154,3 +243,30 @@ def format_wiki_version(version, num_versions, allow_preview):
         raise InvalidVersionError
 
     return version
+
+
+def diff_content(base, content):
+    """Encode `content` as a compact line-based delta against `base`.
+
+    The delta is a JSON list whose items are either ``[start, end]``, copying
+    lines ``start:end`` of `base`, or a string of inserted text.
+    """
+    base_lines = base.splitlines(True)
+    lines = content.splitlines(True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append(''.join(lines[j1:j2]))
+    return json.dumps(ops, separators=(',', ':'))
+
+
+def patch_content(base, delta):
+    """Rebuild content from `base` and a delta produced by `diff_content`."""
+    base_lines = base.splitlines(True)
+    return u''.join(
+        u''.join(base_lines[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in json.loads(delta)
+    )
@@ -32,7 +32,7 @@ from .exceptions import (
     PageNotFoundError,
     InvalidVersionError,
 )
-from .model import NodeWikiPage
+from .model import NodeWikiPage, get_version_summaries, get_page_names
 
 logger = logging.getLogger(__name__)
 
@@ -71,33 +71,36 @@ def _get_wiki_versions(node, name, anonymous=False):
     if key not in node.wiki_pages_versions:
         return []
 
-    versions = [
-        NodeWikiPage.load(version_wiki_id)
-        for version_wiki_id in node.wiki_pages_versions[key]
-    ]
+    versions = get_version_summaries(node.wiki_pages_versions[key])
 
     return [
         {
-            'version': version.version,
-            'user_fullname': privacy_info_handle(version.user.fullname, anonymous, name=True),
-            'date': version.date.replace(microsecond=0).isoformat(),
+            'version': version['version'],
+            'user_fullname': privacy_info_handle(version['user_fullname'], anonymous, name=True),
+            'date': version['date'].replace(microsecond=0).isoformat(),
         }
         for version in reversed(versions)
     ]
 
 
-def _get_wiki_pages_current(node):
+def _get_wiki_pages_current(node, page_names=None):
+    """Serialize the current pages of `node`. `page_names` maps page ids to
+    names; pass it to avoid a query when serializing many nodes.
+    """
+    if page_names is None:
+        page_names = get_page_names(node.wiki_pages_current.values())
+    sorted_names = [
+        page_names.get(node.wiki_pages_current[sorted_key])
+        for sorted_key in sorted(node.wiki_pages_current)
+    ]
     return [
         {
-            'name': sorted_page.page_name,
-            'url': node.web_url_for('project_wiki_view', wname=sorted_page.page_name, _guid=True)
+            'name': page_name,
+            'url': node.web_url_for('project_wiki_view', wname=page_name, _guid=True)
         }
-        for sorted_page in [
-            node.get_wiki_page(sorted_key)
-            for sorted_key in sorted(node.wiki_pages_current)
-        ]
+        for page_name in sorted_names
         # TODO: remove after forward slash migration
-        if sorted_page is not None
+        if page_name is not None
     ]
 
 
@@ -126,20 +129,30 @@ def _get_wiki_web_urls(node, key, version=1, additional_urls=None):
 
 
 def _serialize_wiki_toc(project, auth):
+    children = [
+        child
+        for child in project.nodes
+        if not child.is_deleted
+        and child.can_view(auth)
+        if child.has_addon('wiki')
+    ]
+    # Look up the names of every child's current pages at once
+    page_names = get_page_names([
+        page_id
+        for child in children
+        for page_id in child.wiki_pages_current.values()
+    ])
     toc = [
         {
             'id': child._primary_key,
             'title': child.title,
             'category': child.category,
-            'pages_current': _get_wiki_pages_current(child),
+            'pages_current': _get_wiki_pages_current(child, page_names=page_names),
             'url': child.web_url_for('project_wiki_view', wname='home', _guid=True),
             'is_pointer': not child.primary,
             'link': auth.private_key
         }
-        for child in project.nodes
-        if not child.is_deleted
-        and child.can_view(auth)
-        if child.has_addon('wiki')
+        for child in children
     ]
     return toc
 
@@ -153,8 +166,8 @@ def wiki_widget(**kwargs):
 
     more = False
     use_python_render = False
-    if wiki_page and wiki_page.html(node):
-        wiki_html = wiki_page.html(node)
+    wiki_html = wiki_page.html(node) if wiki_page else None
+    if wiki_html:
         if len(wiki_html) > 500:
             wiki_html = BeautifulSoup(wiki_html[:500] + '...', 'html.parser')
             more = True
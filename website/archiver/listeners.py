@@ -3,9 +3,11 @@ import itertools
 
 from framework.tasks import handlers
 
+from website import settings
 from website.archiver.tasks import archive
 from website.archiver import utils as archiver_utils
 from website.archiver import (
+    ARCHIVER_FAILURE,
     ARCHIVER_UNCAUGHT_ERROR,
 )
 from website.archiver.decorators import fail_archive_on_error
@@ -38,6 +40,27 @@ def after_register(src, dst, user):
         celery.chain(*archive_tasks)
     )
 
+def retry_archive(root):
+    """Archive the failed jobs in the registration tree under `root` again, if
+    the tree has retries left. Targets that were archived are not copied again.
+
+    :param root: top-level registration Node
+    :return: whether the archive was retried
+    """
+    jobs = [node.archive_job for node in node_and_primary_descendants(root)]
+    root_job = jobs[0]
+    failed = [job for job in jobs if job.status == ARCHIVER_FAILURE]
+    if not failed or root_job.retries >= settings.ARCHIVE_JOB_MAX_RETRIES:
+        return False
+    for job in failed:
+        job.reset_failed_targets()
+    root_job.retries += 1
+    root_job.save()
+    handlers.enqueue_task(
+        celery.chain(*[archive.si(job_pk=job._id) for job in failed])
+    )
+    return True
+
 @project_signals.archive_callback.connect
 @fail_archive_on_error
 def archive_callback(dst):
@@ -52,6 +75,8 @@ def archive_callback(dst):
         return
     if root_job.sent:
         return
+    if not root_job.success and retry_archive(root):
+        return
     root_job.sent = True
     root_job.save()
     if root_job.success:
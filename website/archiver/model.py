@@ -39,6 +39,17 @@ class ArchiveTarget(StoredObject):
     stat_result = fields.DictionaryField()
     errors = fields.StringField(list=True)
 
+    # Files found in the stat phase, used to verify the copy. Left empty for
+    # addons with more than ARCHIVE_MANIFEST_MAX_FILES files
+    # Format: [{
+    #     'path': <str> path relative to the addon root, e.g. 'folder/file.txt',
+    #     'size': <int> | None,
+    #     'hashes': <dict> hashes reported by the provider, if any,
+    # }]
+    manifest = fields.DictionaryField(list=True)
+    num_files = fields.IntegerField(default=0)
+    disk_usage = fields.FloatField(default=0)
+
     def __repr__(self):
         return '<{0}(_id={1}, name={2}, status={3})>'.format(
             self.__class__.__name__,
@@ -47,6 +58,17 @@ class ArchiveTarget(StoredObject):
             self.status
         )
 
+    @property
+    def archived(self):
+        return self.status == ARCHIVER_SUCCESS
+
+    def set_manifest(self, manifest, save=True):
+        self.manifest = manifest if len(manifest) <= settings.ARCHIVE_MANIFEST_MAX_FILES else []
+        self.num_files = len(manifest)
+        self.disk_usage = float(sum(entry['size'] or 0 for entry in manifest))
+        if save:
+            self.save()
+
 class ArchiveJob(StoredObject):
 
     _id = fields.StringField(
@@ -60,6 +82,9 @@ class ArchiveJob(StoredObject):
     sent = fields.BooleanField(default=False)
     status = fields.StringField(default=ARCHIVER_INITIATED)
     datetime_initiated = fields.DateTimeField(default=datetime.datetime.utcnow)
+    # number of times failed targets were archived again; see
+    # website.archiver.listeners#retry_archive
+    retries = fields.IntegerField(default=0)
 
     dst_node = fields.ForeignField('node', backref='active')
     src_node = fields.ForeignField('node')
@@ -101,6 +126,37 @@ class ArchiveJob(StoredObject):
             if target.status not in (ARCHIVER_SUCCESS, ARCHIVER_FAILURE)
         ])
 
+    @property
+    def files_total(self):
+        return sum(target.num_files for target in self.target_addons)
+
+    @property
+    def files_completed(self):
+        return sum(target.num_files for target in self.target_addons if target.archived)
+
+    @property
+    def bytes_total(self):
+        return sum(target.disk_usage for target in self.target_addons)
+
+    @property
+    def bytes_completed(self):
+        return sum(target.disk_usage for target in self.target_addons if target.archived)
+
+    @property
+    def pending_targets(self):
+        """Targets that still need to be archived. Targets that were archived
+        successfully are skipped when a job is retried.
+        """
+        return [target for target in self.target_addons if not target.archived]
+
+    def progress(self):
+        return {
+            'files_completed': self.files_completed,
+            'files_total': self.files_total,
+            'bytes_completed': self.bytes_completed,
+            'bytes_total': self.bytes_total,
+        }
+
     def info(self):
         return self.src_node, self.dst_node, self.initiator
 
@@ -110,7 +166,9 @@ class ArchiveJob(StoredObject):
                 'name': target.name,
                 'status': target.status,
                 'stat_result': target.stat_result,
-                'errors': target.errors
+                'errors': target.errors,
+                'num_files': target.num_files,
+                'disk_usage': target.disk_usage,
             }
             for target in self.target_addons
         ]
@@ -180,13 +238,27 @@ class ArchiveJob(StoredObject):
             self._set_target(addon)
         self.save()
 
+    def reset_failed_targets(self):
+        """Prepare a partially failed job to be run again. Targets that were
+        archived successfully keep their status, so only the rest are copied.
+        """
+        for target in self.pending_targets:
+            target.status = ARCHIVER_INITIATED
+            target.errors = []
+            target.save()
+        self.done = False
+        self.sent = False
+        self.status = ARCHIVER_INITIATED
+        self.save()
+
     def update_target(self, addon_short_name, status, stat_result=None, errors=None):
-        stat_result = stat_result or {}
         errors = errors or []
 
         target = self.get_target(addon_short_name)
         target.status = status
         target.errors = errors
-        target.stat_result = stat_result
+        # Keep the result of the stat phase unless a new one is given
+        if stat_result is not None:
+            target.stat_result = stat_result
         target.save()
         self._post_update_target()
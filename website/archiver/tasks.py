@@ -107,6 +107,8 @@ def stat_addon(addon_short_name, job_pk):
             errors=[e.data['error']],
         )
         raise
+    # Keep the manifest so the copy can be verified once it completes
+    job.get_target(addon_short_name).set_manifest(utils.build_file_manifest(file_tree))
     result = AggregateStatResult(
         src_addon._id,
         addon_short_name,
@@ -218,6 +220,8 @@ def archive_node(results, job_pk):
             job.status = ARCHIVER_SUCCESS
             job.save()
         for result in stat_result.targets:
+            if job.get_target(result.target_name).archived:
+                continue
             if not result.num_files:
                 job.update_target(result.target_name, ARCHIVER_SUCCESS)
             else:
@@ -233,7 +237,8 @@ def archive_node(results, job_pk):
 def archive(self, job_pk):
     """Starts a celery.chord that runs stat_addon for each
     complete addon attached to the Node, then runs
-    #archive_node with the result
+    #archive_node with the result. Addons that were already
+    archived (e.g. when retrying a partially failed job) are skipped.
 
     :param job_pk: primary key of ArchiveJob
     :return: None
@@ -243,12 +248,16 @@ def archive(self, job_pk):
     src, dst, user = job.info()
     logger = get_task_logger(__name__)
     logger.info("Received archive task for Node: {0} into Node: {1}".format(src._id, dst._id))
+    targets = job.pending_targets
+    if not targets:
+        archive_node.delay([], job_pk=job_pk)
+        return
     celery.chord(
         celery.group(
             stat_addon.si(
                 addon_short_name=target.name,
                 job_pk=job_pk,
             )
-            for target in job.target_addons
+            for target in targets
         )
     )(archive_node.s(job_pk=job_pk))
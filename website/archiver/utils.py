@@ -1,4 +1,5 @@
 from framework.auth import Auth
+from framework.mongo import database
 
 from website.archiver import (
     StatResult, AggregateStatResult,
@@ -144,6 +145,96 @@ def aggregate_file_tree_metadata(addon_short_name, fileobj_metadata, user):
             targets=[aggregate_file_tree_metadata(addon_short_name, child, user) for child in fileobj_metadata.get('children', [])],
         )
 
+def build_file_manifest(fileobj_metadata, prefix=''):
+    """Flatten an addon's file tree into a list of manifest entries, one per
+    file, with paths relative to the root of the tree
+
+    :param fileobj_metadata: root folder of the file tree, as returned by
+    StorageAddonBase#_get_file_tree
+    :return: <list> of {'path': <str>, 'size': <int> | None, 'hashes': <dict>}
+    """
+    manifest = []
+    for child in fileobj_metadata.get('children', []):
+        path = prefix + child['name']
+        if child['kind'] == 'file':
+            size = child.get('size')
+            manifest.append({
+                'path': path,
+                'size': int(size) if size is not None else None,
+                'hashes': (child.get('extra') or {}).get('hashes') or {},
+            })
+        else:
+            manifest.extend(build_file_manifest(child, prefix=path + '/'))
+    return manifest
+
+def get_archived_files(dst, folder_name):
+    """Get the size and hashes of each file copied into `folder_name` on the
+    registration's OSF Storage, keyed by path relative to that folder. Two
+    queries, regardless of the number of files.
+    """
+    node_settings = dst.get_addon('osfstorage')
+    root_path = u'/{}/'.format(folder_name)
+    folder = database['osfstoragefilenode'].find_one({
+        'node_settings': node_settings._id,
+        '_materialized_path': root_path,
+        'kind': 'folder',
+        'is_deleted': False,
+    })
+    if folder is None:
+        return None
+    files = list(database['osfstoragefilenode'].find(
+        {'ancestor_ids': folder['_id'], 'kind': 'file', 'is_deleted': False},
+        {'_materialized_path': True, 'versions': True},
+    ))
+    versions = {
+        version['_id']: version
+        for version in database['osfstoragefileversion'].find(
+            {'_id': {'$in': [each['versions'][-1] for each in files if each['versions']]}},
+            {'size': True, 'metadata': True},
+        )
+    }
+    archived = {}
+    for each in files:
+        version = versions.get(each['versions'][-1]) if each['versions'] else None
+        version = version or {}
+        archived[each['_materialized_path'][len(root_path):]] = {
+            'size': version.get('size'),
+            'metadata': version.get('metadata') or {},
+        }
+    return archived
+
+def verify_archive(dst, target, folder_name):
+    """Check the files copied into `folder_name` against the manifest
+    recorded for `target` in the stat phase
+
+    :param dst: registration Node
+    :param target: ArchiveTarget
+    :param folder_name: name of the folder the addon was copied to
+    :return: <list> of errors; empty if every file in the manifest was copied
+    with the expected size and hashes
+    """
+    if settings.ARCHIVE_PROVIDER != 'osfstorage' or not target.manifest:
+        return []
+    archived = get_archived_files(dst, folder_name)
+    if archived is None:
+        return [u'Archive folder {} was not found'.format(folder_name)]
+    errors = []
+    for entry in target.manifest:
+        copied = archived.get(entry['path'])
+        if copied is None:
+            errors.append(u'{} was not archived'.format(entry['path']))
+            continue
+        if entry['size'] is not None and copied['size'] is not None and entry['size'] != copied['size']:
+            errors.append(u'{} was archived with size {}, expected {}'.format(
+                entry['path'], copied['size'], entry['size']
+            ))
+            continue
+        for algorithm, value in entry['hashes'].items():
+            if copied['metadata'].get(algorithm) not in (None, value):
+                errors.append(u'{} failed {} verification'.format(entry['path'], algorithm))
+                break
+    return errors
+
 def before_archive(node, user):
     link_archive_provider(node, user)
     job = ArchiveJob(
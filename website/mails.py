@@ -68,6 +68,17 @@ def render_message(tpl_name, **context):
     return tpl.render(**context)
 
 
+def render_mail(mail, mimetype='plain', **context):
+    """Render the subject and message of an email, e.g. to send the same
+    message to several recipients with `send_rendered_mail`.
+
+    :return: Tuple of (subject, message)
+    """
+    subject = mail.subject(**context)
+    message = mail.text(**context) if mimetype in ('plain', 'txt') else mail.html(**context)
+    return subject, message
+
+
 def send_mail(to_addr, mail, mimetype='plain', from_addr=None, mailer=None,
             username=None, password=None, mail_server=None, callback=None, **context):
     """Send an email from the OSF.
@@ -86,10 +97,22 @@ def send_mail(to_addr, mail, mimetype='plain', from_addr=None, mailer=None,
     .. note:
          Uses celery if available
     """
+    subject, message = render_mail(mail, mimetype=mimetype, **context)
+    return send_rendered_mail(
+        to_addr, subject, message, mimetype=mimetype, from_addr=from_addr,
+        mailer=mailer, username=username, password=password,
+        mail_server=mail_server, callback=callback,
+    )
+
+
+def send_rendered_mail(to_addr, subject, message, mimetype='plain', from_addr=None,
+                       mailer=None, username=None, password=None, mail_server=None,
+                       callback=None):
+    """Send an email whose subject and message have already been rendered.
+    See `send_mail`.
+    """
     from_addr = from_addr or settings.FROM_EMAIL
     mailer = mailer or tasks.send_email
-    subject = mail.subject(**context)
-    message = mail.text(**context) if mimetype in ('plain', 'txt') else mail.html(**context)
     # Don't use ttls and login in DEBUG_MODE
     ttls = login = not settings.DEBUG_MODE
     logger.debug('Sending email...')
@@ -116,6 +139,36 @@ def send_mail(to_addr, mail, mimetype='plain', from_addr=None, mailer=None,
 
         return ret
 
+def send_rendered_mails(messages, from_addr=None, mailer=None, username=None,
+                        password=None, mail_server=None):
+    """Send many already rendered emails in batches of `MAIL_BATCH_SIZE`, each
+    batch delivered over pooled SMTP connections by one task.
+
+    :param list messages: dicts with keys to_addr, subject, message, mimetype
+        and optionally callback, a celery signature to run once that message
+        has been sent
+    """
+    from_addr = from_addr or settings.FROM_EMAIL
+    mailer = mailer or tasks.send_emails
+    ttls = login = not settings.DEBUG_MODE
+    messages = [dict(each, from_addr=each.get('from_addr') or from_addr) for each in messages]
+    kwargs = dict(
+        ttls=ttls,
+        login=login,
+        username=username,
+        password=password,
+        mail_server=mail_server,
+    )
+    results = []
+    for start in range(0, len(messages), settings.MAIL_BATCH_SIZE):
+        batch = messages[start:start + settings.MAIL_BATCH_SIZE]
+        logger.debug('Sending batch of {0} emails...'.format(len(batch)))
+        if settings.USE_CELERY:
+            results.append(mailer.apply_async(args=(batch, ), kwargs=kwargs))
+        else:
+            results.extend(mailer(batch, **kwargs) or [])
+    return results
+
 # Predefined Emails
 
 TEST = Mail('test', subject='A test email to ${name}')
@@ -1,5 +1,8 @@
+import collections
+
 from babel import dates, core, Locale
 from mako.lookup import Template
+from modularodm import Q
 
 from website import mails
 from website import models as website_models
@@ -29,24 +32,30 @@ def email_transactional(recipient_ids, uid, event, user, node, timestamp, **cont
     context['title'] = node.title
     context['user'] = user
     subject = Template(EMAIL_SUBJECT_MAP[event]).render(**context)
-
-    for user_id in recipient_ids:
-        recipient = website_models.User.load(user_id)
-        email = recipient.username
-        context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
+    settings_urls = {}
+
+    # Only the timestamp and settings URL vary between recipients, so the
+    # email is rendered once per group of recipients that share them
+    for (_, own_settings), recipients in group_recipients(recipient_ids, user, uid).items():
+        context['localized_timestamp'] = localize_timestamp(timestamp, recipients[0])
+        if own_settings not in settings_urls:
+            settings_urls[own_settings] = get_settings_url(uid, recipients[0])
         message = mails.render_message(template, **context)
-
-        if user._id != recipient._id:
-            mails.send_mail(
-                to_addr=email,
-                mail=mails.TRANSACTIONAL,
+        rendered_subject, rendered_message = mails.render_mail(
+            mails.TRANSACTIONAL,
+            mimetype='html',
+            node_id=node._id,
+            node_title=node.title,
+            subject=subject,
+            message=message,
+            url=settings_urls[own_settings],
+        )
+        for recipient in recipients:
+            mails.send_rendered_mail(
+                to_addr=recipient.username,
+                subject=rendered_subject,
+                message=rendered_message,
                 mimetype='html',
-                name=recipient.fullname,
-                node_id=node._id,
-                node_title=node.title,
-                subject=subject,
-                message=message,
-                url=get_settings_url(uid, recipient)
             )
 
 
@@ -58,12 +67,11 @@ def email_digest(recipient_ids, uid, event, user, node, timestamp, **context):
     context['user'] = user
     node_lineage_ids = get_node_lineage(node) if node else []
 
-    for user_id in recipient_ids:
-        recipient = website_models.User.load(user_id)
-        context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
+    for _, recipients in group_recipients(recipient_ids, user, uid).items():
+        context['localized_timestamp'] = localize_timestamp(timestamp, recipients[0])
         message = mails.render_message(template, **context)
 
-        if user._id != recipient._id:
+        for recipient in recipients:
             digest = NotificationDigest(
                 timestamp=timestamp,
                 event=event,
@@ -74,6 +82,29 @@ def email_digest(recipient_ids, uid, event, user, node, timestamp, **context):
             digest.save()
 
 
+def group_recipients(recipient_ids, user, uid):
+    """Load recipients in one query and group them by what their emails
+    differ in: the localized timestamp (timezone and locale) and whether the
+    settings link points at their own notification settings. The user who
+    caused the event is left out.
+
+    :return: OrderedDict of (timezone, locale), own settings -> list of users
+    """
+    recipient_ids = [each for each in recipient_ids if each != user._id]
+    if not recipient_ids:
+        return collections.OrderedDict()
+    position = {user_id: index for index, user_id in enumerate(recipient_ids)}
+    recipients = sorted(
+        website_models.User.find(Q('_id', 'in', recipient_ids)),
+        key=lambda recipient: position[recipient._id]
+    )
+    groups = collections.OrderedDict()
+    for recipient in recipients:
+        key = ((recipient.timezone, recipient.locale), recipient._id == uid)
+        groups.setdefault(key, []).append(recipient)
+    return groups
+
+
 EMAIL_FUNCTION_MAP = {
     'email_transactional': email_transactional,
     'email_digest': email_digest,
@@ -89,52 +120,108 @@ def notify(uid, event, user, node, timestamp, **context):
     :param timestamp: time
     :param context: optional variables specific to templates
         target_user: used with comment_replies
-    :return:
+    :return: ids of all users subscribed to the event on the node or its
+        parents, including those subscribed to 'none'
     """
-    node_subscribers = []
-    subscription = NotificationSubscription.load(utils.to_subscription_key(uid, event))
-
-    if subscription:
-        for notification_type in constants.NOTIFICATION_TYPES:
-            subscribed_users = getattr(subscription, notification_type, [])
-
-            node_subscribers.extend(subscribed_users)
-
-            if subscribed_users and notification_type != 'none':
-                for recipient in subscribed_users:
-                    event = 'comment_replies' if context.get('target_user') == recipient else event
-                    send([recipient._id], notification_type, uid, event, user, node, timestamp, **context)
-
-    return check_parent(uid, event, node_subscribers, user, node, timestamp, **context)
+    lineage = get_lineage(uid)
+    owner_ids = [each._id for each in lineage] if lineage else [uid]
+    subscribers = resolve_subscriptions(owner_ids, event, lineage)
+    send_to_subscribers(subscribers, uid, event, user, node, timestamp, **context)
+    return subscribers.keys()
 
 
 def check_parent(uid, event, node_subscribers, user, orig_node, timestamp, **context):
     """ Check subscription object for the event on the parent project
         and send transactional email to indirect subscribers.
     """
+    lineage = get_lineage(uid)
+    # Accept users or user ids
+    node_subscribers = [getattr(each, '_id', each) for each in node_subscribers]
+    subscribers = resolve_subscriptions(
+        [each._id for each in lineage[1:]],
+        event,
+        lineage,
+        exclude=set(node_subscribers),
+    )
+    send_to_subscribers(subscribers, uid, event, user, orig_node, timestamp, **context)
+    return node_subscribers + subscribers.keys()
+
+
+def get_lineage(uid):
+    """The node with id `uid` followed by its parents, ending with the
+    top-level project. Empty if `uid` is not a node (e.g. for a user's own
+    subscriptions).
+    """
+    lineage = []
     node = website_models.Node.load(uid)
-    target_user = context.get('target_user', None)
+    while node:
+        lineage.append(node)
+        node = node.node__parent[0] if node.node__parent else None
+    return lineage
 
-    if node and node.parent_id:
-        key = utils.to_subscription_key(node.parent_id, event)
-        subscription = NotificationSubscription.load(key)
 
+def can_read(user_id, lineage):
+    """Equivalent to `lineage[0].has_permission(user, 'read')`, checked
+    against the already loaded lineage
+    """
+    if 'read' in lineage[0].permissions.get(user_id, []):
+        return True
+    return any('admin' in each.permissions.get(user_id, []) for each in lineage)
+
+
+def resolve_subscriptions(owner_ids, event, lineage, exclude=None):
+    """Find the effective notification type of every user subscribed to
+    `event` on any of `owner_ids`, ordered from the node the event happened
+    on to its top-level project. All subscriptions are loaded in one query;
+    the nearest subscription wins, and subscribers of a parent only count if
+    they can read the node itself.
+
+    :param owner_ids: ids of the subscription owners, nearest first
+    :param lineage: nodes of the event's node and its parents, or empty
+    :param exclude: ids of users that have already been resolved
+    :return: OrderedDict of user id -> notification type
+    """
+    exclude = exclude or set()
+    resolved = collections.OrderedDict()
+    if not owner_ids:
+        return resolved
+    keys = [utils.to_subscription_key(each, event) for each in owner_ids]
+    own_key = utils.to_subscription_key(lineage[0]._id, event) if lineage else None
+    subscriptions = {
+        subscription._id: subscription
+        for subscription in NotificationSubscription.find(Q('_id', 'in', keys))
+    }
+    for key in keys:
+        subscription = subscriptions.get(key)
         if not subscription:
-            return check_parent(node.parent_id, event, node_subscribers, user, orig_node, timestamp, **context)
-
+            continue
+        inherited = bool(lineage) and key != own_key
+        # Read raw ids so subscribed users are not loaded one at a time
+        stored = subscription.to_storage()
         for notification_type in constants.NOTIFICATION_TYPES:
-            subscribed_users = getattr(subscription, notification_type, [])
-
-            for u in subscribed_users:
-                if u not in node_subscribers and node.has_permission(u, 'read'):
-                    if notification_type != 'none':
-                        event = 'comment_replies' if target_user == u else event
-                        send([u._id], notification_type, uid, event, user, orig_node, timestamp, **context)
-                    node_subscribers.append(u)
-
-        return check_parent(node.parent_id, event, node_subscribers, user, orig_node, timestamp, **context)
-
-    return node_subscribers
+            for user_id in stored.get(notification_type) or []:
+                if user_id in resolved or user_id in exclude:
+                    continue
+                if inherited and not can_read(user_id, lineage):
+                    continue
+                resolved[user_id] = notification_type
+    return resolved
+
+
+def send_to_subscribers(subscribers, uid, event, user, node, timestamp, **context):
+    """Group resolved subscribers by notification type and event, then send
+    once per group
+    """
+    target_user = context.get('target_user')
+    batches = collections.OrderedDict()
+    for user_id, notification_type in subscribers.items():
+        if notification_type == 'none':
+            continue
+        # Direct replies use the comment_replies template
+        recipient_event = 'comment_replies' if target_user and target_user._id == user_id else event
+        batches.setdefault((notification_type, recipient_event), []).append(user_id)
+    for (notification_type, recipient_event), recipient_ids in batches.items():
+        send(recipient_ids, notification_type, uid, recipient_event, user, node, timestamp, **context)
 
 
 def send(recipient_ids, notification_type, uid, event, user, node, timestamp, **context):
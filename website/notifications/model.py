@@ -55,8 +55,10 @@ class NotificationSubscription(StoredObject):
 
 class NotificationDigest(StoredObject):
     _id = fields.StringField(primary=True, default=lambda: str(ObjectId()))
-    user_id = fields.StringField()
+    user_id = fields.StringField(index=True)
     timestamp = fields.DateTimeField()
     event = fields.StringField()
     message = fields.StringField()
     node_lineage = fields.StringField(list=True)
+    # Set by scripts/send_digest.py while the digest email is being sent
+    sending = fields.BooleanField(default=False)
@@ -4,6 +4,7 @@ from modularodm import Q
 from modularodm.exceptions import NoResultsFound
 
 from framework.auth import signals
+from framework.mongo import database
 from website.models import Node
 from website.notifications import constants
 from website.notifications import model
@@ -74,23 +75,52 @@ def get_configured_projects(user):
     """
     configured_project_ids = set()
     user_subscriptions = get_all_user_subscriptions(user)
+    owner_ids = set(get_owner_id(subscription) for subscription in user_subscriptions)
+    ancestry = get_ancestry(owner_ids - {user._id})
 
     for subscription in user_subscriptions:
+        node_id = get_owner_id(subscription)
+        if node_id not in ancestry:
+            continue
         # If the user has opted out of emails skip
-        node = subscription.owner
-
-        if not isinstance(node, Node) or (user in subscription.none and not node.parent_id):
+        if ancestry[node_id]['parent'] is None and user._id in get_subscribed_ids(subscription, 'none'):
             continue
 
-        while node.parent_id and not node.is_deleted:
-            node = Node.load(node.parent_id)
+        while ancestry[node_id]['parent'] and not ancestry[node_id]['is_deleted']:
+            node_id = ancestry[node_id]['parent']
 
-        if not node.is_deleted:
-            configured_project_ids.add(node._id)
+        if not ancestry[node_id]['is_deleted']:
+            configured_project_ids.add(node_id)
 
     return list(configured_project_ids)
 
 
+def get_ancestry(node_ids):
+    """Look up the parent and deletion status of each node in `node_ids` and
+    all of its ancestors, with one query per level of the tree.
+
+    :return: dict of node id -> {'parent': <str> | None, 'is_deleted': <bool>}
+    """
+    ancestry = {}
+    level = set(node_ids)
+    while level:
+        records = database['node'].find(
+            {'_id': {'$in': list(level)}},
+            {'is_deleted': True, '__backrefs.parent.node.nodes': True},
+        )
+        level = set()
+        for record in records:
+            parent_ids = record.get('__backrefs', {}).get('parent', {}).get('node', {}).get('nodes') or []
+            parent_id = parent_ids[0] if parent_ids else None
+            ancestry[record['_id']] = {
+                'parent': parent_id,
+                'is_deleted': bool(record.get('is_deleted')),
+            }
+            if parent_id and parent_id not in ancestry:
+                level.add(parent_id)
+    return ancestry
+
+
 def check_project_subscriptions_are_all_none(user, node):
     node_subscriptions = get_all_node_subscriptions(user, node)
     for s in node_subscriptions:
@@ -101,32 +131,74 @@ def check_project_subscriptions_are_all_none(user, node):
 
 def get_all_user_subscriptions(user):
     """ Get all Subscription objects that the user is subscribed to"""
-    user_subscriptions = []
+    query = None
     for notification_type in constants.NOTIFICATION_TYPES:
-        if getattr(user, notification_type, []):
-            for subscription in getattr(user, notification_type, []):
-                if subscription:
-                    user_subscriptions.append(subscription)
+        clause = Q(notification_type, 'eq', user._id)
+        query = clause if query is None else query | clause
+    return list(model.NotificationSubscription.find(query))
 
-    return user_subscriptions
 
+def get_owner_id(subscription):
+    """Id of the node or user that owns `subscription`, read from its key"""
+    return from_subscription_key(subscription._id)['uid']
 
-def get_all_node_subscriptions(user, node, user_subscriptions=None):
+
+def get_subscribed_ids(subscription, notification_type):
+    """Ids of the users subscribed with `notification_type`, without loading
+    the users
+    """
+    return subscription.to_storage().get(notification_type) or []
+
+
+def index_subscriptions_by_owner(user_subscriptions):
+    index = collections.defaultdict(list)
+    for subscription in user_subscriptions:
+        index[get_owner_id(subscription)].append(subscription)
+    return index
+
+
+def get_all_node_subscriptions(user, node, user_subscriptions=None, subscriptions_by_owner=None):
     """ Get all Subscription objects for a node that the user is subscribed to
 
     :param user: modular odm User object
     :param node: modular odm Node object
     :param user_subscriptions: all Subscription objects that the user is subscribed to
+    :param subscriptions_by_owner: the same, indexed by `index_subscriptions_by_owner`
     :return: list of Subscription objects for a node that the user is subscribed to
     """
-    if not user_subscriptions:
-        user_subscriptions = get_all_user_subscriptions(user)
-    node_subscriptions = []
-    for s in user_subscriptions:
-        if s.owner == node:
-            node_subscriptions.append(s)
+    if subscriptions_by_owner is None:
+        if not user_subscriptions:
+            user_subscriptions = get_all_user_subscriptions(user)
+        subscriptions_by_owner = index_subscriptions_by_owner(user_subscriptions)
+    return list(subscriptions_by_owner.get(node._id, []))
+
+
+def load_node_trees(node_ids):
+    """Load the nodes in `node_ids` and all of their primary, non-deleted
+    descendants. The tree structure is read with one query per level, and
+    the nodes themselves with one query.
 
-    return node_subscriptions
+    :return: tuple of (dict of node id -> Node, dict of node id -> child ids)
+    """
+    children = {}
+    level = list(node_ids)
+    while level:
+        records = database['node'].find({'_id': {'$in': level}}, {'nodes': True})
+        level = []
+        for record in records:
+            child_ids = [each[0] for each in record.get('nodes') or [] if each[1] == 'node']
+            children[record['_id']] = child_ids
+            level.extend(each for each in child_ids if each not in children)
+    nodes = {
+        node._id: node
+        for node in Node.find(Q('_id', 'in', list(children.keys())))
+    }
+    for node_id, child_ids in children.items():
+        children[node_id] = [
+            each for each in child_ids
+            if each in nodes and not nodes[each].is_deleted
+        ]
+    return nodes, children
 
 
 def format_data(user, node_ids):
@@ -136,56 +208,107 @@ def format_data(user, node_ids):
     :param data: the formatted data
     :return: treebeard-formatted data
     """
+    nodes, children = load_node_trees(node_ids)
+    subscriptions_by_owner = index_subscriptions_by_owner(get_all_user_subscriptions(user))
     items = []
-    user_subscriptions = get_all_user_subscriptions(user)
 
     for node_id in node_ids:
-        node = Node.load(node_id)
+        node = nodes.get(node_id)
         assert node, '{} is not a valid Node.'.format(node_id)
+        parent = node.parent_node
+        items.extend(_format_tree(
+            user,
+            node,
+            nodes,
+            children,
+            subscriptions_by_owner,
+            has_parent=bool(node.node__parent),
+            parent_readable=bool(parent and parent.has_permission(user, 'read')),
+            admin_above=bool(parent and parent.is_admin_parent(user)),
+            # Ids of the parents of `node`, nearest first
+            ancestor_ids=[each._id for each in _walk_parents(parent)],
+        ))
 
-        can_read = node.has_permission(user, 'read')
-        can_read_children = node.can_read_children(user)
+    return items
 
-        if not can_read and not can_read_children:
-            continue
 
-        children = []
-        # List project/node if user has at least 'read' permissions (contributor or admin viewer) or if
-        # user is contributor on a component of the project/node
+def _walk_parents(node):
+    while node:
+        yield node
+        node = node.parent_node
 
-        if can_read:
-            node_subscriptions = get_all_node_subscriptions(user, node, user_subscriptions=user_subscriptions)
-            for subscription in constants.NODE_SUBSCRIPTIONS_AVAILABLE:
-                children.append(serialize_event(user, subscription, constants.NODE_SUBSCRIPTIONS_AVAILABLE, node_subscriptions, node))
 
-        children.extend(format_data(
+def _format_tree(user, node, nodes, children, subscriptions_by_owner,
+                 has_parent, parent_readable, admin_above, ancestor_ids):
+    """Format `node` and its descendants from already loaded data. Returns a
+    list with the item for `node`, or nothing if the user can read neither
+    the node nor any of its descendants.
+    """
+    permissions = node.permissions.get(user._id, [])
+    is_admin = admin_above or 'admin' in permissions
+    can_read = 'read' in permissions or is_admin
+
+    # List project/node if user has at least 'read' permissions (contributor or admin viewer) or if
+    # user is contributor on a component of the project/node
+    formatted_children = []
+    for child_id in children.get(node._id, []):
+        formatted_children.extend(_format_tree(
             user,
-            [
-                n._id
-                for n in node.nodes
-                if n.primary and
-                not n.is_deleted
-            ]
+            nodes[child_id],
+            nodes,
+            children,
+            subscriptions_by_owner,
+            has_parent=True,
+            parent_readable=can_read,
+            admin_above=is_admin,
+            ancestor_ids=[node._id] + ancestor_ids,
         ))
 
-        item = {
-            'node': {
-                'id': node_id,
-                'url': node.url if can_read else '',
-                'title': node.title if can_read else 'Private Project',
-            },
-            'children': children,
-            'kind': 'folder' if not node.node__parent or not node.parent_node.has_permission(user, 'read') else 'node',
-            'nodeType': node.project_or_component,
-            'category': node.category,
-            'permissions': {
-                'view': can_read,
-            },
-        }
+    if not can_read and not formatted_children:
+        return []
+
+    events = []
+    if can_read:
+        node_subscriptions = subscriptions_by_owner.get(node._id, [])
+        for subscription in constants.NODE_SUBSCRIPTIONS_AVAILABLE:
+            parent_nt = None
+            if parent_readable:
+                parent_nt = _find_parent_notification_type(ancestor_ids, subscription, user, subscriptions_by_owner) or 'none'
+            events.append(_serialize_event(
+                user, subscription, constants.NODE_SUBSCRIPTIONS_AVAILABLE, node_subscriptions,
+                default_type='adopt_parent' if has_parent else 'none',
+                parent_notification_type=parent_nt,
+            ))
+
+    return [{
+        'node': {
+            'id': node._id,
+            'url': node.url if can_read else '',
+            'title': node.title if can_read else 'Private Project',
+        },
+        'children': events + formatted_children,
+        'kind': 'folder' if not has_parent or not parent_readable else 'node',
+        'nodeType': node.project_or_component,
+        'category': node.category,
+        'permissions': {
+            'view': can_read,
+        },
+    }]
 
-        items.append(item)
 
-    return items
+def _find_parent_notification_type(ancestor_ids, event, user, subscriptions_by_owner):
+    """Same as `get_parent_notification_type`, using the user's already
+    loaded subscriptions
+    """
+    for ancestor_id in ancestor_ids:
+        key = to_subscription_key(ancestor_id, event)
+        for subscription in subscriptions_by_owner.get(ancestor_id, []):
+            if subscription._id != key:
+                continue
+            for notification_type in constants.NOTIFICATION_TYPES:
+                if user._id in get_subscribed_ids(subscription, notification_type):
+                    return notification_type
+    return None
 
 
 def format_user_subscriptions(user, data):
@@ -207,11 +330,26 @@ def serialize_event(user, subscription, subscriptions_available, user_subscripti
     :param node: modular odm Node object
     :return: treebeard-formatted subscription events
     """
+    if node and node.parent_node and node.parent_node.has_permission(user, 'read'):
+        parent_nt = get_parent_notification_type(node._id, subscription, user)
+        parent_nt = parent_nt if parent_nt else 'none'
+    else:
+        parent_nt = None
+    return _serialize_event(
+        user, subscription, subscriptions_available, user_subscriptions,
+        default_type='adopt_parent' if node and node.node__parent else 'none',
+        parent_notification_type=parent_nt,
+    )
+
+
+def _serialize_event(user, subscription, subscriptions_available, user_subscriptions,
+                     default_type, parent_notification_type):
     event = {
         'event': {
             'title': subscription,
             'description': subscriptions_available[subscription],
-            'notificationType': 'adopt_parent' if node and node.node__parent else 'none',
+            'notificationType': default_type,
+            'parent_notification_type': parent_notification_type,
         },
         'kind': 'event',
         'children': []
@@ -219,15 +357,9 @@ def serialize_event(user, subscription, subscriptions_available, user_subscripti
     for s in user_subscriptions:
         if s.event_name == subscription:
             for notification_type in constants.NOTIFICATION_TYPES:
-                if user in getattr(s, notification_type):
+                if user._id in get_subscribed_ids(s, notification_type):
                     event['event']['notificationType'] = notification_type
 
-    if node and node.parent_node and node.parent_node.has_permission(user, 'read'):
-        parent_nt = get_parent_notification_type(node._id, subscription, user)
-        event['event']['parent_notification_type'] = parent_nt if parent_nt else 'none'
-    else:
-        event['event']['parent_notification_type'] = None
-
     return event
 
 
@@ -585,6 +585,9 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin):
     _id = fields.StringField(primary=True)
 
     date_created = fields.DateTimeField(auto_now_add=datetime.datetime.utcnow, index=True)
+    # Updated on every save; unlike `date_modified`, which is derived from
+    # the logs, this changes whenever any field does
+    date_saved = fields.DateTimeField(auto_now=datetime.datetime.utcnow, index=True)
 
     # Privacy
     is_public = fields.BooleanField(default=False, index=True)
@@ -1124,7 +1127,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin):
         if self.is_folder or self.archiving:
             need_update = False
         if need_update:
-            self.update_search()
+            self.update_search(saved_fields=None if first_save else saved_fields)
 
         # This method checks what has changed.
         if settings.PIWIK_HOST and update_piwik:
@@ -1546,10 +1549,16 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin):
             self.save()
         return None
 
-    def update_search(self):
+    def update_search(self, saved_fields=None):
+        """Update the search index for this node.
+
+        :param saved_fields: Fields changed by the save that triggered the
+            update; lets the search engine send a partial update. ``None``
+            rebuilds the whole document.
+        """
         from website import search
         try:
-            search.search.update_node(self)
+            search.search.update_node(self, saved_fields=saved_fields)
         except search.exceptions.SearchUnavailableError as e:
             logger.exception(e)
             log_exception()
@@ -2470,7 +2479,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin):
         :param content: A string, the posted content.
         :param auth: All the auth information including user, API key.
         """
-        from website.addons.wiki.model import NodeWikiPage
+        from website.addons.wiki.model import NodeWikiPage, compact_version
 
         name = (name or '').strip()
         key = to_mongo_key(name)
@@ -2501,6 +2510,8 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin):
             self.wiki_pages_versions[key] = []
         self.wiki_pages_versions[key].append(new_page._primary_key)
         self.wiki_pages_current[key] = new_page._primary_key
+        # The previous version is no longer current; store it as a delta
+        compact_version(self, self.wiki_pages_versions[key], len(self.wiki_pages_versions[key]) - 2)
 
         self.add_log(
             action=NodeLog.WIKI_UPDATED,
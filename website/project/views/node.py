@@ -716,6 +716,7 @@ def _view_project(node, auth, primary=False):
             'in_dashboard': in_dashboard,
             'is_public': node.is_public,
             'is_archiving': node.archiving,
+            'archive_progress': node.archive_job.progress() if node.archiving else None,
             'date_created': iso8601format(node.date_created),
             'date_modified': iso8601format(node.logs[-1].date) if node.logs else '',
             'tags': [tag._primary_key for tag in node.tags],
@@ -18,6 +18,7 @@ from framework.forms.utils import process_payload, unprocess_payload
 from framework.auth.decorators import must_be_signed
 
 from website.archiver import ARCHIVER_SUCCESS, ARCHIVER_FAILURE
+from website.archiver import utils as archiver_utils
 
 from website import settings
 from website.exceptions import (
@@ -593,8 +594,14 @@ def registration_callbacks(node, payload, *args, **kwargs):
         # for draft files and one for published files
         if src_provider == 'dataverse':
             src_provider += '-' + (payload['destination']['name'].split(' ')[-1].lstrip('(').rstrip(')').strip())
+        errors = archiver_utils.verify_archive(
+            node,
+            node.archive_job.get_target(src_provider),
+            payload['destination']['name'],
+        )
         node.archive_job.update_target(
             src_provider,
-            ARCHIVER_SUCCESS,
+            ARCHIVER_FAILURE if errors else ARCHIVER_SUCCESS,
+            errors=errors,
         )
     project_signals.archive_callback.send(node)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Short-lived, per-process cache of search results for anonymous queries.
+
+Entries expire after ``SEARCH_CACHE_TTL`` seconds. The whole cache is dropped
+when the OSF or the SHARE search alias is moved to a new index (e.g. after a
+migration).
+"""
+import copy
+import time
+import logging
+
+from website import settings
+from website.search import exceptions
+from website.util.cache import LRUCache
+import website.search.search as search
+
+logger = logging.getLogger(__name__)
+
+results_cache = LRUCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
+
+# Indices the OSF and SHARE aliases resolved to when last checked
+_alias_state = {
+    'targets': {},
+    'checked': 0,
+}
+
+
+def normalize_query(q):
+    """Collapse whitespace so that trivially different query strings share a
+    cache entry.
+    """
+    return u' '.join((q or u'*').split()) or u'*'
+
+
+def make_key(namespace, *parts):
+    return (namespace, ) + tuple(parts)
+
+
+def get_alias_targets():
+    targets = {'osf': search.get_alias_target()}
+    if settings.USE_SHARE:
+        targets['share'] = search.get_share_alias_target()
+    return targets
+
+
+def check_alias():
+    """Drop all cached results if the OSF or SHARE alias points at a different
+    index than it did the last time it was checked.
+    """
+    now = time.time()
+    if now - _alias_state['checked'] < settings.SEARCH_CACHE_ALIAS_CHECK_INTERVAL:
+        return
+    _alias_state['checked'] = now
+    try:
+        targets = get_alias_targets()
+    except exceptions.SearchException:
+        return
+    if targets != _alias_state['targets']:
+        if _alias_state['targets']:
+            logger.info('Search aliases moved from {0} to {1}; clearing result cache'.format(
+                _alias_state['targets'], targets
+            ))
+            invalidate()
+        _alias_state['targets'] = targets
+
+
+def alias_target(name):
+    """The index the alias `name` ('osf' or 'share') resolved to when last
+    checked, for keying results on it.
+    """
+    if not settings.SEARCH_CACHE_ENABLED:
+        return None
+    check_alias()
+    return _alias_state['targets'].get(name)
+
+
+def get_or_compute(key, func):
+    """Return the cached result for `key`, calling `func` to compute and store
+    it on a miss. Callers get a copy, so they may annotate the result.
+    """
+    if not settings.SEARCH_CACHE_ENABLED:
+        return func()
+    check_alias()
+    result = results_cache.get(key)
+    if result is None:
+        result = func()
+        results_cache.set(key, result)
+    return copy.deepcopy(result)
+
+
+def invalidate():
+    results_cache.clear()
+
+
+def stats():
+    return results_cache.stats()
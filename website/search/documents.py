@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""Search documents and result formatting shared by the search engines."""
+
+from __future__ import division
+
+import re
+import math
+import logging
+import unicodedata
+
+import six
+
+from website import settings
+from website.filters import gravatar
+from website.models import User, Node
+from website.util import sanitize
+
+logger = logging.getLogger(__name__)
+
+
+# These are the doc_types that exist in the search database
+ALIASES = {
+    'project': 'Projects',
+    'component': 'Components',
+    'registration': 'Registrations',
+    'user': 'Users',
+    'total': 'Total'
+}
+
+
+def format_results(results):
+    ret = []
+    for result in results:
+        if result.get('category') == 'user':
+            result['url'] = '/profile/' + result['id']
+        elif result.get('category') in {'project', 'component', 'registration'}:
+            result = format_result(result, result.get('parent_id'))
+        ret.append(result)
+    return ret
+
+
+def format_result(result, parent_id=None):
+    parent_info = load_parent(parent_id)
+    formatted_result = {
+        'contributors': result['contributors'],
+        'wiki_link': result['url'] + 'wiki/',
+        # TODO: Remove safe_unescape_html when mako html safe comes in
+        'title': sanitize.safe_unescape_html(result['title']),
+        'url': result['url'],
+        'is_component': False if parent_info is None else True,
+        'parent_title': sanitize.safe_unescape_html(parent_info.get('title')) if parent_info else None,
+        'parent_url': parent_info.get('url') if parent_info is not None else None,
+        'tags': result['tags'],
+        'is_registration': (result['is_registration'] if parent_info is None
+                                                        else parent_info.get('is_registration')),
+        'is_retracted': result['is_retracted'],
+        'pending_retraction': result['pending_retraction'],
+        'embargo_end_date': result['embargo_end_date'],
+        'pending_embargo': result['pending_embargo'],
+        'description': result['description'] if parent_info is None else None,
+        'category': result.get('category'),
+        'date_created': result.get('date_created'),
+        'date_registered': result.get('registration_date')
+    }
+
+    return formatted_result
+
+
+def load_parent(parent_id):
+    parent = Node.load(parent_id)
+    if parent is None:
+        return None
+    parent_info = {}
+    if parent is not None and parent.is_public:
+        parent_info['title'] = parent.title
+        parent_info['url'] = parent.url
+        parent_info['is_registration'] = parent.is_registration
+        parent_info['id'] = parent._id
+    else:
+        parent_info['title'] = '-- private project --'
+        parent_info['url'] = ''
+        parent_info['is_registration'] = None
+        parent_info['id'] = None
+    return parent_info
+
+
+COMPONENT_CATEGORIES = set([k for k in Node.CATEGORY_MAP.keys() if not k == 'project'])
+
+def get_doctype_from_node(node):
+
+    if node.category in COMPONENT_CATEGORIES:
+        return 'component'
+    elif node.is_registration:
+        return 'registration'
+    else:
+        return node.category
+
+
+def serialize_normalized_title(node):
+    try:
+        normalized_title = six.u(node.title)
+    except TypeError:
+        normalized_title = node.title
+    return unicodedata.normalize('NFKD', normalized_title).encode('ascii', 'ignore')
+
+
+def serialize_contributors(node):
+    return [
+        {
+            'fullname': x.fullname,
+            'url': x.profile_url if x.is_active else None
+        }
+        for x in node.visible_contributors
+        if x is not None
+    ]
+
+
+def serialize_wikis(node):
+    from website.addons.wiki.model import NodeWikiPage
+
+    wikis = {}
+    if not node.is_retracted:
+        for wiki in [
+            NodeWikiPage.load(x)
+            for x in node.wiki_pages_current.values()
+        ]:
+            wikis[wiki.page_name] = wiki.raw_text(node)
+    return wikis
+
+
+# Document fields that can be rebuilt on their own
+NODE_DOCUMENT_FIELDS = {
+    'title': lambda node: node.title,
+    'normalized_title': serialize_normalized_title,
+    'description': lambda node: node.description,
+    'tags': lambda node: [tag._id for tag in node.tags if tag],
+    'contributors': serialize_contributors,
+    'wikis': serialize_wikis,
+}
+
+# Maps `Node` fields to the document fields they affect. Saving any other
+# search-relevant field (visibility, deletion, category, registration state)
+# rebuilds the whole document. Partial updates are merged into the stored
+# document, so object fields like `wikis` can't be sent this way: keys for
+# deleted or renamed pages would survive the merge.
+PARTIAL_UPDATE_FIELDS = {
+    'title': ('title', 'normalized_title'),
+    'description': ('description', ),
+    'tags': ('tags', ),
+    'visible_contributor_ids': ('contributors', ),
+}
+
+
+def serialize_node(node, category):
+    """Build the search document for a public, searchable node.
+
+    :param node: Project, component or registration
+    :param category: Doc type of the node, as returned by `get_doctype_from_node`
+    :return: Dictionary to be sent as the document body
+    """
+    elastic_document = {
+        'id': node._id,
+        'category': category,
+        'public': node.is_public,
+        'url': node.url,
+        'is_registration': node.is_registration,
+        'is_retracted': node.is_retracted,
+        'pending_retraction': node.pending_retraction,
+        'embargo_end_date': node.embargo_end_date.strftime("%A, %b. %d, %Y") if node.embargo_end_date else False,
+        'pending_embargo': node.pending_embargo,
+        'registered_date': node.registered_date,
+        'parent_id': None if category == 'project' else node.parent_id,
+        'date_created': node.date_created,
+        'boost': int(not node.is_registration) + 1,  # This is for making registered projects less relevant
+    }
+    elastic_document.update(serialize_node_fields(node, NODE_DOCUMENT_FIELDS.keys()))
+    return elastic_document
+
+
+def serialize_node_fields(node, document_fields):
+    return {
+        field: NODE_DOCUMENT_FIELDS[field](node)
+        for field in document_fields
+    }
+
+
+def get_partial_update_fields(saved_fields):
+    """Return the document fields to send for a save of `saved_fields`, or
+    ``None`` if the whole document has to be rebuilt.
+    """
+    if not saved_fields:
+        return None
+    document_fields = set()
+    for field in saved_fields:
+        if field not in PARTIAL_UPDATE_FIELDS:
+            return None
+        document_fields.update(PARTIAL_UPDATE_FIELDS[field])
+    return document_fields
+
+
+def is_node_searchable(node):
+    return not (node.is_deleted or not node.is_public or node.archiving)
+
+
+def serialize_user(user):
+    """Build the search document for an active user.
+
+    :param user: User to serialize
+    :return: Dictionary to be sent as the document body
+    """
+    names = dict(
+        fullname=user.fullname,
+        given_name=user.given_name,
+        family_name=user.family_name,
+        middle_names=user.middle_names,
+        suffix=user.suffix
+    )
+
+    normalized_names = {}
+    for key, val in names.items():
+        if val is not None:
+            try:
+                val = six.u(val)
+            except TypeError:
+                pass  # This is fine, will only happen in 2.x if val is already unicode
+            normalized_names[key] = unicodedata.normalize('NFKD', val).encode('ascii', 'ignore')
+
+    return {
+        'id': user._id,
+        'user': user.fullname,
+        'normalized_user': normalized_names['fullname'],
+        'normalized_names': normalized_names,
+        'names': names,
+        'job': user.jobs[0]['institution'] if user.jobs else '',
+        'job_title': user.jobs[0]['title'] if user.jobs else '',
+        'all_jobs': [job['institution'] for job in user.jobs[1:]],
+        'school': user.schools[0]['institution'] if user.schools else '',
+        'all_schools': [school['institution'] for school in user.schools],
+        'category': 'user',
+        'degree': user.schools[0]['degree'] if user.schools else '',
+        'social': user.social_links,
+        'boost': 2,  # TODO(fabianvf): Probably should make this a constant or something
+    }
+
+
+def normalize(value):
+    """Strip accents so that e.g. "Björk" can be found by searching "bjork"."""
+    try:
+        value = six.u(value)
+    except TypeError:
+        pass  # This is fine, will only happen in 2.x if value is already unicode
+    return unicodedata.normalize('NFKD', value).encode('ascii', 'ignore')
+
+
+def build_contributor_query(query, exclude=None):
+    """Build the query string used to autocomplete contributors: every word of
+    `query` is matched as a prefix, and users in `exclude` are left out.
+    """
+    items = [normalize(item) for item in re.split(r'[\s-]+', query)]
+    exclude = exclude or []
+    return "  AND ".join('{}*~'.format(re.escape(item)) for item in items) + \
+        "".join(' NOT id:"{}"'.format(excluded._id) for excluded in exclude)
+
+
+def format_contributor_results(results, page, size, current_user=None):
+    """Format user search results for the add-contributor widget.
+
+    :param results: Results of a search restricted to the user doc type
+    :param page: For pagination, the page number of the results
+    :param size: For pagination, the number of results per page
+    :param current_user: A User object of the current user
+    """
+    docs = results['results']
+    pages = math.ceil(results['counts'].get('user', 0) / size)
+
+    users = []
+    for doc in docs:
+        # TODO: use utils.serialize_user
+        user = User.load(doc['id'])
+
+        if current_user:
+            n_projects_in_common = current_user.n_projects_in_common(user)
+        else:
+            n_projects_in_common = 0
+
+        if user is None:
+            logger.error('Could not load user {0}'.format(doc['id']))
+            continue
+        if user.is_active:  # exclude merged, unregistered, etc.
+            current_employment = None
+            education = None
+
+            if user.jobs:
+                current_employment = user.jobs[0]['institution']
+
+            if user.schools:
+                education = user.schools[0]['institution']
+
+            users.append({
+                'fullname': doc['user'],
+                'id': doc['id'],
+                'employment': current_employment,
+                'education': education,
+                'n_projects_in_common': n_projects_in_common,
+                'gravatar_url': gravatar(
+                    user,
+                    use_ssl=True,
+                    size=settings.GRAVATAR_SIZE_ADD_CONTRIBUTOR,
+                ),
+                'profile_url': user.profile_url,
+                'registered': user.is_registered,
+                'active': user.is_active
+
+            })
+
+    return {
+        'users': users,
+        'total': results['counts']['total'],
+        'pages': pages,
+        'page': page,
+    }
@@ -1,14 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from __future__ import division
-
-import re
 import copy
-import math
 import logging
-import unicodedata
-
-import six
 
 from elasticsearch import (
     Elasticsearch,
@@ -21,24 +14,29 @@ from elasticsearch import (
 from framework import sentry
 
 from website import settings
-from website.filters import gravatar
-from website.models import User, Node
 from website.search import exceptions
 from website.search.util import build_query
-from website.util import sanitize
+from website.search.documents import (  # noqa
+    ALIASES,
+    COMPONENT_CATEGORIES,
+    NODE_DOCUMENT_FIELDS,
+    PARTIAL_UPDATE_FIELDS,
+    build_contributor_query,
+    format_contributor_results,
+    format_result,
+    format_results,
+    get_doctype_from_node,
+    get_partial_update_fields,
+    is_node_searchable,
+    load_parent,
+    serialize_node,
+    serialize_node_fields,
+    serialize_user,
+)
 
 logger = logging.getLogger(__name__)
 
 
-# These are the doc_types that exist in the search database
-ALIASES = {
-    'project': 'Projects',
-    'component': 'Components',
-    'registration': 'Registrations',
-    'user': 'Users',
-    'total': 'Total'
-}
-
 # Prevent tokenizing and stop word removal.
 NOT_ANALYZED_PROPERTY = {'type': 'string', 'index': 'not_analyzed'}
 
@@ -157,137 +155,45 @@ def search(query, index=None, doc_type='_all'):
     return return_value
 
 
-def format_results(results):
-    ret = []
-    for result in results:
-        if result.get('category') == 'user':
-            result['url'] = '/profile/' + result['id']
-        elif result.get('category') in {'project', 'component', 'registration'}:
-            result = format_result(result, result.get('parent_id'))
-        ret.append(result)
-    return ret
-
-
-def format_result(result, parent_id=None):
-    parent_info = load_parent(parent_id)
-    formatted_result = {
-        'contributors': result['contributors'],
-        'wiki_link': result['url'] + 'wiki/',
-        # TODO: Remove safe_unescape_html when mako html safe comes in
-        'title': sanitize.safe_unescape_html(result['title']),
-        'url': result['url'],
-        'is_component': False if parent_info is None else True,
-        'parent_title': sanitize.safe_unescape_html(parent_info.get('title')) if parent_info else None,
-        'parent_url': parent_info.get('url') if parent_info is not None else None,
-        'tags': result['tags'],
-        'is_registration': (result['is_registration'] if parent_info is None
-                                                        else parent_info.get('is_registration')),
-        'is_retracted': result['is_retracted'],
-        'pending_retraction': result['pending_retraction'],
-        'embargo_end_date': result['embargo_end_date'],
-        'pending_embargo': result['pending_embargo'],
-        'description': result['description'] if parent_info is None else None,
-        'category': result.get('category'),
-        'date_created': result.get('date_created'),
-        'date_registered': result.get('registration_date')
-    }
-
-    return formatted_result
-
-
-def load_parent(parent_id):
-    parent = Node.load(parent_id)
-    if parent is None:
-        return None
-    parent_info = {}
-    if parent is not None and parent.is_public:
-        parent_info['title'] = parent.title
-        parent_info['url'] = parent.url
-        parent_info['is_registration'] = parent.is_registration
-        parent_info['id'] = parent._id
-    else:
-        parent_info['title'] = '-- private project --'
-        parent_info['url'] = ''
-        parent_info['is_registration'] = None
-        parent_info['id'] = None
-    return parent_info
-
-
-COMPONENT_CATEGORIES = set([k for k in Node.CATEGORY_MAP.keys() if not k == 'project'])
-
-def get_doctype_from_node(node):
-
-    if node.category in COMPONENT_CATEGORIES:
-        return 'component'
-    elif node.is_registration:
-        return 'registration'
-    else:
-        return node.category
-
-
 @requires_search
-def update_node(node, index=None):
+def update_node(node, index=None, saved_fields=None):
+    """Index `node`. If `saved_fields` are given and only touch fields listed in
+    `PARTIAL_UPDATE_FIELDS`, only the affected document fields are rebuilt and
+    sent as a partial update.
+    """
     index = index or INDEX
-    from website.addons.wiki.model import NodeWikiPage
 
     category = get_doctype_from_node(node)
 
-    if category == 'project':
-        elastic_document_id = node._id
-        parent_id = None
-    else:
+    if category != 'project':
         try:
-            elastic_document_id = node._id
-            parent_id = node.parent_id
+            node.parent_id
         except IndexError:
             # Skip orphaned components
             return
-    if node.is_deleted or not node.is_public or node.archiving:
-        delete_doc(elastic_document_id, node)
-    else:
-        try:
-            normalized_title = six.u(node.title)
-        except TypeError:
-            normalized_title = node.title
-        normalized_title = unicodedata.normalize('NFKD', normalized_title).encode('ascii', 'ignore')
-
-        elastic_document = {
-            'id': elastic_document_id,
-            'contributors': [
-                {
-                    'fullname': x.fullname,
-                    'url': x.profile_url if x.is_active else None
-                }
-                for x in node.visible_contributors
-                if x is not None
-            ],
-            'title': node.title,
-            'normalized_title': normalized_title,
-            'category': category,
-            'public': node.is_public,
-            'tags': [tag._id for tag in node.tags if tag],
-            'description': node.description,
-            'url': node.url,
-            'is_registration': node.is_registration,
-            'is_retracted': node.is_retracted,
-            'pending_retraction': node.pending_retraction,
-            'embargo_end_date': node.embargo_end_date.strftime("%A, %b. %d, %Y") if node.embargo_end_date else False,
-            'pending_embargo': node.pending_embargo,
-            'registered_date': node.registered_date,
-            'wikis': {},
-            'parent_id': parent_id,
-            'date_created': node.date_created,
-            'boost': int(not node.is_registration) + 1,  # This is for making registered projects less relevant
-        }
+    if not is_node_searchable(node):
+        delete_doc(node._id, node)
+        return
 
-        if not node.is_retracted:
-            for wiki in [
-                NodeWikiPage.load(x)
-                for x in node.wiki_pages_current.values()
-            ]:
-                elastic_document['wikis'][wiki.page_name] = wiki.raw_text(node)
+    document_fields = get_partial_update_fields(
+        set(saved_fields).intersection(node.SOLR_UPDATE_FIELDS) if saved_fields else None
+    )
+    if document_fields:
+        try:
+            es.update(
+                index=index,
+                doc_type=category,
+                id=node._id,
+                body={'doc': serialize_node_fields(node, document_fields)},
+                refresh=True,
+            )
+            return
+        except NotFoundError:
+            # Document missing from the index; fall back to a full rebuild
+            pass
 
-        es.index(index=index, doc_type=category, id=elastic_document_id, body=elastic_document, refresh=True)
+    elastic_document = serialize_node(node, category)
+    es.index(index=index, doc_type=category, id=node._id, body=elastic_document, refresh=True)
 
 
 def bulk_update_contributors(nodes, index=INDEX):
@@ -328,41 +234,50 @@ def update_user(user, index=None):
             pass
         return
 
-    names = dict(
-        fullname=user.fullname,
-        given_name=user.given_name,
-        family_name=user.family_name,
-        middle_names=user.middle_names,
-        suffix=user.suffix
+    user_doc = serialize_user(user)
+    es.index(index=index, doc_type='user', body=user_doc, id=user._id, refresh=True)
+
+
+@requires_search
+def bulk_index(actions, index=None, chunk_size=500):
+    """Submit pre-built documents through the bulk API.
+
+    :param actions: Iterable of ``(doc_type, doc_id, document)`` tuples
+    :param index: Index to write to
+    :param chunk_size: Number of documents per bulk request
+    :return: Tuple of (number of documents indexed, list of errors); documents
+        that fail don't stop the rest from being indexed
+    """
+    index = index or INDEX
+    return helpers.bulk(
+        es,
+        (
+            {
+                '_op_type': 'index',
+                '_index': index,
+                '_type': doc_type,
+                '_id': doc_id,
+                '_source': document,
+            }
+            for doc_type, doc_id, document in actions
+        ),
+        chunk_size=chunk_size,
+        raise_on_error=False,
     )
 
-    normalized_names = {}
-    for key, val in names.items():
-        if val is not None:
-            try:
-                val = six.u(val)
-            except TypeError:
-                pass  # This is fine, will only happen in 2.x if val is already unicode
-            normalized_names[key] = unicodedata.normalize('NFKD', val).encode('ascii', 'ignore')
-
-    user_doc = {
-        'id': user._id,
-        'user': user.fullname,
-        'normalized_user': normalized_names['fullname'],
-        'normalized_names': normalized_names,
-        'names': names,
-        'job': user.jobs[0]['institution'] if user.jobs else '',
-        'job_title': user.jobs[0]['title'] if user.jobs else '',
-        'all_jobs': [job['institution'] for job in user.jobs[1:]],
-        'school': user.schools[0]['institution'] if user.schools else '',
-        'all_schools': [school['institution'] for school in user.schools],
-        'category': 'user',
-        'degree': user.schools[0]['degree'] if user.schools else '',
-        'social': user.social_links,
-        'boost': 2,  # TODO(fabianvf): Probably should make this a constant or something
-    }
 
-    es.index(index=index, doc_type='user', body=user_doc, id=user._id, refresh=True)
+@requires_search
+def get_alias_target(index=None):
+    """Return the name of the index `index` currently resolves to."""
+    index = index or INDEX
+    return ','.join(sorted(es.indices.get_aliases(index=index).keys()))
+
+
+@requires_search
+def count(index=None):
+    index = index or INDEX
+    es.indices.refresh(index=index)
+    return es.count(index=index)['count']
 
 
 @requires_search
@@ -439,70 +354,6 @@ def search_contributor(query, page=0, size=10, exclude=None, current_user=None):
 
     """
     start = (page * size)
-    items = re.split(r'[\s-]+', query)
-    exclude = exclude or []
-    normalized_items = []
-    for item in items:
-        try:
-            normalized_item = six.u(item)
-        except TypeError:
-            normalized_item = item
-        normalized_item = unicodedata.normalize('NFKD', normalized_item).encode('ascii', 'ignore')
-        normalized_items.append(normalized_item)
-    items = normalized_items
-
-    query = ''
-
-    query = "  AND ".join('{}*~'.format(re.escape(item)) for item in items) + \
-            "".join(' NOT id:"{}"'.format(excluded._id) for excluded in exclude)
-
+    query = build_contributor_query(query, exclude)
     results = search(build_query(query, start=start, size=size), index=INDEX, doc_type='user')
-    docs = results['results']
-    pages = math.ceil(results['counts'].get('user', 0) / size)
-
-    users = []
-    for doc in docs:
-        # TODO: use utils.serialize_user
-        user = User.load(doc['id'])
-
-        if current_user:
-            n_projects_in_common = current_user.n_projects_in_common(user)
-        else:
-            n_projects_in_common = 0
-
-        if user is None:
-            logger.error('Could not load user {0}'.format(doc['id']))
-            continue
-        if user.is_active:  # exclude merged, unregistered, etc.
-            current_employment = None
-            education = None
-
-            if user.jobs:
-                current_employment = user.jobs[0]['institution']
-
-            if user.schools:
-                education = user.schools[0]['institution']
-
-            users.append({
-                'fullname': doc['user'],
-                'id': doc['id'],
-                'employment': current_employment,
-                'education': education,
-                'n_projects_in_common': n_projects_in_common,
-                'gravatar_url': gravatar(
-                    user,
-                    use_ssl=True,
-                    size=settings.GRAVATAR_SIZE_ADD_CONTRIBUTOR,
-                ),
-                'profile_url': user.profile_url,
-                'registered': user.is_registered,
-                'active': user.is_active
-
-            })
-
-    return {
-        'users': users,
-        'total': results['counts']['total'],
-        'pages': pages,
-        'page': page,
-    }
+    return format_contributor_results(results, page, size, current_user)
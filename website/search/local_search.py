@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*-
+"""In-process search engine with the same interface as
+`website.search.elastic_search`, for tests, development and small deployments
+that run without an elasticsearch cluster. Enable it with
+``SEARCH_ENGINE = 'local'``.
+
+Documents are kept in memory in an inverted index. Queries support the subset
+of the Lucene query string syntax produced by the OSF front end: terms,
+"phrases", prefix wildcards (``repro*``), ``field:value`` and
+``field:(...)`` clauses, grouping, and ``AND``/``OR``/``NOT``.
+"""
+
+import re
+import copy
+import json
+import bisect
+import datetime
+import threading
+import collections
+
+import six
+
+from website import settings
+from website.search import exceptions
+from website.search.util import build_query
+from website.search.documents import (
+    ALIASES,
+    build_contributor_query,
+    format_contributor_results,
+    format_results,
+    get_doctype_from_node,
+    get_partial_update_fields,
+    is_node_searchable,
+    normalize,
+    serialize_node,
+    serialize_node_fields,
+    serialize_user,
+)
+
+INDEX = settings.ELASTIC_INDEX
+
+ALL_FIELD = '_all'
+TYPE_FIELD = '_type'
+
+# Boosts applied when a term matches in one of these fields
+FIELD_BOOSTS = {
+    'title': 4,
+    'description': 1.2,
+    'job': 1,
+    'school': 1,
+    'all_jobs': 0.125,
+    'all_schools': 0.125,
+}
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+QUERY_TOKEN_RE = re.compile(r'''
+    (?P<lparen>\()
+    | (?P<rparen>\))
+    | (?P<field>[\w.]+):(?=\S)
+    | (?P<phrase>"[^"]*"(?:~\d*)?)
+    | (?P<op>(?:AND|OR|NOT)(?=[\s()"]|$)|&&|\|\||!)
+    | (?P<modifier>[+-])(?=\S)
+    | (?P<term>(?:\\.|[^\s()"])+)
+''', re.VERBOSE)
+
+
+def stem(token):
+    """Very light English stemming, so that singular, plural and possessive
+    forms of a word match each other.
+    """
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(value, stemmed=True):
+    if value is None or isinstance(value, bool):
+        return []
+    if not isinstance(value, six.string_types):
+        value = six.text_type(value)
+    text = normalize(value).lower().replace("'", '')
+    tokens = TOKEN_RE.findall(text)
+    return [stem(token) for token in tokens] if stemmed else tokens
+
+
+def flatten(document, prefix=''):
+    """Yield ``(field, value)`` pairs for every leaf of a document, with
+    nested fields named by their dotted path.
+    """
+    for key, value in document.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            for pair in flatten(value, name + '.'):
+                yield pair
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                if isinstance(item, dict):
+                    for pair in flatten(item, name + '.'):
+                        yield pair
+                else:
+                    yield name, item
+        else:
+            yield name, value
+
+
+def field_names(field):
+    """Names a leaf is searchable under: its path, each parent path (so that
+    ``contributors:bowie`` matches ``contributors.fullname``) and ``_all``.
+    """
+    parts = field.split('.')
+    return ['.'.join(parts[:i]) for i in range(len(parts), 0, -1)] + [ALL_FIELD]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+
+class LocalIndex(object):
+    """Inverted index over the documents of one search index."""
+
+    def __init__(self):
+        self.documents = {}  # (doc_type, id) -> document source
+        self.field_tokens = {}  # (doc_type, id) -> {field: [token, ...]}
+        self.postings = collections.defaultdict(set)  # (field, token) -> set of keys
+        self._vocabulary = {}  # field -> sorted list of tokens, built lazily
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_type, doc_id, document):
+        # Store a JSON round-trip of the document, as elasticsearch would
+        document = json.loads(json.dumps(document, default=_json_default))
+        key = (doc_type, doc_id)
+        fields = collections.defaultdict(list)
+        fields[TYPE_FIELD].append(doc_type)
+        for field, value in flatten(document):
+            tokens = tokenize(value)
+            if not tokens:
+                continue
+            # A gap keeps phrases from matching across separate values
+            for name in field_names(field):
+                if fields[name]:
+                    fields[name].append(None)
+                fields[name].extend(tokens)
+        with self.lock:
+            self.remove(doc_type, doc_id)
+            self.documents[key] = document
+            self.field_tokens[key] = dict(fields)
+            for field, tokens in fields.items():
+                for token in tokens:
+                    if token is not None:
+                        self.postings[(field, token)].add(key)
+            self._vocabulary = {}
+
+    def remove(self, doc_type, doc_id):
+        key = (doc_type, doc_id)
+        with self.lock:
+            if key not in self.documents:
+                return False
+            for field, tokens in self.field_tokens.pop(key).items():
+                for token in tokens:
+                    keys = self.postings.get((field, token))
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del self.postings[(field, token)]
+            del self.documents[key]
+            self._vocabulary = {}
+            return True
+
+    def get(self, doc_type, doc_id):
+        return self.documents.get((doc_type, doc_id))
+
+    def vocabulary(self, field):
+        with self.lock:
+            if field not in self._vocabulary:
+                self._vocabulary[field] = sorted(
+                    token for (name, token) in self.postings if name == field
+                )
+            return self._vocabulary[field]
+
+    def term_keys(self, field, token, prefix=False):
+        if not prefix:
+            return set(self.postings.get((field, token), ()))
+        vocabulary = self.vocabulary(field)
+        keys = set()
+        for i in range(bisect.bisect_left(vocabulary, token), len(vocabulary)):
+            if not vocabulary[i].startswith(token):
+                break
+            keys.update(self.postings[(field, vocabulary[i])])
+        return keys
+
+    def has_phrase(self, key, field, phrase):
+        tokens = self.field_tokens[key].get(field, ())
+        size = len(phrase)
+        return any(
+            tokens[i:i + size] == phrase
+            for i in range(len(tokens) - size + 1)
+        )
+
+
+# Index name -> LocalIndex
+indices = {}
+# Alias -> index name
+aliases = {}
+_lock = threading.RLock()
+
+
+def get_index(name, create=True):
+    with _lock:
+        name = aliases.get(name, name)
+        if name not in indices:
+            if not create:
+                raise exceptions.IndexNotFoundError('No such index: {}'.format(name))
+            indices[name] = LocalIndex()
+        return indices[name]
+
+
+def put_alias(alias, index):
+    with _lock:
+        indices.pop(alias, None)
+        aliases[alias] = index
+        get_index(index)
+
+
+# Query parsing
+
+def lex(query_string):
+    return [
+        (match.lastgroup, match.group(match.lastgroup))
+        for match in QUERY_TOKEN_RE.finditer(query_string)
+    ]
+
+
+def parse(query_string):
+    """Parse a Lucene query string into a tree of tuples:
+
+    ``('all', )``, ``('term', field, token, is_prefix)``,
+    ``('phrase', field, [token, ...])`` and
+    ``('bool', [[occur, node], ...])`` where occur is one of
+    ``'must'``, ``'should'`` or ``'must_not'``.
+    """
+    return _parse_clauses(lex(query_string or '*'), ALL_FIELD)
+
+
+def _parse_clauses(tokens, field):
+    clauses = []
+    conjunction = None
+    negate = False
+    modifier = None
+    while tokens and tokens[0][0] != 'rparen':
+        kind, value = tokens.pop(0)
+        if kind == 'op':
+            if value in ('AND', '&&'):
+                conjunction = 'AND'
+            elif value in ('OR', '||'):
+                conjunction = 'OR'
+            else:
+                negate = True
+            continue
+        if kind == 'modifier':
+            modifier = value
+            continue
+        node = _parse_atom(kind, value, tokens, field)
+        if node is None:
+            continue
+        occur = 'should'
+        if negate or modifier == '-':
+            occur = 'must_not'
+        elif modifier == '+':
+            occur = 'must'
+        if conjunction == 'AND':
+            if clauses and clauses[-1][0] == 'should':
+                clauses[-1][0] = 'must'
+            if occur == 'should':
+                occur = 'must'
+        clauses.append([occur, node])
+        conjunction, negate, modifier = None, False, None
+    return ('bool', clauses)
+
+
+def _parse_atom(kind, value, tokens, field):
+    if kind == 'lparen':
+        node = _parse_clauses(tokens, field)
+        if tokens:
+            tokens.pop(0)  # Closing parenthesis
+        return node
+    if kind == 'field':
+        if not tokens:
+            return None
+        next_kind, next_value = tokens.pop(0)
+        return _parse_atom(next_kind, next_value, tokens, value)
+    if kind == 'phrase':
+        phrase = tokenize(re.sub(r'~\d*$', '', value)[1:-1])
+        if not phrase:
+            return None
+        if len(phrase) == 1:
+            return ('term', field, phrase[0], False)
+        return ('phrase', field, phrase)
+    if kind == 'term':
+        text = re.sub(r'~\d*$', '', value.replace('\\', ''))
+        if text in ('*', '*:*'):
+            return ('all', )
+        if text.endswith('*'):
+            words = tokenize(text.rstrip('*'), stemmed=False)
+            if not words:
+                return ('all', )
+            node = ('term', field, words[-1], True)
+            if len(words) == 1:
+                return node
+            return ('bool', [['must', ('phrase', field, words[:-1])], ['must', node]])
+        words = tokenize(text)
+        if not words:
+            return None
+        if len(words) == 1:
+            return ('term', field, words[0], False)
+        return ('phrase', field, words)
+    return None
+
+
+# Query evaluation
+
+def _field_boost(index, key, token):
+    boost = 1
+    for field, field_boost in FIELD_BOOSTS.items():
+        if field_boost > boost and key in index.postings.get((field, token), ()):
+            boost = field_boost
+    return boost
+
+
+def evaluate(node, index):
+    """Return a dictionary mapping the keys of matching documents to scores."""
+    kind = node[0]
+    if kind == 'all':
+        return dict.fromkeys(index.documents, 1.0)
+    if kind == 'term':
+        _, field, token, prefix = node
+        keys = index.term_keys(field, token, prefix=prefix)
+        if field != ALL_FIELD or prefix:
+            return dict.fromkeys(keys, 1.0)
+        return {key: float(_field_boost(index, key, token)) for key in keys}
+    if kind == 'phrase':
+        _, field, phrase = node
+        keys = set.intersection(*[index.term_keys(field, token) for token in phrase])
+        return {
+            key: float(len(phrase) * _field_boost(index, key, phrase[0]))
+            for key in keys
+            if index.has_phrase(key, field, phrase)
+        }
+    scores = None
+    should = {}
+    excluded = set()
+    for occur, clause in node[1]:
+        matches = evaluate(clause, index)
+        if occur == 'must':
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    key: score + matches[key]
+                    for key, score in scores.items()
+                    if key in matches
+                }
+        elif occur == 'should':
+            for key, score in matches.items():
+                should[key] = should.get(key, 0) + score
+        else:
+            excluded.update(matches)
+    if scores is None:
+        if should:
+            scores = should
+        elif excluded:
+            scores = dict.fromkeys(index.documents, 1.0)
+        else:
+            scores = {}
+    else:
+        for key in scores:
+            scores[key] += should.get(key, 0)
+    for key in excluded:
+        scores.pop(key, None)
+    return scores
+
+
+def _query_tree(body):
+    query = (body or {}).get('query', {'match_all': {}})
+    while 'filtered' in query:
+        query = query['filtered'].get('query', {'match_all': {}})
+    if 'match_all' in query:
+        return ('all', )
+    if 'query_string' in query:
+        return parse(query['query_string'].get('query'))
+    raise exceptions.MalformedQueryError('Unsupported query: {}'.format(list(query.keys())))
+
+
+def _doc_types(doc_type):
+    if doc_type in (None, '_all'):
+        return None
+    return set(doc_type.split(','))
+
+
+def run_query(body, index=None, doc_type=None):
+    """Return ``(key, score)`` pairs matching an elasticsearch-style query
+    body, best match first.
+    """
+    index = get_index(index or INDEX)
+    doc_types = _doc_types(doc_type)
+    with index.lock:
+        scores = evaluate(_query_tree(body), index)
+        hits = [
+            (key, score * index.documents[key].get('boost', 1))
+            for key, score in scores.items()
+            if doc_types is None or key[0] in doc_types
+        ]
+    hits.sort(key=lambda hit: (-hit[1], hit[0]))
+    for sort in reversed((body or {}).get('sort') or []):
+        for field, order in sort.items():
+            hits.sort(
+                key=lambda hit: index.documents[hit[0]].get(field),
+                reverse=(order == 'desc'),
+            )
+    return hits
+
+
+def get_counts(count_query, clean=True, index=None):
+    counts = collections.Counter(key[0] for key, _ in run_query(count_query, index=index))
+    counts = {key: value for key, value in counts.items() if key in ALIASES}
+    counts['total'] = sum(counts.values())
+    return counts
+
+
+def get_tags(query, index):
+    local_index = get_index(index)
+    tags = collections.Counter()
+    for key, _ in run_query(query, index=index):
+        tags.update(local_index.documents[key].get('tags') or [])
+    return [
+        {'key': tag, 'doc_count': n_docs}
+        for tag, n_docs in sorted(tags.items(), key=lambda item: (-item[1], item[0]))[:10]
+    ]
+
+
+def search(query, index=None, doc_type='_all'):
+    """Search for a query. Returns results in the same format as
+    `website.search.elastic_search.search`.
+    """
+    index = index or INDEX
+    hits = run_query(query, index=index, doc_type=doc_type)
+    start = int(query.get('from', 0) or 0)
+    size = int(query.get('size', 10) if query.get('size') is not None else 10)
+
+    local_index = get_index(index)
+    results = [
+        copy.deepcopy(local_index.documents[key])
+        for key, _ in hits[start:start + size]
+    ]
+    return {
+        'results': format_results(results),
+        'counts': get_counts(query, index=index),
+        'tags': get_tags(query, index),
+        'typeAliases': ALIASES,
+    }
+
+
+def update_node(node, index=None, saved_fields=None):
+    index = get_index(index or INDEX)
+    category = get_doctype_from_node(node)
+
+    if category != 'project':
+        try:
+            node.parent_id
+        except IndexError:
+            # Skip orphaned components
+            return
+    if not is_node_searchable(node):
+        index.remove(category, node._id)
+        return
+
+    document_fields = get_partial_update_fields(
+        set(saved_fields).intersection(node.SOLR_UPDATE_FIELDS) if saved_fields else None
+    )
+    with index.lock:
+        document = index.get(category, node._id)
+        if document_fields and document is not None:
+            document = dict(document, **serialize_node_fields(node, document_fields))
+        else:
+            document = serialize_node(node, category)
+        index.add(category, node._id, document)
+
+
+def bulk_update_contributors(nodes, index=None):
+    index = get_index(index or INDEX)
+    n_updated = 0
+    for node in nodes:
+        category = get_doctype_from_node(node)
+        with index.lock:
+            document = index.get(category, node._id)
+            if document is None:
+                continue
+            document = dict(document, contributors=[
+                {
+                    'fullname': user.fullname,
+                    'url': user.profile_url if user.is_active else None
+                } for user in node.visible_contributors
+                if user is not None
+                and user.is_active
+            ])
+            index.add(category, node._id, document)
+        n_updated += 1
+    return n_updated, []
+
+
+def update_user(user, index=None):
+    index = get_index(index or INDEX)
+    if not user.is_active:
+        index.remove('user', user._id)
+        return
+    index.add('user', user._id, serialize_user(user))
+
+
+def bulk_index(actions, index=None, chunk_size=500):
+    index = get_index(index or INDEX)
+    n_indexed = 0
+    for doc_type, doc_id, document in actions:
+        index.add(doc_type, doc_id, document)
+        n_indexed += 1
+    return n_indexed, []
+
+
+def get_alias_target(index=None):
+    index = index or INDEX
+    with _lock:
+        return aliases.get(index, index)
+
+
+def count(index=None):
+    return len(get_index(index or INDEX))
+
+
+def delete_all():
+    delete_index(INDEX)
+
+
+def delete_index(index):
+    with _lock:
+        indices.pop(aliases.pop(index, index), None)
+
+
+def create_index(index=None):
+    get_index(index or INDEX)
+
+
+def delete_doc(elastic_document_id, node, index=None, category=None):
+    index = get_index(index or INDEX)
+    category = category or 'registration' if node.is_registration else node.project_or_component
+    index.remove(category, elastic_document_id)
+
+
+def search_contributor(query, page=0, size=10, exclude=None, current_user=None):
+    """Search for contributors to add to a project. Matches every word of
+    `query` as a prefix of the users' names, jobs and schools.
+
+    :param query: The substring of the username to search for
+    :param page: For pagination, the page number to use for results
+    :param size: For pagination, the number of results per page
+    :param exclude: A list of User objects to exclude from the search
+    :param current_user: A User object of the current user
+    """
+    start = (page * size)
+    query = build_contributor_query(query, exclude)
+    results = search(build_query(query, start=start, size=size), index=INDEX, doc_type='user')
+    return format_contributor_results(results, page, size, current_user)
@@ -7,6 +7,8 @@ logger = logging.getLogger(__name__)
 
 if settings.SEARCH_ENGINE == 'elastic':
     import elastic_search as search_engine
+elif settings.SEARCH_ENGINE == 'local':
+    import local_search as search_engine
 else:
     search_engine = None
     logger.warn('Elastic search is not set to load')
@@ -25,9 +27,9 @@ def search(query, index=None, doc_type=None):
     return search_engine.search(query, index=index, doc_type=doc_type)
 
 @requires_search
-def update_node(node, index=None):
+def update_node(node, index=None, saved_fields=None):
     index = index or settings.ELASTIC_INDEX
-    search_engine.update_node(node, index=index)
+    search_engine.update_node(node, index=index, saved_fields=saved_fields)
 
 @requires_search
 def delete_node(node, index=None):
@@ -47,6 +49,24 @@ def update_user(user, index=None):
     search_engine.update_user(user, index=index)
 
 
+@requires_search
+def bulk_index(actions, index=None, chunk_size=500):
+    index = index or settings.ELASTIC_INDEX
+    return search_engine.bulk_index(actions, index=index, chunk_size=chunk_size)
+
+
+@requires_search
+def get_alias_target(index=None):
+    index = index or settings.ELASTIC_INDEX
+    return search_engine.get_alias_target(index=index)
+
+
+@requires_search
+def count(index=None):
+    index = index or settings.ELASTIC_INDEX
+    return search_engine.count(index=index)
+
+
 @requires_search
 def delete_all():
     search_engine.delete_all()
@@ -80,3 +100,6 @@ def share_stats(query=None):
 
 def share_providers():
     return share_search.providers()
+
+def get_share_alias_target():
+    return share_search.get_alias_target()
@@ -67,6 +67,13 @@ def count(query, index='share'):
     }
 
 
+@requires_search
+def get_alias_target(index=None):
+    """Return the name of the index the SHARE alias `index` currently resolves to."""
+    index = index or settings.SHARE_ELASTIC_INDEX
+    return ','.join(sorted(share_es.indices.get_aliases(index=index).keys()))
+
+
 @requires_search
 def providers():
 
@@ -16,6 +16,7 @@ from website import settings
 from website.models import Node
 from website.models import User
 from website.search import util
+from website.search import cache
 from website.util import api_url_for
 from website.search import exceptions
 from website.search import share_search
@@ -53,7 +54,8 @@ def handle_search_errors(func):
 
 
 @handle_search_errors
-def search_search(**kwargs):
+@collect_auth
+def search_search(auth, **kwargs):
     _type = kwargs.get('type', None)
 
     tick = time.time()
@@ -66,7 +68,14 @@ def search_search(**kwargs):
         # TODO Match javascript params?
         start = request.args.get('from', '0')
         size = request.args.get('size', '10')
-        results = search.search(build_query(q, start, size), doc_type=_type)
+        if auth.logged_in:
+            results = search.search(build_query(q, start, size), doc_type=_type)
+        else:
+            q = cache.normalize_query(q)
+            results = cache.get_or_compute(
+                cache.make_key('search', _type, q, start, size),
+                lambda: search.search(build_query(q, start, size), doc_type=_type)
+            )
 
     results['time'] = round(time.time() - tick, 2)
     return results
@@ -234,7 +243,10 @@ def search_share_stats():
     q = request.args.get('q')
     query = build_query(q, 0, 0) if q else {}
 
-    return search.share_stats(query=query)
+    return cache.get_or_compute(
+        cache.make_key('share_stats', cache.alias_target('share'), cache.normalize_query(q) if q else None),
+        lambda: search.share_stats(query=query)
+    )
 
 
 @handle_search_errors
@@ -272,4 +284,7 @@ def search_share_atom(**kwargs):
 
 
 def search_share_providers():
-    return search.share_providers()
+    return cache.get_or_compute(
+        cache.make_key('share_providers', cache.alias_target('share')),
+        search.share_providers
+    )
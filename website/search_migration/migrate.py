@@ -1,66 +1,248 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-'''Migration script for Search-enabled Models.'''
+'''Migration script for Search-enabled Models.
+
+Documents are streamed from the database in chunks ordered by ``_id``. Each
+chunk is serialized (optionally in a pool of worker processes) and submitted
+to elasticsearch through the bulk API. The last processed id of each model is
+written to a checkpoint file after every chunk, so an interrupted migration
+resumes where it stopped when it is run again.
+'''
 from __future__ import absolute_import
+from __future__ import division
 
+import os
+import json
+import time
 import logging
+import multiprocessing
 
 from elasticsearch import helpers
 from modularodm.query.querydialect import DefaultQueryDialect as Q
 
 from website import settings
 from framework.auth import User
+from framework.mongo import database
 from website.models import Node
 from website.app import init_app
 import website.search.search as search
 from scripts import utils as script_utils
 from website.search.elastic_search import es
+from website.search import documents
 
 
 logger = logging.getLogger(__name__)
 
-def migrate_nodes(index):
-    logger.info("Migrating nodes to index: {}".format(index))
-    n_iter = 0
-    nodes = Node.find(Q('is_public', 'eq', True) & Q('is_deleted', 'eq', False))
-    for node in nodes:
-        search.update_node(node, index=index)
-        n_iter += 1
+CHUNK_SIZE = 500
+
+NODE_FILTER = {'is_public': True, 'is_deleted': False}
+
+
+class MigrationVerificationError(Exception):
+    pass
+
+
+def checkpoint_path(index):
+    return os.path.join(settings.LOG_PATH, 'search_migration.{}.checkpoint.json'.format(index))
+
+
+def load_checkpoint(index):
+    try:
+        with open(checkpoint_path(index)) as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return None
+
+
+def save_checkpoint(index, checkpoint):
+    path = checkpoint_path(index)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump(checkpoint, fp)
+    os.rename(tmp_path, path)
+
+
+def clear_checkpoint(index):
+    try:
+        os.remove(checkpoint_path(index))
+    except OSError:
+        pass
+
+
+def iter_id_chunks(model, spec, start_after=None, chunk_size=CHUNK_SIZE):
+    """Yield lists of primary keys of `model` matching the raw query `spec`,
+    in ascending order, starting after `start_after`. Only ids are read from
+    the collection; documents are loaded by whoever serializes the chunk.
+    """
+    collection = database[model._name]
+    last_id = start_after
+    while True:
+        chunk_spec = dict(spec or {})
+        if last_id is not None:
+            chunk_spec['_id'] = {'$gt': last_id}
+        ids = [
+            record['_id']
+            for record in collection.find(chunk_spec, {'_id': True}).sort('_id', 1).limit(chunk_size)
+        ]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def serialize_nodes(node_ids):
+    actions = []
+    for node in Node.find(Q('_id', 'in', node_ids)):
+        if not documents.is_node_searchable(node):
+            continue
+        category = documents.get_doctype_from_node(node)
+        try:
+            document = documents.serialize_node(node, category)
+        except IndexError:
+            # Skip orphaned components
+            continue
+        actions.append((category, node._id, document))
+    return actions
 
-    logger.info('Nodes migrated: {}'.format(n_iter))
 
+def serialize_users(user_ids):
+    return [
+        ('user', user._id, documents.serialize_user(user))
+        for user in User.find(Q('_id', 'in', user_ids))
+        if user.is_active
+    ]
 
-def migrate_users(index):
-    logger.info("Migrating users to index: {}".format(index))
-    n_migr = 0
-    n_iter = 0
-    for user in User.find():
-        if user.is_active:
-            search.update_user(user, index=index)
-            n_migr += 1
-        n_iter += 1
 
-    logger.info('Users iterated: {0}\nUsers migrated: {1}'.format(n_iter, n_migr))
+SERIALIZERS = {
+    'nodes': (Node, NODE_FILTER, serialize_nodes),
+    'users': (User, None, serialize_users),
+}
 
 
-def migrate(delete, index=None, app=None):
+def _init_worker():
+    app = init_app('website.settings', set_backends=True, routes=True)
+    app.test_request_context().push()
+
+
+def _serialize_chunk(args):
+    kind, ids = args
+    return ids[-1], len(ids), SERIALIZERS[kind][2](ids)
+
+
+def migrate_model(kind, index, checkpoint, pool=None, chunk_size=CHUNK_SIZE):
+    """Index every searchable record of one model into `index`, resuming after
+    the id stored in `checkpoint`.
+    """
+    model, spec, _ = SERIALIZERS[kind]
+    progress = checkpoint.setdefault(kind, {'last_id': None, 'iterated': 0, 'indexed': 0, 'failed': 0})
+    if progress['last_id'] is not None:
+        logger.info('Resuming {0} migration after {1}'.format(kind, progress['last_id']))
+    logger.info('Migrating {0} to index: {1}'.format(kind, index))
+
+    chunks = (
+        (kind, ids)
+        for ids in iter_id_chunks(model, spec, start_after=progress['last_id'], chunk_size=chunk_size)
+    )
+    if pool is None:
+        results = (_serialize_chunk(chunk) for chunk in chunks)
+    else:
+        # imap preserves chunk order, which keeps the checkpoint monotonic
+        results = pool.imap(_serialize_chunk, chunks)
+
+    started = time.time()
+    n_indexed = 0
+    for last_id, n_iterated, actions in results:
+        if actions:
+            n_success, errors = search.bulk_index(actions, index=index, chunk_size=chunk_size)
+            if errors:
+                logger.error('{0} errors while indexing {1}: {2}'.format(len(errors), kind, errors))
+                progress['failed'] = progress.get('failed', 0) + len(errors)
+            n_indexed += n_success
+            progress['indexed'] += n_success
+        progress['iterated'] += n_iterated
+        progress['last_id'] = last_id
+        save_checkpoint(index, checkpoint)
+
+        elapsed = time.time() - started
+        logger.info('{0}: {1} iterated, {2} indexed ({3:.1f} docs/s)'.format(
+            kind, progress['iterated'], progress['indexed'],
+            n_indexed / elapsed if elapsed else 0,
+        ))
+
+    progress['done'] = True
+    save_checkpoint(index, checkpoint)
+    logger.info('{0} iterated: {1}\n{0} migrated: {2}\n{0} failed: {3}'.format(
+        kind, progress['iterated'], progress['indexed'], progress.get('failed', 0)
+    ))
+
+
+def migrate_nodes(index, checkpoint=None, pool=None, chunk_size=CHUNK_SIZE):
+    migrate_model('nodes', index, checkpoint if checkpoint is not None else {}, pool=pool, chunk_size=chunk_size)
+
+
+def migrate_users(index, checkpoint=None, pool=None, chunk_size=CHUNK_SIZE):
+    migrate_model('users', index, checkpoint if checkpoint is not None else {}, pool=pool, chunk_size=chunk_size)
+
+
+def migrate(delete, index=None, app=None, workers=1, chunk_size=CHUNK_SIZE, resume=True):
+    """Rebuild `index` into a new versioned index and point the alias at it.
+
+    :param bool delete: Delete the previous index version once the alias is swapped
+    :param str index: Name of the alias to rebuild
+    :param app: Flask app; initialized if not given
+    :param int workers: Number of processes used to build documents. ``1``
+        builds documents in this process.
+    :param int chunk_size: Number of records per chunk and per bulk request
+    :param bool resume: Continue an interrupted migration from its checkpoint
+    """
     index = index or settings.ELASTIC_INDEX
     app = app or init_app("website.settings", set_backends=True, routes=True)
 
     script_utils.add_file_logger(logger, __file__)
     ctx = app.test_request_context()
     ctx.push()
-    new_index = set_up_index(index)
+    try:
+        checkpoint = load_checkpoint(index) if resume else None
+        if checkpoint and es.indices.exists(index=checkpoint['index']):
+            new_index = checkpoint['index']
+            logger.info('Resuming migration into {}'.format(new_index))
+        else:
+            new_index = set_up_index(index)
+            checkpoint = {'index': new_index}
+            save_checkpoint(index, checkpoint)
+
+        pool = multiprocessing.Pool(workers, _init_worker) if workers > 1 else None
+        try:
+            for kind in ('nodes', 'users'):
+                if not checkpoint.get(kind, {}).get('done'):
+                    migrate_model(kind, new_index, checkpoint, pool=pool, chunk_size=chunk_size)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
 
-    migrate_nodes(new_index)
-    migrate_users(new_index)
+        verify_index(new_index, checkpoint)
+        set_up_alias(index, new_index)
+        clear_checkpoint(index)
 
-    set_up_alias(index, new_index)
+        if delete:
+            delete_old(new_index)
+    finally:
+        ctx.pop()
 
-    if delete:
-        delete_old(new_index)
 
-    ctx.pop()
+def verify_index(index, checkpoint):
+    """Make sure the new index holds at least as many documents as were
+    indexed into it before the alias is moved. The first migration copies the
+    unversioned index, so the new index may legitimately hold more.
+    """
+    expected = sum(checkpoint.get(kind, {}).get('indexed', 0) for kind in SERIALIZERS)
+    actual = search.count(index=index)
+    logger.info('{0} holds {1} documents, {2} expected'.format(index, actual, expected))
+    if actual < expected:
+        raise MigrationVerificationError(
+            '{0} holds {1} documents but {2} were indexed; not swapping alias'.format(index, actual, expected)
+        )
 
 
 def set_up_index(idx):
@@ -106,4 +288,4 @@ def delete_old(index):
 
 
 if __name__ == '__main__':
-    migrate(False)
+    migrate(False, workers=multiprocessing.cpu_count())
@@ -60,7 +60,7 @@ CONFIRM_REGISTRATIONS_BY_EMAIL = True
 ALLOW_REGISTRATION = True
 ALLOW_LOGIN = True
 
-SEARCH_ENGINE = 'elastic'  # Can be 'elastic', or None
+SEARCH_ENGINE = 'elastic'  # Can be 'elastic', 'local' (in-process, no cluster needed), or None
 ELASTIC_URI = 'localhost:9200'
 ELASTIC_TIMEOUT = 10
 ELASTIC_INDEX = 'website'
@@ -69,6 +69,23 @@ SHARE_ELASTIC_INDEX = 'share'
 # For old indices
 SHARE_ELASTIC_INDEX_TEMPLATE = 'share_v{}'
 
+# Per-process cache of anonymous search results
+SEARCH_CACHE_ENABLED = True
+SEARCH_CACHE_SIZE = 1000
+SEARCH_CACHE_TTL = 60  # seconds
+# How often to check whether the search alias points to a new index
+SEARCH_CACHE_ALIAS_CHECK_INTERVAL = 10  # seconds
+
+# Page counter increments are accumulated in-process and written to the
+# pagecounters collection every ANALYTICS_FLUSH_INTERVAL seconds, or sooner
+# once ANALYTICS_FLUSH_THRESHOLD events are pending
+ANALYTICS_BUFFER_COUNTERS = True
+ANALYTICS_FLUSH_INTERVAL = 5  # seconds
+ANALYTICS_FLUSH_THRESHOLD = 100
+# Unique visitors are counted with HyperLogLog sketches of 2 ** precision
+# registers; 8 gives a standard error of about 6.5% in 256 bytes
+ANALYTICS_SKETCH_PRECISION = 8
+
 # Sessions
 # TODO: Override SECRET_KEY in local.py in production
 COOKIE_NAME = 'osf'
@@ -89,6 +106,16 @@ SUPPORT_EMAIL = 'support@osf.io'
 MAIL_SERVER = 'smtp.sendgrid.net'
 MAIL_USERNAME = 'osf-smtp'
 MAIL_PASSWORD = ''  # Set this in local.py
+# Keep authenticated SMTP connections open between messages in each worker
+MAIL_POOL_CONNECTIONS = True
+# Most idle connections kept per server
+MAIL_POOL_SIZE = 2
+# Seconds a connection may sit idle before it is checked with NOOP on reuse
+MAIL_POOL_MAX_IDLE = 30
+# Number of messages sent by each `framework.email.tasks.send_emails` task
+MAIL_BATCH_SIZE = 50
+# Number of threads sending email digests in scripts/send_digest.py
+DIGEST_WORKERS = 4
 
 # Mandrill
 MANDRILL_USERNAME = None
@@ -278,4 +305,21 @@ MAX_FILE_SIZE = MAX_ARCHIVE_SIZE  # TODO limit file size?
 ARCHIVE_TIMEOUT_TIMEDELTA = timedelta(1)  # 24 hours
 
 ENABLE_ARCHIVER = True
+
+# Folder listings fetched concurrently when collecting an addon's file tree
+ARCHIVE_CRAWL_WORKERS = 8
+# Maximum metadata requests per second to each provider, shared by all
+# crawls in a process
+ARCHIVE_CRAWL_RATE_LIMITS = {
+    'default': 10,
+}
+ARCHIVE_CRAWL_MAX_RETRIES = 5
+ARCHIVE_CRAWL_BACKOFF = 1  # seconds, doubled after each retry
+ARCHIVE_CRAWL_TIMEOUT = 60  # seconds
+# Times a registration whose addons failed to copy is archived again before
+# it is given up on; addons that were archived are not copied again
+ARCHIVE_JOB_MAX_RETRIES = 1
+# Largest number of files whose copies are verified for each addon; the
+# manifest of a larger addon is not stored, to keep its record small
+ARCHIVE_MANIFEST_MAX_FILES = 10000
 ###########################
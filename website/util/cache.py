@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Small in-process caches shared by the web and worker processes."""
+
+import time
+import threading
+import collections
+
+
+class LRUCache(object):
+    """Thread-safe, size-bounded, least-recently-used cache with an optional
+    time-to-live and hit/miss counters.
+
+    :param int maxsize: Maximum number of entries kept
+    :param ttl: Seconds an entry stays valid, or ``None`` to never expire
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None, count=True):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                if count:
+                    self.misses += 1
+                return default
+            if expires is not None and expires < time.time():
+                if count:
+                    self.misses += 1
+                return default
+            # Re-insert to mark as most recently used
+            self._data[key] = (value, expires)
+            if count:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """Remove every entry whose key satisfies `predicate`."""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def record_hit(self):
+        """Count a hit for a lookup made with ``get(..., count=False)``."""
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        """Count a miss for a lookup made with ``get(..., count=False)``."""
+        with self._lock:
+            self.misses += 1
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }